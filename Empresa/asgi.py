@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Empresa.settings')
+# Bajo ASGI, home y la API de lectura usan las vistas async (ver settings.VISTAS_ASYNC)
+os.environ.setdefault('VISTAS_ASYNC', '1')
+# Bajo ASGI cada request usa conexiones de otro hilo: las persistentes no se reutilizan
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
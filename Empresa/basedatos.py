@@ -0,0 +1,100 @@
+"""
+Perfiles de conexión a SQLite, seleccionables por entorno (DB_PERFIL).
+
+- basico:     lo que Django trae por defecto (rollback journal, sin conexiones
+              persistentes). Útil para comparar o en sistemas de archivos
+              de red donde WAL no funciona.
+- produccion: WAL (los lectores no se bloquean mientras se escribe),
+              synchronous=NORMAL (seguro con WAL, fsync solo en checkpoints),
+              busy_timeout, mmap y caché de páginas más grandes, transacciones
+              BEGIN IMMEDIATE (el escritor toma el lock al empezar y espera con
+              busy_timeout en lugar de fallar con "database is locked" al
+              intentar subir de lock) y conexiones persistentes con health check.
+
+Cada valor se puede ajustar con variables de entorno (ver configuracion_sqlite).
+Sin DB_PERFIL, settings usa `basico` con DEBUG (un `manage.py check` en una
+copia de trabajo no pasa el db.sqlite3 versionado a WAL ni deja archivos
+-wal/-shm) y `produccion` sin DEBUG.
+"""
+import logging
+import os
+
+logger = logging.getLogger('myapp.basedatos')
+
+PERFILES = {
+    'basico': {
+        'pragmas': (),
+        'timeout': 5,
+        'conn_max_age': 0,
+        'transaction_mode': None,
+    },
+    'produccion': {
+        'pragmas': (
+            'journal_mode=WAL',
+            'synchronous=NORMAL',
+            'temp_store=MEMORY',
+        ),
+        'timeout': 20,
+        'conn_max_age': 600,
+        'transaction_mode': 'IMMEDIATE',
+        'mmap_mb': 256,
+        'cache_mb': 64,
+    },
+}
+PERFIL_DEFECTO = 'produccion'
+
+
+def _entero(variable, defecto):
+    valor = os.environ.get(variable)
+    return int(valor) if valor not in (None, '') else defecto
+
+
+def configuracion_sqlite(nombre, perfil=None, defecto=PERFIL_DEFECTO):
+    """Entrada de DATABASES para el archivo `nombre` según el perfil (DB_PERFIL o `defecto`)"""
+    perfil = perfil or os.environ.get('DB_PERFIL') or defecto
+    if perfil not in PERFILES:
+        raise ValueError(f"DB_PERFIL desconocido: {perfil!r} (opciones: {', '.join(PERFILES)})")
+    datos = PERFILES[perfil]
+
+    pragmas = list(datos['pragmas'])
+    mmap_mb = _entero('SQLITE_MMAP_MB', datos.get('mmap_mb'))
+    cache_mb = _entero('SQLITE_CACHE_MB', datos.get('cache_mb'))
+    if mmap_mb is not None:
+        pragmas.append(f'mmap_size={mmap_mb * 1024 * 1024}')
+    if cache_mb is not None:
+        pragmas.append(f'cache_size=-{cache_mb * 1024}')  # negativo = KiB
+
+    opciones = {'timeout': _entero('DB_TIMEOUT', datos['timeout'])}
+    if pragmas:
+        opciones['init_command'] = ';'.join(f'PRAGMA {p}' for p in pragmas)
+    if datos['transaction_mode']:
+        opciones['transaction_mode'] = datos['transaction_mode']
+
+    conn_max_age = _entero('DB_CONN_MAX_AGE', datos['conn_max_age'])
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NOMBRE') or nombre,
+        'OPTIONS': opciones,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_max_age != 0,
+    }
+
+
+def verificar_conexion(sender, connection, **kwargs):
+    """
+    connection_created: comprueba que el perfil se aplicó de verdad. WAL
+    puede quedar desactivado sin error (p. ej. en un disco de red) y
+    entonces vuelven los bloqueos entre lectores y escritores.
+    """
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    if 'journal_mode=WAL' not in connection.settings_dict.get('OPTIONS', {}).get('init_command', ''):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        modo = cursor.fetchone()[0]
+    if modo.lower() != 'wal':
+        logger.warning(
+            "SQLite %s está en journal_mode=%s en lugar de WAL: los lectores se bloquearán durante las escrituras",
+            connection.settings_dict['NAME'], modo,
+        )
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from .basedatos import configuracion_sqlite
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,11 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myapp.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.permisos.PermisosMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,6 +73,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'myapp.permisos.context_processor',
+                'myapp.assets.assets',
             ],
         },
     },
@@ -80,11 +86,34 @@ WSGI_APPLICATION = 'Empresa.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil de SQLite según entorno (ver Empresa/basedatos.py):
+# DB_PERFIL=produccion (WAL, busy_timeout, BEGIN IMMEDIATE, conexiones
+# persistentes) o DB_PERFIL=basico (valores por defecto de Django). Sin
+# DB_PERFIL: basico con DEBUG (no convierte a WAL el db.sqlite3 del
+# repositorio) y produccion sin DEBUG.
 DATABASES = {
+    'default': configuracion_sqlite(BASE_DIR / 'db.sqlite3', defecto='basico' if DEBUG else 'produccion'),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'busquedas' guarda páginas de resultados de home (ver myapp/cache_busqueda.py).
+# LocMemCache es LRU (MAX_ENTRIES) con TTL (TIMEOUT) pero es por proceso: con
+# varios workers conviene un backend compartido (Redis, Memcached, base de datos).
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'busquedas': {
+        'BACKEND': os.environ.get('BUSQUEDAS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('BUSQUEDAS_CACHE_LOCATION', 'busquedas'),
+        'TIMEOUT': int(os.environ.get('BUSQUEDAS_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('BUSQUEDAS_CACHE_MAX_ENTRIES', 2000)),
+        },
+    },
 }
 
 
@@ -123,6 +152,32 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Modo de assets de producción (opt-in): CSS precompilado (static/css/app.css)
+# en lugar del compilador JIT de Tailwind desde CDN, nombres con hash
+# (manifest) y variantes .gz/.br generadas en collectstatic (ver
+# myapp/assets.py). El CSS compilado está versionado (recompilarlo al tocar
+# clases en las plantillas, ver tailwind.css) y requiere
+# collectstatic; si el bundle falta se vuelve a Tailwind desde CDN.
+ASSETS_PRODUCCION = os.environ.get('ASSETS_PRODUCCION', '0') == '1'
+
+# Servir /static/ y /media/ desde Django cuando no hay un servidor web delante
+SERVIR_ARCHIVOS = os.environ.get('SERVIR_ARCHIVOS', '0') == '1'
+# Resto de media; logos/ se sirve siempre con caché inmutable de un año
+MEDIA_CACHE_CONTROL = os.environ.get('MEDIA_CACHE_CONTROL', 'public, max-age=86400')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'myapp.assets.AlmacenamientoEstaticoComprimido' if ASSETS_PRODUCCION
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -132,6 +187,57 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Vistas asíncronas (home y API de lectura) con el ORM async: Empresa/asgi.py
+# las activa por defecto; bajo WSGI se mantienen las síncronas.
+VISTAS_ASYNC = os.environ.get('VISTAS_ASYNC', '0') == '1'
+
+# Paginación de home: 'offset' (Paginator clásico) o 'cursor' (keyset por id)
+EMPRESAS_PAGINACION = os.environ.get('EMPRESAS_PAGINACION', 'offset')
+
+# Importaciones subidas desde la web: el archivo espera aquí a que
+# `manage.py procesar_importaciones` lo procese (ver myapp/trabajos.py)
+IMPORTACIONES_DIR = Path(os.environ.get('IMPORTACIONES_DIR') or BASE_DIR / 'importaciones')
+# Un trabajo en proceso sin latido en este tiempo se considera abandonado
+IMPORTACIONES_ABANDONO_MINUTOS = int(os.environ.get('IMPORTACIONES_ABANDONO_MINUTOS', '10'))
+
+# Logos subidos (myapp/subidas.py y myapp/optimizacion.py): límites que se
+# aplican mientras llega el cuerpo y re-codificación (y borrado de archivos
+# sin uso) en LOGOS_HILOS hilos (0 = en el momento, p. ej. en tests)
+FILE_UPLOAD_HANDLERS = [
+    'myapp.subidas.LimiteImagenesHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+LOGO_MAX_BYTES = int(os.environ.get('LOGO_MAX_MB', '8')) * 1024 * 1024
+LOGO_MAX_PIXELES = int(os.environ.get('LOGO_MAX_MEGAPIXELES', '40')) * 1_000_000
+LOGO_MAX_LADO = int(os.environ.get('LOGO_MAX_LADO', '2048'))
+LOGO_BYTES_OPTIMO = int(os.environ.get('LOGO_OPTIMO_KB', '300')) * 1024
+LOGOS_HILOS = int(os.environ.get('LOGOS_HILOS', '2'))
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Métricas por request (myapp/metricas.py): /metrics en formato Prometheus.
+# Con METRICAS_TOKEN se exige "Authorization: Bearer <token>"; sin él, usuario staff.
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+METRICAS_UMBRAL_LENTO_MS = int(os.environ.get('METRICAS_UMBRAL_LENTO_MS', '500'))
+
+# Logs de la app en consola. DIRECTORIO_LOG_NIVEL=DEBUG activa la traza de
+# permisos de home y una línea JSON por request; por defecto solo las lentas.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'myapp': {
+            'handlers': ['consola'],
+            'level': os.environ.get('DIRECTORIO_LOG_NIVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
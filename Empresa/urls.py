@@ -14,11 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path
-from myapp import views
+from django.urls import path, re_path
+from myapp import api, assets, metricas, views
 from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
 
 
@@ -27,10 +28,34 @@ urlpatterns = [
     path('', views.login_view, name='login'),
     path('signup/', views.signup, name='signup'),  # ⬅️ VERIFICA QUE ESTA LÍNEA EXISTA
     path('logout/', views.logout_view, name='logout'),
-    path('home/', views.home, name='home'),
+    path('home/', views.ahome if settings.VISTAS_ASYNC else views.home, name='home'),
     path('editar/<int:id>/', views.editar_empresa, name='editar_empresa'),
+    path('editar/<int:id>/datos/', views.empresa_datos, name='empresa_datos'),
+    path('exportar/', views.exportar_empresas, name='exportar_empresas'),
     path('eliminar/<int:id>/', views.eliminar_empresa, name='eliminar_empresa'),
+    path('empresas/lote/', views.empresas_lote, name='empresas_lote'),
+    path('importaciones/', views.importaciones, name='importaciones'),
+    path('importaciones/<int:id>/', views.importacion_estado, name='importacion_estado'),
+    path('api/v1/empresas/', api.aempresas_lista if settings.VISTAS_ASYNC else api.empresas_lista, name='api_empresas'),
+    path(
+        'api/v1/empresas/cambios/',
+        api.aempresas_cambios if settings.VISTAS_ASYNC else api.empresas_cambios,
+        name='api_empresas_cambios',
+    ),
+    path(
+        'api/v1/empresas/<int:id>/',
+        api.aempresa_detalle if settings.VISTAS_ASYNC else api.empresa_detalle,
+        name='api_empresa_detalle',
+    ),
+    path('metrics', metricas.vista_metricas, name='metricas'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Media (y estáticos fuera de DEBUG) con ETag/304 y Cache-Control largo
+if settings.DEBUG or settings.SERVIR_ARCHIVOS:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), assets.servir_media),
+    ]
+if settings.SERVIR_ARCHIVOS and not settings.DEBUG:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), assets.servir_estatico),
+    ]
@@ -1,87 +1,160 @@
 """
 Extrae imágenes de Excel (.xlsx) usando zipfile
-Ejecutar: python extract_images_zip.py archivo.xlsx
+Ejecutar: python extract_images_zip.py archivo.xlsx [--incremental] [--workers N]
+
+Genera además <salida>/manifest.json con, por cada imagen:
+miembro del zip -> sha256 -> archivo de salida. Con --incremental solo se
+escriben las imágenes nuevas o cambiadas; las que ya estaban (aunque hayan
+cambiado de posición) se reutilizan. El CRC32 y el tamaño del directorio
+del zip solo eligen la candidata: se reutiliza si el sha256 del miembro
+(leído sin escribirlo) coincide con el del manifiesto, porque ese sha256
+es el nombre del logo en el almacenamiento por contenido.
 """
+import argparse
+import hashlib
+import json
+import os
+import shutil
 import sys
+import threading
 import zipfile
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def extract_images_from_excel(xlsx_path, output_dir='extracted_logos'):
+MANIFEST = 'manifest.json'
+STAGING = '.extraccion_tmp'
+
+
+def leer_manifiesto(output_dir='extracted_logos'):
+    """Devuelve la lista de entradas del manifiesto (vacía si no existe)"""
+    manifest_path = Path(output_dir) / MANIFEST
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            return json.load(f).get('imagenes', [])
+    except (OSError, ValueError):
+        return []
+
+
+def _buscar_imagenes(all_files):
+    # Buscar archivos de imágenes en xl/media/
+    image_files = [f for f in all_files if f.startswith('xl/media/')]
+
+    if not image_files:
+        # Buscar en cualquier carpeta que contenga 'media'
+        image_files = [f for f in all_files if '/media/' in f.lower()]
+
+    if not image_files:
+        # Buscar por extensión
+        extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.emf', '.wmf')
+        image_files = [f for f in all_files if f.lower().endswith(extensions)]
+
+    return sorted(image_files)
+
+
+class _Extractor:
+    """Descomprime miembros del zip en paralelo (un ZipFile por hilo)"""
+
+    def __init__(self, xlsx_path, staging):
+        self.xlsx_path = xlsx_path
+        self.staging = staging
+        self._local = threading.local()
+        self._abiertos = []
+        self._lock = threading.Lock()
+
+    def _zip(self):
+        if not hasattr(self._local, 'zip'):
+            self._local.zip = zipfile.ZipFile(self.xlsx_path, 'r')
+            with self._lock:
+                self._abiertos.append(self._local.zip)
+        return self._local.zip
+
+    def cerrar(self):
+        for zip_ref in self._abiertos:
+            zip_ref.close()
+
+    def procesar(self, entrada, candidata=None, origen=None):
+        """
+        Sin `candidata`, extrae. Con ella (mismo CRC32 y tamaño en el
+        manifiesto anterior) primero calcula el sha256 del miembro: si
+        coincide, la imagen es la misma y se deja como está (sin `origen`)
+        o se enlaza desde `origen`; si no, se extrae.
+        Devuelve (entrada, 'extraida' | 'reutilizada' | 'sin_cambios').
+        """
+        if candidata is not None:
+            sha = hashlib.sha256()
+            try:
+                with self._zip().open(entrada['miembro']) as source:
+                    for bloque in iter(lambda: source.read(1024 * 1024), b''):
+                        sha.update(bloque)
+            except Exception as e:
+                raise RuntimeError(f"{entrada['miembro']}: {e}") from e
+            if sha.hexdigest() == candidata['sha256']:
+                entrada['sha256'] = candidata['sha256']
+                if origen is None:
+                    return entrada, 'sin_cambios'
+                return self.reutilizar(entrada, origen), 'reutilizada'
+        return self.extraer(entrada), 'extraida'
+
+    def extraer(self, entrada):
+        """Descomprime y calcula el sha256 en una sola pasada"""
+        destino = self.staging / entrada['archivo']
+        sha = hashlib.sha256()
+        try:
+            with self._zip().open(entrada['miembro']) as source, open(destino, 'wb') as target:
+                for bloque in iter(lambda: source.read(1024 * 1024), b''):
+                    sha.update(bloque)
+                    target.write(bloque)
+        except Exception as e:
+            destino.unlink(missing_ok=True)
+            raise RuntimeError(f"{entrada['miembro']}: {e}") from e
+        entrada['sha256'] = sha.hexdigest()
+        return entrada
+
+    def reutilizar(self, entrada, origen):
+        """Mismo contenido ya extraído con otro nombre: enlazar o copiar"""
+        destino = self.staging / entrada['archivo']
+        try:
+            os.link(origen, destino)
+        except OSError:
+            shutil.copy2(origen, destino)
+        return entrada
+
+
+def extract_images_from_excel(xlsx_path, output_dir='extracted_logos', incremental=False, workers=None, verbose=False):
     """Extrae todas las imágenes del archivo Excel"""
-    
+
     xlsx_path = Path(xlsx_path)
-    
+
     # Validar que existe el archivo
     if not xlsx_path.exists():
         print(f"❌ ERROR: No existe el archivo {xlsx_path}")
         return False
-    
+
     # Crear carpeta de salida
     output_path = Path(output_dir)
-    if output_path.exists():
+    if output_path.exists() and not incremental:
         print(f"🗑️  Limpiando carpeta anterior: {output_dir}/")
         shutil.rmtree(output_path)
-    
-    output_path.mkdir(exist_ok=True)
-    
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    anteriores = {e['archivo']: e for e in leer_manifiesto(output_path)} if incremental else {}
+
     print(f"📂 Abriendo: {xlsx_path.name}")
     print(f"📁 Extrayendo a: {output_path.absolute()}\n")
-    
+
     try:
-        # Abrir Excel como ZIP
+        # Leer solo el directorio central del zip (nombre, CRC32, tamaño)
         with zipfile.ZipFile(xlsx_path, 'r') as zip_ref:
-            # Listar todos los archivos del ZIP
-            all_files = zip_ref.namelist()
-            
-            # Buscar archivos de imágenes en xl/media/
-            image_files = [f for f in all_files if f.startswith('xl/media/')]
-            
-            if not image_files:
-                # Buscar en cualquier carpeta que contenga 'media'
-                image_files = [f for f in all_files if '/media/' in f.lower()]
-            
-            if not image_files:
-                # Buscar por extensión
-                extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.emf', '.wmf')
-                image_files = [f for f in all_files if f.lower().endswith(extensions)]
-            
+            image_files = _buscar_imagenes(zip_ref.namelist())
+
             if not image_files:
                 print("❌ ERROR: No se encontraron imágenes en el archivo Excel")
                 print("\n📋 Contenido del archivo Excel:")
-                for f in sorted(all_files)[:30]:
+                for f in sorted(zip_ref.namelist())[:30]:
                     print(f"   {f}")
                 return False
-            
-            print(f"✅ Encontradas {len(image_files)} imágenes\n")
-            
-            # Extraer cada imagen
-            extracted = 0
-            for idx, img_path in enumerate(sorted(image_files), 1):
-                try:
-                    # Obtener extensión
-                    ext = Path(img_path).suffix.lower() or '.png'
-                    
-                    # Nombre de salida: imagen_001.png, imagen_002.png, etc.
-                    output_filename = f"imagen_{idx:03d}{ext}"
-                    output_filepath = output_path / output_filename
-                    
-                    # Extraer archivo
-                    with zip_ref.open(img_path) as source:
-                        with open(output_filepath, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-                    
-                    # Verificar que se extrajo correctamente
-                    size_kb = output_filepath.stat().st_size / 1024
-                    print(f"  ✓ {output_filename} ({size_kb:.1f} KB)")
-                    extracted += 1
-                    
-                except Exception as e:
-                    print(f"  ✗ Error en {img_path}: {e}")
-            
-            print(f"\n🎉 Éxito: {extracted} imágenes extraídas en {output_path.absolute()}")
-            return True
-            
+
+            infos = [zip_ref.getinfo(f) for f in image_files]
     except zipfile.BadZipFile:
         print("❌ ERROR: El archivo no es un Excel válido (.xlsx)")
         return False
@@ -89,15 +162,104 @@ def extract_images_from_excel(xlsx_path, output_dir='extracted_logos'):
         print(f"❌ ERROR inesperado: {e}")
         return False
 
+    print(f"✅ Encontradas {len(image_files)} imágenes\n")
+
+    # Contenido ya extraído, indexado por (CRC32, tamaño) del zip
+    por_contenido = {}
+    for previa in anteriores.values():
+        if (output_path / previa['archivo']).exists():
+            por_contenido.setdefault((previa['crc32'], previa['tamano']), previa)
+
+    staging = output_path / STAGING
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    extractor = _Extractor(xlsx_path, staging)
+
+    manifiesto = []
+    cuentas = {'extraida': 0, 'reutilizada': 0, 'sin_cambios': 0}
+    errores = 0
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 2)) as pool:
+        tareas = []
+        for idx, info in enumerate(infos, 1):
+            # Nombre de salida: imagen_001.png, imagen_002.png, etc.
+            ext = Path(info.filename).suffix.lower() or '.png'
+            entrada = {
+                'miembro': info.filename,
+                'archivo': f"imagen_{idx:03d}{ext}",
+                'crc32': info.CRC,
+                'tamano': info.file_size,
+            }
+            manifiesto.append(entrada)
+
+            # Candidata por (CRC32, tamaño); procesar confirma con el sha256
+            previa = anteriores.get(entrada['archivo'])
+            clave = (info.CRC, info.file_size)
+            if previa and (previa['crc32'], previa['tamano']) == clave and (output_path / previa['archivo']).exists():
+                tareas.append(pool.submit(extractor.procesar, entrada, previa))
+            elif clave in por_contenido:
+                origen = por_contenido[clave]
+                tareas.append(pool.submit(extractor.procesar, entrada, origen, output_path / origen['archivo']))
+            else:
+                tareas.append(pool.submit(extractor.procesar, entrada))
+
+        for tarea in tareas:
+            try:
+                entrada, tipo = tarea.result()
+                cuentas[tipo] += 1
+                if verbose and tipo != 'sin_cambios':
+                    size_kb = (staging / entrada['archivo']).stat().st_size / 1024
+                    print(f"  ✓ {entrada['archivo']} ({size_kb:.1f} KB)")
+            except Exception as e:
+                errores += 1
+                print(f"  ✗ Error: {e}")
+    extractor.cerrar()
+
+    # Mover lo nuevo a su sitio y borrar lo que ya no corresponde
+    for staged in staging.iterdir():
+        os.replace(staged, output_path / staged.name)
+    shutil.rmtree(staging, ignore_errors=True)
+
+    manifiesto = [e for e in manifiesto if 'sha256' in e and (output_path / e['archivo']).exists()]
+    vigentes = {e['archivo'] for e in manifiesto} | {MANIFEST}
+    for sobrante in output_path.glob('imagen_*.*'):
+        if sobrante.name not in vigentes:
+            sobrante.unlink()
+
+    tmp_manifest = output_path / (MANIFEST + '.tmp')
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump({'origen': xlsx_path.name, 'imagenes': manifiesto}, f, indent=1)
+    os.replace(tmp_manifest, output_path / MANIFEST)
+
+    print(f"\n🎉 Éxito: {cuentas['extraida']} extraídas, {cuentas['reutilizada']} reutilizadas, "
+          f"{cuentas['sin_cambios']} sin cambios en {output_path.absolute()}")
+    if errores:
+        print(f"⚠️  {errores} imágenes con error")
+    return True
+
+
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         print("=" * 60)
         print("📌 USO:")
-        print("   python extract_images_zip.py archivo.xlsx")
+        print("   python extract_images_zip.py archivo.xlsx [--incremental] [--workers N]")
         print("\n📌 EJEMPLO:")
-        print("   python extract_images_zip.py empresas.xlsx")
+        print("   python extract_images_zip.py empresas.xlsx --incremental")
         print("=" * 60)
         sys.exit(1)
-    
-    success = extract_images_from_excel(sys.argv[1])
-    sys.exit(0 if success else 1)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Extrae las imágenes de un Excel (.xlsx)")
+    parser.add_argument('xlsx_path')
+    parser.add_argument('--salida', default='extracted_logos', help='Carpeta de salida (default: extracted_logos)')
+    parser.add_argument('--incremental', action='store_true', help='Reutilizar imágenes ya extraídas con el mismo contenido')
+    parser.add_argument('--workers', type=int, default=None, help='Hilos de extracción')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Listar cada imagen extraída')
+    args = parser.parse_args()
+
+    success = extract_images_from_excel(
+        args.xlsx_path,
+        args.salida,
+        incremental=args.incremental,
+        workers=args.workers,
+        verbose=args.verbose,
+    )
+    sys.exit(0 if success else 1)
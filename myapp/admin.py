@@ -1,20 +1,104 @@
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
+from .duplicados import UMBRAL, grupos_empresas
+from .lotes import CAMPOS_EDITABLES, MAXIMO_LOTE, editar_en_lote, eliminar_en_lote
 from .models import Empresa
+from .normalizacion import normalizar
+
+# Grupos de duplicados que muestra la vista del admin
+LIMITE_GRUPOS_ADMIN = 200
 
 @admin.register(Empresa)
 class EmpresaAdmin(admin.ModelAdmin):
     list_display = ('cliente','compania','codigo','mostrarLogo','telefono','correo','pais','fecha_creacion','fecha_actualizacion')
-    search_fields = ('cliente','compania','codigo')
+    # Columnas normalizadas: "compania" encuentra "Compañía" (ver get_search_results)
+    search_fields = ('cliente_norm','compania_norm','pais_norm','codigo')
     list_filter = ('pais','fecha_creacion')
     readonly_fields = ('codigo','fecha_creacion','fecha_actualizacion','vistaPreviaLogo')
+    actions = ('editar_seleccionadas',)
+
+    def _por_tramos(self, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        return [ids[i:i + MAXIMO_LOTE] for i in range(0, len(ids), MAXIMO_LOTE)]
+
+    def delete_queryset(self, request, queryset):
+        # "Eliminar seleccionados" conserva su confirmación, pero borra por
+        # conjunto en vez de cargar y borrar cada empresa (ver myapp/lotes.py)
+        with transaction.atomic():
+            for ids in self._por_tramos(queryset):
+                eliminar_en_lote(ids)
+
+    @admin.action(permissions=['change'], description='Editar un campo de las empresas seleccionadas')
+    def editar_seleccionadas(self, request, queryset):
+        if 'aplicar' in request.POST:
+            campo = request.POST.get('campo', '')
+            try:
+                with transaction.atomic():
+                    cambiadas = sum(
+                        editar_en_lote(ids, campo, request.POST.get('valor', ''))
+                        for ids in self._por_tramos(queryset)
+                    )
+            except ValidationError as e:
+                self.message_user(request, f'❌ {" ".join(e.messages)}', level='error')
+            else:
+                self.message_user(request, f'✅ {cambiadas} empresas actualizadas ({campo}).')
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Editar empresas seleccionadas',
+            'opts': self.model._meta,
+            'campos': [(campo, Empresa._meta.get_field(campo).verbose_name) for campo in CAMPOS_EDITABLES],
+            'ids': queryset.values_list('id', flat=True),
+            'total': queryset.count(),
+            'accion_checkbox': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/myapp/empresa/editar_lote.html', context)
+
+    def get_search_results(self, request, queryset, search_term):
+        # El término se normaliza igual que las columnas *_norm
+        return super().get_search_results(request, queryset, normalizar(search_term))
+
+    def get_urls(self):
+        propias = [
+            path('duplicados/', self.admin_site.admin_view(self.duplicados_view), name='myapp_empresa_duplicados'),
+        ]
+        return propias + super().get_urls()
+
+    def duplicados_view(self, request):
+        """Grupos de empresas con nombres casi iguales (ver myapp/duplicados.py)"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            umbral = min(1.0, max(0.3, float(request.GET.get('umbral', UMBRAL))))
+        except ValueError:
+            umbral = UMBRAL
+        grupos = grupos_empresas(umbral)
+        mostrados = grupos[:LIMITE_GRUPOS_ADMIN]
+        empresas = Empresa.objects.in_bulk({pk for grupo in mostrados for pk in grupo['ids']})
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Posibles empresas duplicadas',
+            'opts': self.model._meta,
+            'umbral': umbral,
+            'total_grupos': len(grupos),
+            'grupos': [
+                {'similitud': grupo['similitud'], 'empresas': [empresas[pk] for pk in grupo['ids'] if pk in empresas]}
+                for grupo in mostrados
+            ],
+        }
+        return TemplateResponse(request, 'admin/myapp/empresa/duplicados.html', context)
 
     def mostrarLogo(self, obj):
         if obj.logo:
-            return format_html('<img src="{}" width="100" height="100" />', obj.logo.url)
+            return format_html('<img src="{}" width="100" height="100" loading="lazy" />', obj.logo_thumb_url)
         return "No Logo"
 
     def vistaPreviaLogo(self, obj):
         if obj.logo:
-            return format_html('<img src="{}" width="200" style="border:1px solid #ddd;border-radius:8px;">', obj.logo.url)
+            return format_html('<img src="{}" srcset="{}" width="200" style="border:1px solid #ddd;border-radius:8px;">', obj.logo_thumb_url, obj.logo_srcset)
         return "No Logo"
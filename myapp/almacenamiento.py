@@ -0,0 +1,178 @@
+# myapp/almacenamiento.py
+"""
+Logos direccionados por contenido.
+
+Cada logo se guarda como logos/<aa>/<sha256>.<ext> (aa = dos primeros
+caracteres del hash): los mismos bytes, subidos desde la web o importados
+cien veces, ocupan un solo archivo (y comparten miniaturas). Al importar
+ni siquiera se copia: si el hash ya está guardado no se toca el disco, y si
+no, se crea un enlace duro al logo extraído (copia solo entre discos).
+
+La tabla myapp_referencialogo cuenta cuántas empresas usan cada archivo.
+Empresa.save, bulk_create/bulk_update de EmpresaQuerySet y el post_delete
+de Empresa la mantienen; cuando un archivo queda en 0 se borran él y sus
+miniaturas, en segundo plano tras confirmar (en_segundo_plano: el pool de
+LOGOS_HILOS hilos, también usado para optimizar logos). queryset.update(logo=...)
+no la actualiza: para reparar desvíos está `manage.py deduplicar_logos`.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connections, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+CARPETA = 'logos'
+TABLA = 'myapp_referencialogo'
+_POR_CONTENIDO = re.compile(rf'^{CARPETA}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.[a-z0-9]+)?$')
+
+
+def nombre_por_contenido(sha, extension=''):
+    """'e3b0...', '.PNG' -> 'logos/e3/e3b0....png'"""
+    return f"{CARPETA}/{sha[:2]}/{sha}{extension.lower()}"
+
+
+def es_por_contenido(nombre):
+    return bool(_POR_CONTENIDO.match(str(nombre or '')))
+
+
+def sha256_archivo(ruta):
+    with open(ruta, 'rb') as archivo:
+        return hashlib.file_digest(archivo, 'sha256').hexdigest()
+
+
+class AlmacenamientoLogos(FileSystemStorage):
+    """FileSystemStorage que ignora el nombre subido y usa el hash del contenido"""
+
+    def _save(self, name, content):
+        sha = hashlib.sha256()
+        for bloque in content.chunks():  # chunks() vuelve al inicio del archivo
+            sha.update(bloque)
+        destino = nombre_por_contenido(sha.hexdigest(), PurePosixPath(name).suffix)
+        if self.exists(destino):
+            return destino
+        # Se escribe aparte y se publica con un rename atómico: quien lea
+        # logos/aa/<sha> nunca ve un archivo a medias
+        temporal = super()._save(f"{CARPETA}/.tmp/{uuid.uuid4().hex}", content)
+        self._publicar(self.path(temporal), destino)
+        return destino
+
+    def _publicar(self, origen, destino):
+        ruta = Path(self.path(destino))
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(origen, ruta)  # si otro guardó los mismos bytes a la vez, da igual cuál quede
+
+    def importar(self, ruta, sha=None):
+        """
+        Guarda el archivo local `ruta` sin copiarlo si es posible y devuelve
+        su nombre. `sha` evita releerlo (p. ej. viene del manifest.json).
+        """
+        ruta = Path(ruta)
+        destino = nombre_por_contenido(sha or sha256_archivo(ruta), ruta.suffix)
+        if self.exists(destino):
+            return destino
+        temporal = Path(self.path(f"{CARPETA}/.tmp/{uuid.uuid4().hex}"))
+        temporal.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # La extracción reemplaza archivos (no los reescribe), así que el
+            # enlace no cambia aunque se vuelva a extraer en la misma carpeta
+            os.link(ruta, temporal)
+        except OSError:
+            shutil.copyfile(ruta, temporal)
+        self._publicar(temporal, destino)
+        return destino
+
+
+almacenamiento_logos = AlmacenamientoLogos()
+
+
+# -- Contador de referencias ------------------------------------------------
+
+def _nombre(logo):
+    return str(logo or '')
+
+
+def ajustar_referencias(sumar=(), restar=(), using=None):
+    """
+    Suma y resta usos de archivos de logo (nombres o FieldFile; los vacíos
+    se ignoran). Los que quedan sin usos se borran del disco al confirmar
+    la transacción.
+    """
+    cambios = Counter(n for n in map(_nombre, sumar) if n)
+    cambios.subtract(n for n in map(_nombre, restar) if n)
+    cambios = {nombre: valor for nombre, valor in cambios.items() if valor}
+    if not cambios:
+        return
+    using = using or 'default'
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {TABLA} (nombre, referencias) VALUES (%s, %s) "
+            f"ON CONFLICT (nombre) DO UPDATE SET referencias = {TABLA}.referencias + excluded.referencias",
+            list(cambios.items()),
+        )
+        restados = [nombre for nombre, valor in cambios.items() if valor < 0]
+        if restados:
+            cursor.execute(
+                f"DELETE FROM {TABLA} WHERE referencias <= 0 AND nombre IN ({', '.join(['%s'] * len(restados))}) "
+                f"RETURNING nombre",
+                restados,
+            )
+            sin_uso = [fila[0] for fila in cursor.fetchall()]
+            if sin_uso:
+                transaction.on_commit(lambda: en_segundo_plano(borrar_sin_uso, sin_uso, using), using=using)
+
+
+def borrar_sin_uso(nombres, using='default'):
+    """Borra archivos y miniaturas que ninguna empresa usa (comprobándolo otra vez)"""
+    from .miniaturas import TAMANOS, nombre_miniatura
+    from .models import Empresa, ReferenciaLogo
+    en_uso = set(ReferenciaLogo.objects.using(using).filter(nombre__in=nombres).values_list('nombre', flat=True))
+    # Red de seguridad por si algo cambió logo sin pasar por el contador
+    en_uso.update(Empresa.objects.using(using).filter(logo__in=nombres).values_list('logo', flat=True))
+    for nombre in set(nombres) - en_uso:
+        for archivo in (nombre, *(nombre_miniatura(nombre, tamano) for tamano in TAMANOS)):
+            almacenamiento_logos.delete(archivo)
+
+
+# -- Trabajo en segundo plano ----------------------------------------------
+
+_pool = None
+_candado = threading.Lock()
+
+
+def _ejecutar(funcion, args):
+    try:
+        funcion(*args)
+    except Exception:
+        logger.exception("Error en %s%r", funcion.__name__, args)
+    finally:
+        connections.close_all()  # solo las de este hilo
+
+
+def en_segundo_plano(funcion, *args):
+    """Ejecuta funcion(*args) en el pool de LOGOS_HILOS hilos (o en el momento si es 0)"""
+    global _pool
+    if not settings.LOGOS_HILOS:
+        funcion(*args)
+        return
+    with _candado:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.LOGOS_HILOS, thread_name_prefix='logos')
+    _pool.submit(_ejecutar, funcion, args)
+
+
+@receiver(post_delete, sender='myapp.Empresa')
+def _liberar_logo(sender, instance, using, **kwargs):
+    ajustar_referencias(restar=[instance.logo], using=using)
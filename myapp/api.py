@@ -0,0 +1,324 @@
+# myapp/api.py
+"""
+API JSON de solo lectura del directorio (v1).
+
+    GET /api/v1/empresas/?q=&field=&fields=&cursor=&limit=
+    GET /api/v1/empresas/<id>/?fields=
+    GET /api/v1/empresas/cambios/?since=&limit=&fields=
+
+- `fields` proyecta columnas: solo se leen de la base de datos las pedidas.
+- Búsqueda con la misma semántica que home (myapp/busqueda.py) y
+  paginación por cursor (myapp/paginacion.py).
+- ETag / Last-Modified derivados de fecha_actualizacion y de la versión
+  del registro de cambios (que también sube con las bajas): si nada
+  cambió se responde 304 tras un MAX sobre el índice y una lectura por
+  clave primaria, sin leer ni contar filas.
+- Correo, teléfono y país solo se devuelven a administradores.
+- cambios: empresas creadas, cambiadas o borradas desde la versión
+  `since` (ver myapp/cambios.py), en orden de versión; `next` es el
+  `since` de la siguiente llamada.
+- aempresas_lista / aempresa_detalle / aempresas_cambios: mismas vistas con el ORM asíncrono,
+  usadas bajo ASGI (settings.VISTAS_ASYNC).
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.db.models import Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .busqueda import CAMPOS_PRIVADOS, buscar_empresas
+from .cambios import SECUENCIA_CAMBIOS, SECUENCIA_PURGADOS
+from .models import CambioEmpresa, Empresa, SecuenciaCodigo
+from .paginacion import CursorPaginator
+
+CAMPOS = (
+    'id', 'cliente', 'compania', 'codigo', 'telefono', 'correo', 'pais',
+    'logo', 'logo_miniatura', 'fecha_creacion', 'fecha_actualizacion',
+)
+CAMPOS_ARCHIVO = ('logo', 'logo_miniatura')
+LIMITE_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+
+def api_login_required(vista):
+    """Como login_required, pero responde 401 en JSON en lugar de redirigir"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_async(request, *args, **kwargs):
+            if not (await request.auser()).is_authenticated:
+                return JsonResponse({'error': 'Autenticación requerida.'}, status=401)
+            return await vista(request, *args, **kwargs)
+        return envoltura_async
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Autenticación requerida.'}, status=401)
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+def _campos_pedidos(request):
+    """Campos visibles según rol y ?fields=; devuelve (campos, error)"""
+    visibles = [c for c in CAMPOS if request.permisos.is_admin or c not in CAMPOS_PRIVADOS]
+    pedidos = [c.strip() for c in request.GET.get('fields', '').split(',') if c.strip()]
+    if not pedidos:
+        return visibles, None
+    desconocidos = [c for c in pedidos if c not in visibles]
+    if desconocidos:
+        return None, f"Campos no disponibles: {', '.join(desconocidos)}"
+    return ['id'] + [c for c in pedidos if c != 'id'], None
+
+
+# Cada campo con su storage (logo usa almacenamiento_logos)
+_STORAGES = {campo: Empresa._meta.get_field(campo).storage for campo in CAMPOS_ARCHIVO}
+
+
+def _serializar(fila):
+    for campo in CAMPOS_ARCHIVO:
+        if campo in fila:
+            fila[campo] = _STORAGES[campo].url(fila[campo]) if fila[campo] else None
+    return fila
+
+
+def _etag(*partes):
+    return '"%s"' % hashlib.sha1('|'.join(str(p) for p in partes).encode()).hexdigest()
+
+
+def _respuesta_condicional(request, etag, ultima_modificacion):
+    """304 si el cliente ya tiene esta versión; None si hay que responder"""
+    timestamp = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _con_cabeceras(response, etag, ultima_modificacion):
+    response.headers['ETag'] = etag
+    if ultima_modificacion:
+        response.headers['Last-Modified'] = http_date(ultima_modificacion.timestamp())
+    # Datos dependientes del usuario: cachear solo en el cliente y revalidar
+    response.headers['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _error(mensaje, status=400):
+    return JsonResponse({'error': mensaje}, status=status)
+
+
+def _consulta_lista(request):
+    """Valida parámetros; devuelve (campos, limite, queryset, is_admin) o una respuesta de error"""
+    campos, error = _campos_pedidos(request)
+    if error:
+        return _error(error)
+    try:
+        limite = min(max(int(request.GET.get('limit', LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        return _error('limit debe ser un número entero.')
+
+    is_admin = request.permisos.is_admin
+    q = request.GET.get('q', '').strip()
+    empresas = Empresa.objects.all()
+    if q:
+        empresas = buscar_empresas(empresas, q, request.GET.get('field', 'all'), is_admin, por_relevancia=False)
+    return campos, limite, empresas, is_admin
+
+
+def _version_cambios():
+    return SecuenciaCodigo.objects.filter(nombre=SECUENCIA_CAMBIOS).values_list('valor', flat=True)
+
+
+def _etag_lista(request, estado, is_admin):
+    return _etag('lista', estado['ultima'], estado['version'], is_admin, request.GET.urlencode())
+
+
+def _respuesta_lista(estado, total, pagina, etag):
+    response = JsonResponse({
+        'count': total,
+        'next': pagina.next_cursor,
+        'previous': pagina.previous_cursor,
+        'results': [_serializar(fila) for fila in pagina.object_list],
+    })
+    return _con_cabeceras(response, etag, estado['ultima'])
+
+
+@require_GET
+@api_login_required
+def empresas_lista(request):
+    consulta = _consulta_lista(request)
+    if isinstance(consulta, JsonResponse):
+        return consulta
+    campos, limite, empresas, is_admin = consulta
+
+    # Sin COUNT para decidir si hay cambios: MAX sobre el índice de
+    # fecha_actualizacion y la versión del registro de cambios (altas,
+    # ediciones y bajas), leída por clave primaria
+    estado = empresas.aggregate(ultima=Max('fecha_actualizacion'))
+    estado['version'] = _version_cambios().first()
+    etag = _etag_lista(request, estado, is_admin)
+    no_modificado = _respuesta_condicional(request, etag, estado['ultima'])
+    if no_modificado is not None:
+        return _con_cabeceras(no_modificado, etag, estado['ultima'])
+
+    pagina = CursorPaginator(empresas.values(*campos), limite).get_page(request.GET.get('cursor'))
+    return _respuesta_lista(estado, empresas.count(), pagina, etag)
+
+
+@require_GET
+@api_login_required
+async def aempresas_lista(request):
+    """empresas_lista para ASGI (ORM asíncrono)"""
+    await request.apermisos()
+    consulta = _consulta_lista(request)
+    if isinstance(consulta, JsonResponse):
+        return consulta
+    campos, limite, empresas, is_admin = consulta
+
+    estado = await empresas.aaggregate(ultima=Max('fecha_actualizacion'))
+    estado['version'] = await _version_cambios().afirst()
+    etag = _etag_lista(request, estado, is_admin)
+    no_modificado = _respuesta_condicional(request, etag, estado['ultima'])
+    if no_modificado is not None:
+        return _con_cabeceras(no_modificado, etag, estado['ultima'])
+
+    pagina = await CursorPaginator(empresas.values(*campos), limite).aget_page(request.GET.get('cursor'))
+    return _respuesta_lista(estado, await empresas.acount(), pagina, etag)
+
+
+def _consulta_detalle(request, id):
+    """Devuelve (campos, incluir_fecha, queryset) o una respuesta de error"""
+    campos, error = _campos_pedidos(request)
+    if error:
+        return _error(error)
+    incluir_fecha = 'fecha_actualizacion' in campos
+    columnas = campos if incluir_fecha else [*campos, 'fecha_actualizacion']
+    return campos, incluir_fecha, Empresa.objects.filter(id=id).values(*columnas)
+
+
+def _respuesta_detalle(request, id, campos, incluir_fecha, fila):
+    if fila is None:
+        return _error('Empresa no encontrada.', status=404)
+
+    ultima = fila['fecha_actualizacion'] if incluir_fecha else fila.pop('fecha_actualizacion')
+    etag = _etag('detalle', id, ultima, ','.join(campos))
+    no_modificado = _respuesta_condicional(request, etag, ultima)
+    if no_modificado is not None:
+        return _con_cabeceras(no_modificado, etag, ultima)
+
+    return _con_cabeceras(JsonResponse(_serializar(fila)), etag, ultima)
+
+
+@require_GET
+@api_login_required
+def empresa_detalle(request, id):
+    consulta = _consulta_detalle(request, id)
+    if isinstance(consulta, JsonResponse):
+        return consulta
+    campos, incluir_fecha, filas = consulta
+    return _respuesta_detalle(request, id, campos, incluir_fecha, filas.first())
+
+
+@require_GET
+@api_login_required
+async def aempresa_detalle(request, id):
+    """empresa_detalle para ASGI (ORM asíncrono)"""
+    await request.apermisos()
+    consulta = _consulta_detalle(request, id)
+    if isinstance(consulta, JsonResponse):
+        return consulta
+    campos, incluir_fecha, filas = consulta
+    return _respuesta_detalle(request, id, campos, incluir_fecha, await filas.afirst())
+
+
+def _consulta_cambios(request):
+    """Valida parámetros; devuelve (campos, since, limite, consultas) o una respuesta de error"""
+    campos, error = _campos_pedidos(request)
+    if error:
+        return _error(error)
+    try:
+        since = int(request.GET.get('since') or 0)
+        limite = min(max(int(request.GET.get('limit', LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        return _error('since y limit deben ser números enteros.')
+    if since < 0:
+        return _error('since no puede ser negativo.')
+
+    minima = SecuenciaCodigo.objects.filter(nombre=SECUENCIA_PURGADOS).values_list('valor', flat=True)
+    cambios = (
+        CambioEmpresa.objects.filter(version__gt=since)
+        .order_by('version')
+        .values_list('empresa_id', 'codigo', 'eliminada', 'version')[:limite + 1]
+    )
+    return campos, since, limite, minima, cambios
+
+
+def _cursor_vencido(since, minima):
+    if since and since < (minima or 0):
+        # Se purgaron bajas posteriores a este cursor: faltarían borrados
+        return _error('El cursor es demasiado antiguo; vuelve a sincronizar con since=0.', status=410)
+    return None
+
+
+def _vivas(cambios, limite):
+    return [empresa_id for empresa_id, _, eliminada, _ in cambios[:limite] if not eliminada]
+
+
+def _respuesta_cambios(since, limite, cambios, filas):
+    por_id = {fila['id']: fila for fila in filas}
+    resultados = []
+    for empresa_id, codigo, eliminada, version in cambios[:limite]:
+        # Sin fila: se borró entre las dos consultas (su baja sale en la siguiente página)
+        fila = None if eliminada else por_id.get(empresa_id)
+        resultados.append({
+            'version': version,
+            'id': empresa_id,
+            'codigo': codigo,
+            'eliminada': fila is None,
+            'empresa': _serializar(fila) if fila else None,
+        })
+    response = JsonResponse({
+        'next': str(resultados[-1]['version'] if resultados else since),
+        'has_more': len(cambios) > limite,
+        'results': resultados,
+    })
+    response.headers['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+@require_GET
+@api_login_required
+def empresas_cambios(request):
+    consulta = _consulta_cambios(request)
+    if isinstance(consulta, JsonResponse):
+        return consulta
+    campos, since, limite, minima, cambios = consulta
+
+    vencido = _cursor_vencido(since, minima.first())
+    if vencido is not None:
+        return vencido
+    cambios = list(cambios)
+    filas = Empresa.objects.filter(id__in=_vivas(cambios, limite)).values(*campos)
+    return _respuesta_cambios(since, limite, cambios, filas)
+
+
+@require_GET
+@api_login_required
+async def aempresas_cambios(request):
+    """empresas_cambios para ASGI (ORM asíncrono)"""
+    await request.apermisos()
+    consulta = _consulta_cambios(request)
+    if isinstance(consulta, JsonResponse):
+        return consulta
+    campos, since, limite, minima, cambios = consulta
+
+    vencido = _cursor_vencido(since, await minima.afirst())
+    if vencido is not None:
+        return vencido
+    cambios = [cambio async for cambio in cambios]
+    filas = [fila async for fila in Empresa.objects.filter(id__in=_vivas(cambios, limite)).values(*campos)]
+    return _respuesta_cambios(since, limite, cambios, filas)
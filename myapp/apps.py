@@ -1,6 +1,32 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        # Conecta las señales que invalidan las cachés de permisos y búsquedas,
+        # la que instrumenta las conexiones para las métricas de SQL y la que
+        # libera los logos de las empresas borradas (y, fuera de SQLite, la
+        # que registra los cambios para la sincronización)
+        from . import almacenamiento, cache_busqueda, cambios, metricas, permisos  # noqa: F401
+
+        post_migrate.connect(_reparar_indice_fts, sender=self)
+        post_migrate.connect(_reparar_triggers_cambios, sender=self)
+
+        # Avisa si el perfil de SQLite no quedó aplicado (p. ej. WAL no disponible)
+        from Empresa.basedatos import verificar_conexion
+        connection_created.connect(verificar_conexion, dispatch_uid='verificar_conexion_sqlite')
+
+
+def _reparar_indice_fts(sender, using, **kwargs):
+    from .busqueda import asegurar_indice_fts
+    asegurar_indice_fts(using)
+
+
+def _reparar_triggers_cambios(sender, using, **kwargs):
+    from .cambios import asegurar_triggers_cambios
+    asegurar_triggers_cambios(using)
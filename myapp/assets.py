@@ -0,0 +1,150 @@
+# myapp/assets.py
+"""
+Entrega de estáticos y media en producción.
+
+- AlmacenamientoEstaticoComprimido: ManifestStaticFilesStorage (nombres con
+  hash) que además deja variantes .gz y .br (si está instalado `brotli`)
+  de cada archivo de texto durante collectstatic.
+- servir_estatico / servir_media: sirven archivos con ETag/Last-Modified,
+  respuestas 304 y Cache-Control lejano e `immutable` para nombres con hash
+  (estáticos del manifest y logos/, cuyos nombres nunca se reutilizan para
+  otro contenido: ver myapp/almacenamiento.py).
+- css_app: URL del CSS precompilado, o None si no se ha generado; entonces
+  se usa Tailwind desde CDN en lugar de romper cada página. Se resuelve
+  una vez por proceso (avisa una sola vez si falta), no en cada request.
+"""
+import functools
+import gzip
+import logging
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se generan .gz
+    brotli = None
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map')
+TAMANO_MINIMO = 256
+UN_ANIO = 60 * 60 * 24 * 365
+CACHE_INMUTABLE = f'public, max-age={UN_ANIO}, immutable'
+_NOMBRE_CON_HASH = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+CSS_APP = 'css/app.css'
+CARPETA_LOGOS = 'logos/'
+
+logger = logging.getLogger(__name__)
+
+
+class AlmacenamientoEstaticoComprimido(ManifestStaticFilesStorage):
+    """Manifest + precompresión gzip/brotli en collectstatic"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        procesados = set()
+        for original, procesado, modificado in super().post_process(paths, dry_run, **options):
+            if procesado and not isinstance(modificado, Exception):
+                procesados.add(procesado)
+            yield original, procesado, modificado
+        if not dry_run:
+            for nombre in sorted(procesados):
+                self._comprimir(nombre)
+
+    def _comprimir(self, nombre):
+        if not nombre.endswith(EXTENSIONES_COMPRIMIBLES):
+            return
+        ruta = self.path(nombre)
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        if len(contenido) < TAMANO_MINIMO:
+            return
+        variantes = {'.gz': gzip.compress(contenido, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variantes['.br'] = brotli.compress(contenido, quality=11)
+        for sufijo, datos in variantes.items():
+            if len(datos) < len(contenido):
+                with open(ruta + sufijo, 'wb') as f:
+                    f.write(datos)
+
+
+@functools.cache
+def css_app():
+    """URL de static/css/app.css, o None si no hay bundle que servir (cacheada)"""
+    if not settings.ASSETS_PRODUCCION:
+        return None
+    if not (staticfiles_storage.exists(CSS_APP) or finders.find(CSS_APP)):
+        logger.warning("ASSETS_PRODUCCION activo pero falta %s: se usa Tailwind desde CDN", CSS_APP)
+        return None
+    try:
+        return staticfiles_storage.url(CSS_APP)
+    except ValueError:
+        # Manifest sin la entrada: collectstatic se ejecutó antes de compilar el CSS
+        logger.warning("%s no está en el manifest de estáticos: se usa Tailwind desde CDN", CSS_APP)
+        return None
+
+
+@receiver(setting_changed)
+def _ajustes_cambiados(setting, **kwargs):
+    # override_settings en tests: el bundle se vuelve a resolver
+    if setting in ('ASSETS_PRODUCCION', 'DEBUG', 'STATIC_ROOT', 'STATIC_URL', 'STATICFILES_DIRS', 'STORAGES'):
+        css_app.cache_clear()
+
+
+def assets(request):
+    """Context processor: CSS precompilado o Tailwind JIT desde CDN"""
+    return {'CSS_APP': css_app()}
+
+
+def _variante_comprimida(request, ruta):
+    aceptadas = request.headers.get('Accept-Encoding', '')
+    for codificacion, sufijo in (('br', '.br'), ('gzip', '.gz')):
+        if codificacion in aceptadas and os.path.exists(ruta + sufijo):
+            return ruta + sufijo, codificacion
+    return ruta, None
+
+
+def _servir(request, raiz, path, cache_control):
+    try:
+        ruta = safe_join(raiz, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(ruta):
+        raise Http404
+
+    ruta_envio, codificacion = _variante_comprimida(request, ruta)
+    stat = os.stat(ruta_envio)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        tipo, _ = mimetypes.guess_type(ruta)
+        response = FileResponse(open(ruta_envio, 'rb'), content_type=tipo or 'application/octet-stream')
+        response.headers['Content-Length'] = stat.st_size
+        if codificacion:
+            response.headers['Content-Encoding'] = codificacion
+
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Cache-Control'] = cache_control
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def servir_estatico(request, path):
+    """Estáticos de STATIC_ROOT; los nombres con hash nunca cambian"""
+    cache_control = CACHE_INMUTABLE if _NOMBRE_CON_HASH.search(path) else 'public, max-age=300'
+    return _servir(request, settings.STATIC_ROOT, path, cache_control)
+
+
+def servir_media(request, path):
+    """Logos y miniaturas de MEDIA_ROOT (los de logos/ no cambian nunca)"""
+    cache_control = CACHE_INMUTABLE if path.startswith(CARPETA_LOGOS) else settings.MEDIA_CACHE_CONTROL
+    return _servir(request, settings.MEDIA_ROOT, path, cache_control)
@@ -0,0 +1,230 @@
+# myapp/benchmark.py
+"""
+Escenarios de rendimiento del directorio (ver `manage.py benchmark`).
+
+Cada escenario se mide `repeticiones` veces y guarda la mediana y el mínimo
+del tiempo de pared y el número de consultas SQL. Los datos son sintéticos y
+deterministas (semilla fija), así que dos ejecuciones en la misma máquina
+son comparables y `comparar()` puede detectar regresiones contra una línea
+base guardada en JSON.
+"""
+import contextlib
+import io
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import django
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .busqueda import CAMPOS_PRIVADOS, CAMPOS_PUBLICOS
+from .codigos import formatear_codigo, reservar_codigos
+from .importacion import ImportadorEmpresas
+from .models import Empresa
+from .paginacion import codificar_cursor
+
+POR_PAGINA = 12
+PALABRAS = (
+    'Andes', 'Austral', 'Pacífico', 'Cobre', 'Litio', 'Solar', 'Norte', 'Sur',
+    'Logística', 'Minera', 'Agrícola', 'Digital', 'Servicios', 'Ingeniería',
+    'Construcción', 'Transportes', 'Alimentos', 'Consultores', 'Textil', 'Marítima',
+)
+NOMBRES = ('Ana', 'Luis', 'María', 'José', 'Camila', 'Diego', 'Valentina', 'Pedro', 'Sofía', 'Javier')
+PAISES = ('Chile', 'Perú', 'Argentina', 'Colombia', 'México', 'España')
+# Término de búsqueda por campo (todos existen en los datos sembrados)
+TERMINOS = {
+    'all': 'minera',
+    'compania': 'logística',
+    'cliente': 'camila',
+    'codigo': '0042',
+    'correo': 'andes',
+    'telefono': '555',
+    'pais': 'peru',
+}
+
+
+def _png(ruta, color):
+    from PIL import Image
+    Image.new('RGB', (320, 160), color).save(ruta, 'PNG')
+
+
+def sembrar(filas, logos, semilla, media_root):
+    """Crea `filas` empresas sintéticas (bulk) y `logos` de ellas con imagen"""
+    rnd = random.Random(semilla)
+    carpeta = Path(media_root) / 'logos'
+    carpeta.mkdir(parents=True, exist_ok=True)
+    codigos = reservar_codigos(filas)
+    empresas = []
+    for i, numero in enumerate(codigos):
+        compania = f"{rnd.choice(PALABRAS)} {rnd.choice(PALABRAS)} {i}"
+        logo = ''
+        if i < logos:
+            logo = f'logos/bench_{i}.png'
+            _png(carpeta / f'bench_{i}.png', (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+        empresas.append(Empresa(
+            cliente=f"{rnd.choice(NOMBRES)} {rnd.choice(PALABRAS)}",
+            compania=compania,
+            codigo=formatear_codigo(numero),
+            correo=f"contacto{i}@{rnd.choice(PALABRAS).lower()}.example",
+            telefono=f"+56 9 555 {i:05d}",
+            pais=rnd.choice(PAISES),
+            logo=logo,
+        ))
+    Empresa.objects.bulk_create(empresas, batch_size=1000)
+
+
+def medir(funcion, repeticiones=5, preparar=None):
+    """Mediana/mínimo en ms y consultas (máximo entre repeticiones)"""
+    tiempos = []
+    consultas = 0
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        consultas = max(consultas, len(capturadas))
+    return {
+        'mediana_ms': round(statistics.median(tiempos) * 1000, 3),
+        'min_ms': round(min(tiempos) * 1000, 3),
+        'consultas': consultas,
+        'repeticiones': repeticiones,
+    }
+
+
+def _limpiar_cache():
+    caches['busquedas'].clear()
+
+
+def _get(cliente, url, datos):
+    response = cliente.get(url, datos)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} {datos} respondió {response.status_code}")
+    return response
+
+
+def _crear_excel(ruta, filas, imagenes=0, semilla=0):
+    from openpyxl import Workbook
+    from openpyxl.drawing.image import Image as ImagenExcel
+    rnd = random.Random(semilla)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Cliente', 'Compañía', 'Código'])
+    for i in range(filas):
+        # La mitad coincide con compañías sembradas (actualizaciones), la otra mitad es nueva
+        compania = f"{rnd.choice(PALABRAS)} {rnd.choice(PALABRAS)} {i}" if i % 2 else f"Importada {i}"
+        ws.append([f"{rnd.choice(NOMBRES)} Import", compania, None])
+    carpeta = Path(ruta).parent / 'imagenes_excel'
+    carpeta.mkdir(exist_ok=True)
+    for i in range(imagenes):
+        png = carpeta / f'img_{i}.png'
+        _png(png, (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+        ws.add_image(ImagenExcel(str(png)), f'D{i + 2}')
+    wb.save(ruta)
+    return ruta
+
+
+def ejecutar(filas=10000, logos=50, repeticiones=5, semilla=42, media_root=None, filas_importacion=None):
+    """Siembra la base actual (debe ser desechable) y mide todos los escenarios"""
+    from django.contrib.auth.models import User
+    from extract_images_zip import extract_images_from_excel
+
+    media_root = media_root or tempfile.mkdtemp()
+    Path(media_root).mkdir(parents=True, exist_ok=True)
+    trabajo = Path(tempfile.mkdtemp(dir=media_root))
+    resultados = {}
+
+    inicio = time.perf_counter()
+    sembrar(filas, logos, semilla, media_root)
+    siembra_s = time.perf_counter() - inicio
+
+    admin = User.objects.create(username='benchmark', is_superuser=True, is_staff=True)
+    cliente = Client()
+    cliente.force_login(admin)
+    home = reverse('home')
+
+    # extract_images_from_excel imprime su progreso: se descarta para no ensuciar la tabla
+    with contextlib.redirect_stdout(io.StringIO()):
+        for campo in ('all', *CAMPOS_PUBLICOS, *CAMPOS_PRIVADOS):
+            datos = {'q': TERMINOS[campo], 'field': campo}
+            resultados[f'home_busqueda_{campo}'] = medir(
+                lambda: _get(cliente, home, datos), repeticiones, _limpiar_cache)
+        resultados['home_busqueda_cacheada'] = medir(
+            lambda: _get(cliente, home, {'q': TERMINOS['all']}), repeticiones)
+
+        ultima = max(1, -(-filas // POR_PAGINA))
+        resultados['home_pagina_profunda_offset'] = medir(
+            lambda: _get(cliente, home, {'page': ultima}), repeticiones, _limpiar_cache)
+        pk = Empresa.objects.order_by('id').values_list('id', flat=True)[min(POR_PAGINA, filas - 1)]
+        cursor = codificar_cursor('n', pk)
+        resultados['home_pagina_profunda_cursor'] = medir(
+            lambda: _get(cliente, home, {'modo': 'cursor', 'cursor': cursor}), repeticiones, _limpiar_cache)
+
+        contador = iter(range(10 ** 9))
+        resultados['empresa_save_codigo'] = medir(
+            lambda: Empresa(cliente=f'Nueva {next(contador)}').save(), repeticiones * 20)
+
+        xlsx = _crear_excel(trabajo / 'importar.xlsx', filas_importacion or min(filas, 5000), semilla=semilla)
+        importacion = {}
+
+        def importar():
+            importacion['resultado'] = ImportadorEmpresas(xlsx, batch_size=1000).ejecutar()
+
+        resultados['import_empresas'] = medir(importar, 1)
+        resultados['import_empresas']['filas_por_segundo'] = round(importacion['resultado'].filas_por_segundo, 1)
+
+        con_imagenes = _crear_excel(trabajo / 'logos.xlsx', max(logos, 1), imagenes=max(logos, 1), semilla=semilla)
+        salida = trabajo / 'extraidos'
+        resultados['extract_images_from_excel'] = medir(
+            lambda: extract_images_from_excel(con_imagenes, salida), repeticiones)
+        resultados['extract_images_incremental'] = medir(
+            lambda: extract_images_from_excel(con_imagenes, salida, incremental=True), repeticiones)
+
+    return {
+        'meta': {
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'filas': filas,
+            'logos': logos,
+            'repeticiones': repeticiones,
+            'semilla': semilla,
+            'siembra_s': round(siembra_s, 3),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'escenarios': resultados,
+    }
+
+
+def comparar(actual, base, umbral=0.25):
+    """
+    Lista de regresiones frente a la línea base: tiempo (mediana) por encima
+    de `umbral` relativo o cualquier consulta SQL de más.
+    """
+    regresiones = []
+    previos = base.get('escenarios', {})
+    for nombre, medida in actual.get('escenarios', {}).items():
+        previo = previos.get(nombre)
+        if previo is None:
+            continue
+        limite = previo['mediana_ms'] * (1 + umbral)
+        if medida['mediana_ms'] > limite:
+            regresiones.append(
+                f"{nombre}: {medida['mediana_ms']:.1f} ms > {previo['mediana_ms']:.1f} ms (+{umbral:.0%})"
+            )
+        if medida['consultas'] > previo['consultas']:
+            regresiones.append(f"{nombre}: {medida['consultas']} consultas > {previo['consultas']}")
+    return regresiones
@@ -0,0 +1,153 @@
+# myapp/busqueda.py
+"""
+Búsqueda de empresas sobre el índice FTS5 (myapp_empresa_fts).
+
+El índice se crea y se mantiene sincronizado con triggers en la migración
+0007_empresa_fts; su tokenizer (unicode61 remove_diacritics 2) ya ignora
+tildes y mayúsculas. En motores distintos de SQLite se busca en las
+columnas normalizadas (*_norm) con el texto normalizado igual, y en el
+resto con icontains.
+
+Ojo: FTS5 encuentra palabras por su comienzo, no subcadenas sueltas: "bm"
+encuentra "BMW" pero "mw" ya no (icontains sí lo hacía). Para los campos
+donde se busca un trozo de número (código y teléfono, p. ej. "12" dentro de
+"0012") la búsqueda por ese campo concreto sigue siendo por subcadena.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .normalizacion import CAMPOS_NORMALIZADOS, normalizar
+
+TABLA_FTS = 'myapp_empresa_fts'
+
+# Campos visibles para cualquier usuario y campos solo para administradores
+CAMPOS_PUBLICOS = ('compania', 'cliente', 'codigo')
+CAMPOS_PRIVADOS = ('correo', 'telefono', 'pais')
+
+# Buscados por subcadena cuando se elige ese campo concreto
+CAMPOS_SUBCADENA = ('codigo', 'telefono')
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_COLUMNAS = 'compania, cliente, codigo, correo, telefono, pais'
+_NUEVAS = ', '.join(f'new.{c}' for c in _COLUMNAS.split(', '))
+_VIEJAS = ', '.join(f'old.{c}' for c in _COLUMNAS.split(', '))
+TRIGGERS_FTS = {
+    'myapp_empresa_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_fts_ai AFTER INSERT ON myapp_empresa BEGIN
+            INSERT INTO {TABLA_FTS}(rowid, {_COLUMNAS}) VALUES (new.id, {_NUEVAS});
+        END""",
+    'myapp_empresa_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_fts_ad AFTER DELETE ON myapp_empresa BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {_COLUMNAS}) VALUES ('delete', old.id, {_VIEJAS});
+        END""",
+    'myapp_empresa_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_fts_au AFTER UPDATE OF {_COLUMNAS}
+        ON myapp_empresa BEGIN
+            INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {_COLUMNAS}) VALUES ('delete', old.id, {_VIEJAS});
+            INSERT INTO {TABLA_FTS}(rowid, {_COLUMNAS}) VALUES (new.id, {_NUEVAS});
+        END""",
+}
+
+
+def campos_permitidos(campo, is_admin):
+    """Columnas en las que se puede buscar según el campo pedido y el rol"""
+    if campo == 'all':
+        return CAMPOS_PUBLICOS + CAMPOS_PRIVADOS
+    if campo in CAMPOS_PUBLICOS or (campo in CAMPOS_PRIVADOS and is_admin):
+        return (campo,)
+    return ()
+
+
+def expresion_fts(q, columnas):
+    """
+    Convierte el texto del usuario en una consulta MATCH de FTS5.
+
+    Cada palabra se busca como prefijo ("bm"* encuentra "BMW") y todas deben
+    aparecer (AND). Las palabras con puntuación (correos, teléfonos) se
+    buscan como frase. Devuelve None si no hay nada indexable.
+    """
+    frases = []
+    for trozo in q.split():
+        tokens = _TOKEN.findall(trozo)
+        if tokens:
+            frases.append('"%s"*' % ' '.join(tokens))
+    if not frases:
+        return None
+    return '{%s} : (%s)' % (' '.join(columnas), ' '.join(frases))
+
+
+def fts_disponible(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def asegurar_indice_fts(using='default'):
+    """
+    Recrea los triggers del índice si faltan y lo reconstruye.
+
+    En SQLite, las migraciones que alteran myapp_empresa copian la tabla
+    y la renombran, y eso se lleva por delante sus triggers. Se llama
+    desde post_migrate (ver MyappConfig.ready).
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return False
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{TABLA_FTS}%'],
+        )
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        if TABLA_FTS not in existentes or existentes >= set(TRIGGERS_FTS):
+            return False
+        for sql in TRIGGERS_FTS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+    return True
+
+
+def buscar_empresas(queryset, q, campo='all', is_admin=False, por_relevancia=True):
+    """
+    Filtra `queryset` por el texto `q` en el campo indicado.
+
+    Con FTS5 los resultados salen ordenados por relevancia (bm25) y, a
+    igualdad, por id descendente; si no, se conserva el orden de `queryset`.
+    La búsqueda por un campo privado concreto (correo, teléfono, país) solo
+    se aplica si `is_admin` es verdadero, igual que antes en home.
+    Con `por_relevancia=False` solo se filtra (p. ej. para paginar por id).
+    """
+    q = (q or '').strip()
+    columnas = campos_permitidos(campo, is_admin)
+    if not q or not columnas:
+        return queryset
+
+    if columnas == (campo,) and campo in CAMPOS_SUBCADENA:
+        return queryset.filter(**{f'{campo}__icontains': q})
+
+    expresion = expresion_fts(q, columnas) if fts_disponible(queryset.db) else None
+    if expresion is None:
+        filtro = Q()
+        for columna in columnas:
+            if columna in CAMPOS_NORMALIZADOS:
+                filtro |= Q(**{f'{CAMPOS_NORMALIZADOS[columna]}__contains': normalizar(q)})
+            else:
+                filtro |= Q(**{f'{columna}__icontains': q})
+        return queryset.filter(filtro)
+
+    if not por_relevancia:
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [expresion])
+        )
+
+    # Un solo JOIN con el índice: el MATCH se evalúa una vez y su columna
+    # rank (bm25) sirve para ordenar sin subconsulta por fila
+    tabla = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[TABLA_FTS],
+        where=[f'{TABLA_FTS}.rowid = {tabla}.id', f'{TABLA_FTS} MATCH %s'],
+        params=[expresion],
+        select={'relevancia': f'{TABLA_FTS}.rank'},
+    ).order_by('relevancia', '-id')
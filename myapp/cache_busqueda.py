@@ -0,0 +1,146 @@
+# myapp/cache_busqueda.py
+"""
+Caché versionada de las páginas de resultados de home.
+
+Las claves incluyen consulta, campo, página/cursor, rol y un contador de
+generación. Cualquier alta, edición o baja de Empresa sube la generación,
+así que las entradas viejas simplemente dejan de usarse y el backend
+(LocMemCache por defecto: LRU con MAX_ENTRIES y TIMEOUT) las desaloja.
+Se usa el alias de caché 'busquedas' (ver CACHES en settings).
+
+La generación vive en la base de datos (fila 'busquedas' de
+myapp_secuenciacodigo, como la de permisos) y no en la caché: con
+LocMemCache cada proceso tiene la suya, y lo que sube el worker de
+importaciones, restaurar_empresas o deduplicar_logos no llegaría a los
+procesos web. Leerla es una consulta por clave primaria por request.
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metricas
+from .codigos import reservar_codigos
+from .models import Empresa, SecuenciaCodigo
+
+ALIAS = 'busquedas'
+SECUENCIA_BUSQUEDAS = 'busquedas'
+CLAVE_ACIERTOS = 'busquedas:aciertos'
+CLAVE_FALLOS = 'busquedas:fallos'
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _generaciones():
+    return SecuenciaCodigo.objects.filter(nombre=SECUENCIA_BUSQUEDAS).values_list('valor', flat=True)
+
+
+def generacion():
+    return _generaciones().first() or 0
+
+
+async def ageneracion():
+    """generacion() para vistas asíncronas"""
+    return await _generaciones().afirst() or 0
+
+
+def invalidar_busquedas():
+    """Sube la generación: las páginas cacheadas quedan obsoletas en todos los procesos"""
+    reservar_codigos(1, secuencia=SECUENCIA_BUSQUEDAS)
+
+
+def clave_pagina(generacion, *partes):
+    """
+    Clave corta y segura para cualquier backend (memcached limita longitud).
+    `generacion` es la de generacion() / ageneracion(), leída una vez por request.
+    """
+    texto = '|'.join(str(p) for p in (generacion, *partes))
+    return 'busquedas:pagina:' + hashlib.md5(texto.encode()).hexdigest()
+
+
+def _contar(clave):
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 0, None)
+        cache.incr(clave)
+
+
+async def _acontar(clave):
+    cache = _cache()
+    try:
+        await cache.aincr(clave)
+    except ValueError:
+        await cache.aadd(clave, 0, None)
+        await cache.aincr(clave)
+
+
+def obtener(clave):
+    pagina = _cache().get(clave)
+    _contar(CLAVE_FALLOS if pagina is None else CLAVE_ACIERTOS)
+    metricas.registrar_cache(ALIAS, pagina is not None)
+    return pagina
+
+
+async def aobtener(clave):
+    """obtener() para vistas asíncronas: no bloquea el event loop con un backend de red"""
+    pagina = await _cache().aget(clave)
+    await _acontar(CLAVE_FALLOS if pagina is None else CLAVE_ACIERTOS)
+    metricas.registrar_cache(ALIAS, pagina is not None)
+    return pagina
+
+
+def guardar(clave, pagina):
+    """Guarda una página ya evaluada (sin querysets pendientes)"""
+    _cache().set(clave, congelar(pagina))
+    return pagina
+
+
+async def aguardar(clave, pagina):
+    """guardar() para vistas asíncronas"""
+    await _cache().aset(clave, congelar(pagina))
+    return pagina
+
+
+def congelar(pagina):
+    """
+    Deja la página lista para serializar: evalúa la lista de objetos y
+    suelta los querysets (al hacer pickle de un queryset se evaluaría
+    completo).
+    """
+    pagina.object_list = list(pagina.object_list)
+    paginator = getattr(pagina, 'paginator', None)
+    if paginator is not None:
+        paginator.count, paginator.num_pages  # noqa: B018 - fija los cached_property
+        paginator.object_list = None
+    if hasattr(pagina, '_queryset'):
+        pagina._queryset = None
+    return pagina
+
+
+def estadisticas():
+    cache = _cache()
+    valores = cache.get_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+    aciertos = valores.get(CLAVE_ACIERTOS, 0)
+    fallos = valores.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'tasa_aciertos': aciertos / total if total else 0.0,
+        'generacion': generacion(),
+    }
+
+
+def reiniciar_estadisticas():
+    _cache().delete_many([CLAVE_ACIERTOS, CLAVE_FALLOS])
+
+
+@receiver(post_save, sender=Empresa)
+@receiver(post_delete, sender=Empresa)
+def _empresa_cambiada(sender, **kwargs):
+    invalidar_busquedas()
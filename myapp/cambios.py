@@ -0,0 +1,157 @@
+# myapp/cambios.py
+"""
+Registro de cambios de Empresa para sincronización incremental.
+
+myapp_cambioempresa tiene una fila por empresa (viva o borrada) con la
+`version` de su último cambio, sacada del contador 'cambios' de
+myapp_secuenciacodigo. Un cliente guarda la última versión que vio y pide
+`/api/v1/empresas/cambios/?since=<version>`: recibe solo las empresas
+creadas, cambiadas o borradas desde entonces, cada una una sola vez aunque
+haya cambiado muchas veces.
+
+En SQLite la mantienen triggers (migración 0015_cambioempresa), así que
+también cuentan bulk_create, bulk_update, queryset.update() y los borrados
+masivos; un UPDATE que no cambia ninguna columna visible no genera versión
+nueva. La versión se asigna dentro de la transacción que escribe (SQLite
+tiene un solo escritor), así que un cliente nunca se salta un cambio que se
+confirmó más tarde con una versión menor, cosa que sí pasaría usando
+fecha_actualizacion como cursor. En otros motores se registran con
+post_save / post_delete, y lotes.eliminar_en_lote escribe sus bajas con
+registrar_bajas (las demás escrituras masivas no quedan registradas).
+
+Al borrar queda una baja (eliminada = True). `manage.py purgar_cambios`
+borra las bajas antiguas y sube el contador 'cambios_purgados': un cursor
+por debajo de él recibe 410 y debe volver a sincronizar desde 0.
+"""
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .codigos import TABLA as TABLA_SECUENCIAS
+from .codigos import asegurar_minimo, reservar_codigos
+
+TABLA = 'myapp_cambioempresa'
+SECUENCIA_CAMBIOS = 'cambios'
+SECUENCIA_PURGADOS = 'cambios_purgados'
+
+# Columnas que ve un cliente de la API (las *_norm y la huella no cuentan)
+COLUMNAS_VISIBLES = ('cliente', 'compania', 'codigo', 'telefono', 'correo', 'pais', 'logo', 'logo_miniatura')
+
+_SIGUIENTE_VERSION = f"""
+    INSERT INTO {TABLA_SECUENCIAS} (nombre, valor) VALUES ('{SECUENCIA_CAMBIOS}', 1)
+    ON CONFLICT (nombre) DO UPDATE SET valor = {TABLA_SECUENCIAS}.valor + 1;"""
+_VERSION = f"(SELECT valor FROM {TABLA_SECUENCIAS} WHERE nombre = '{SECUENCIA_CAMBIOS}')"
+
+
+def _registrar(fila, eliminada, fecha):
+    return f"""
+        INSERT INTO {TABLA} (empresa_id, codigo, eliminada, version, fecha)
+        VALUES ({fila}.id, {fila}.codigo, {eliminada}, {_VERSION}, {fecha})
+        ON CONFLICT (empresa_id) DO UPDATE SET
+            codigo = excluded.codigo, eliminada = excluded.eliminada,
+            version = excluded.version, fecha = excluded.fecha;"""
+
+
+TRIGGERS_CAMBIOS = {
+    'myapp_empresa_cambios_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_cambios_ai AFTER INSERT ON myapp_empresa BEGIN
+            {_SIGUIENTE_VERSION}
+            {_registrar('new', 0, 'new.fecha_actualizacion')}
+        END""",
+    'myapp_empresa_cambios_au': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_cambios_au AFTER UPDATE ON myapp_empresa
+        WHEN {' OR '.join(f'old.{c} IS NOT new.{c}' for c in COLUMNAS_VISIBLES)} BEGIN
+            {_SIGUIENTE_VERSION}
+            {_registrar('new', 0, 'new.fecha_actualizacion')}
+        END""",
+    'myapp_empresa_cambios_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_cambios_ad AFTER DELETE ON myapp_empresa BEGIN
+            {_SIGUIENTE_VERSION}
+            {_registrar('old', 1, "strftime('%Y-%m-%d %H:%M:%f', 'now')")}
+        END""",
+}
+
+
+def con_triggers(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def asegurar_triggers_cambios(using='default'):
+    """
+    Recrea los triggers si faltan. Igual que los del índice FTS, una
+    migración que reconstruye myapp_empresa en SQLite se los lleva por
+    delante; se llama desde post_migrate (ver MyappConfig.ready).
+    """
+    if not con_triggers(using):
+        return False
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'myapp_empresa_cambios_%'"
+        )
+        existentes = {fila[0] for fila in cursor.fetchall()}
+        if existentes >= set(TRIGGERS_CAMBIOS):
+            return False
+        for sql in TRIGGERS_CAMBIOS.values():
+            cursor.execute(sql)
+    return True
+
+
+def purgar_bajas(antes_de, using='default'):
+    """Borra las bajas anteriores a `antes_de`; devuelve cuántas"""
+    from .models import CambioEmpresa
+    bajas = CambioEmpresa.objects.using(using).filter(eliminada=True, fecha__lt=antes_de)
+    ultima = bajas.order_by('-version').values_list('version', flat=True).first()
+    if ultima is None:
+        return 0
+    asegurar_minimo(ultima, secuencia=SECUENCIA_PURGADOS, using=using)
+    borradas, _ = bajas.filter(version__lte=ultima).delete()
+    return borradas
+
+
+# -- Otros motores: señales -------------------------------------------------
+
+def _registrar_con_orm(empresa, eliminada, using):
+    from .models import CambioEmpresa
+    CambioEmpresa.objects.using(using).update_or_create(
+        empresa_id=empresa.pk,
+        defaults={
+            'codigo': empresa.codigo,
+            'eliminada': eliminada,
+            'version': reservar_codigos(1, secuencia=SECUENCIA_CAMBIOS, using=using)[0],
+            'fecha': timezone.now() if eliminada else empresa.fecha_actualizacion,
+        },
+    )
+
+
+def registrar_bajas(empresas, using='default'):
+    """
+    Bajas de un borrado masivo, [(id, codigo), ...]: un bloque de versiones
+    y un solo INSERT ... ON CONFLICT DO UPDATE para todas
+    """
+    from .models import CambioEmpresa
+    if not empresas:
+        return
+    versiones = reservar_codigos(len(empresas), secuencia=SECUENCIA_CAMBIOS, using=using)
+    fecha = timezone.now()
+    CambioEmpresa.objects.using(using).bulk_create(
+        [
+            CambioEmpresa(empresa_id=id, codigo=codigo, eliminada=True, version=version, fecha=fecha)
+            for (id, codigo), version in zip(empresas, versiones)
+        ],
+        update_conflicts=True,
+        unique_fields=['empresa_id'],
+        update_fields=['codigo', 'eliminada', 'version', 'fecha'],
+    )
+
+
+@receiver(post_save, sender='myapp.Empresa')
+def _empresa_guardada(sender, instance, using, **kwargs):
+    if not con_triggers(using):
+        _registrar_con_orm(instance, False, using)
+
+
+@receiver(post_delete, sender='myapp.Empresa')
+def _empresa_borrada(sender, instance, using, **kwargs):
+    if not con_triggers(using):
+        _registrar_con_orm(instance, True, using)
@@ -0,0 +1,49 @@
+# myapp/codigos.py
+"""
+Asignación de códigos de Empresa ("0001", "0002", ...).
+
+Los números salen de un contador en la tabla myapp_secuenciacodigo. Cada
+reserva es un único INSERT ... ON CONFLICT DO UPDATE ... RETURNING, que la
+base de datos ejecuta de forma atómica: dos procesos nunca reciben el mismo
+número y no hace falta leer el "último" código ni ordenar cadenas.
+"""
+from django.db import connections
+
+TABLA = 'myapp_secuenciacodigo'
+SECUENCIA_EMPRESA = 'empresa'
+
+
+def formatear_codigo(numero):
+    """1 -> '0001'; a partir de 9999 simplemente crece ('10000')"""
+    return f"{numero:04d}"
+
+
+def reservar_codigos(cantidad=1, secuencia=SECUENCIA_EMPRESA, using=None):
+    """
+    Reserva `cantidad` números consecutivos en un solo viaje a la base de
+    datos y los devuelve como range. Pensado también para bulk_create:
+    `reservar_codigos(len(filas))` da un bloque para todo el lote.
+    """
+    if cantidad < 1:
+        return range(0)
+    with connections[using or 'default'].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TABLA} (nombre, valor) VALUES (%s, %s) "
+            f"ON CONFLICT (nombre) DO UPDATE SET valor = {TABLA}.valor + excluded.valor "
+            f"RETURNING valor",
+            [secuencia, cantidad],
+        )
+        ultimo = cursor.fetchone()[0]
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def asegurar_minimo(valor, secuencia=SECUENCIA_EMPRESA, using=None):
+    """Sube el contador hasta `valor` si está por debajo (códigos explícitos)"""
+    conexion = connections[using or 'default']
+    maximo = 'MAX' if conexion.vendor == 'sqlite' else 'GREATEST'
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TABLA} (nombre, valor) VALUES (%s, %s) "
+            f"ON CONFLICT (nombre) DO UPDATE SET valor = {maximo}({TABLA}.valor, excluded.valor)",
+            [secuencia, valor],
+        )
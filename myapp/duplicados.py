@@ -0,0 +1,244 @@
+# myapp/duplicados.py
+"""
+Detección de empresas casi duplicadas ("BMW", "B.M.W.", "BMW S.A.").
+
+Cada nombre se reduce a una clave (normalizada, sin puntos, sin formas
+societarias ni palabras vacías) y se parte en trigramas. La similitud es
+el índice de Jaccard entre los conjuntos de trigramas; si los dos nombres
+tienen números y no coinciden ("Norte 1" / "Norte 2") no son duplicados.
+
+Comparar todos contra todos es O(n²). IndiceNgramas usa filtrado por
+prefijo: los trigramas de cada nombre se ordenan del más raro al más común
+y solo se indexan los primeros |x| - ceil(t·|x|) + 1. Dos nombres con
+Jaccard >= t comparten por fuerza uno de esos trigramas, así que solo se
+verifican los nombres de esas listas. Los trigramas que aparecen en más de
+FRECUENCIA_MAXIMA nombres no generan candidatos: se pierden parecidos entre
+nombres hechos solo de trigramas muy comunes (las claves idénticas se
+detectan igual) a cambio de no recorrer listas enormes.
+
+Se usa en `manage.py duplicados`, en la importación (--revisar-duplicados)
+y en la vista de duplicados del admin.
+"""
+import bisect
+import math
+import re
+from collections import Counter, defaultdict
+
+from .normalizacion import normalizar
+
+UMBRAL = 0.7
+# Trigramas presentes en más nombres que esto no generan candidatos (ver IndiceNgramas)
+FRECUENCIA_MAXIMA = 250
+
+# Formas societarias y palabras que no distinguen una empresa de otra
+PALABRAS_VACIAS = frozenset({
+    'sa', 'sas', 'sac', 'saa', 'sl', 'srl', 'spa', 'sapi', 'cv', 'rl', 'ltda', 'ltd',
+    'limitada', 'inc', 'llc', 'corp', 'co', 'cia', 'gmbh', 'ag', 'plc', 'eirl',
+    'de', 'del', 'la', 'las', 'el', 'los', 'y', 'e', 'the', 'and', 'of',
+})
+
+_SEPARADOR = re.compile(r'[^0-9a-z]+')
+
+
+def clave(texto):
+    """'B.M.W. S.A.' -> 'bmw'; 'Coca-Cola de México' -> 'coca cola mexico'"""
+    palabras = []
+    sueltas = ''  # "b m w" (siglas con espacios) se vuelve "bmw"
+    for palabra in _SEPARADOR.split(normalizar(texto).replace('.', '')):
+        if len(palabra) == 1 and palabra.isalpha():
+            sueltas += palabra
+            continue
+        if sueltas and sueltas not in PALABRAS_VACIAS:
+            palabras.append(sueltas)
+        sueltas = ''
+        if palabra and palabra not in PALABRAS_VACIAS:
+            palabras.append(palabra)
+    if sueltas and sueltas not in PALABRAS_VACIAS:
+        palabras.append(sueltas)
+    return ' '.join(palabras)
+
+
+def trigramas(texto_clave):
+    """
+    Trigramas por palabra, con relleno como pg_trgm ('  b', ' bm', 'bmw',
+    'mw '). Los números van enteros ('#12'): o coinciden o no.
+    """
+    grupos = set()
+    for palabra in texto_clave.split():
+        if palabra.isdigit():
+            grupos.add(f'#{palabra}')
+            continue
+        relleno = f'  {palabra} '
+        grupos.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return frozenset(grupos)
+
+
+def _numeros(texto_clave):
+    return frozenset(p for p in texto_clave.split() if p.isdigit())
+
+
+def similitud(a, b):
+    """Jaccard entre dos conjuntos de trigramas"""
+    if not a or not b:
+        return 0.0
+    comunes = len(a & b)
+    return comunes / (len(a) + len(b) - comunes)
+
+
+class IndiceNgramas:
+    """
+    Índice invertido de trigramas con filtrado por prefijo.
+
+    `frecuencias` fija el orden global de los trigramas (de raro a común);
+    los que no aparecen cuentan como frecuencia 0. Las referencias pueden
+    ser cualquier objeto (ids, instancias sin guardar...). Los nombres con
+    la misma clave se guardan una sola vez y devuelven la primera referencia.
+
+    Con `por_largo=True` quien lo usa promete agregar los nombres de menor a
+    mayor número de trigramas (como grupos_duplicados): entonces basta
+    indexar un prefijo más corto (el de PPJoin) y las entradas demasiado
+    cortas para los nombres que vienen se pueden quitar de las listas.
+    """
+
+    def __init__(self, frecuencias=None, umbral=UMBRAL, por_largo=False):
+        self.umbral = umbral
+        self.frecuencias = frecuencias or {}
+        self.por_largo = por_largo
+        self._registros = []  # (referencia, trigramas, números)
+        self._por_clave = {}  # clave -> posición en _registros
+        self._largos = []  # posición -> número de trigramas
+        self._listas = defaultdict(list)  # trigrama -> [posición]
+
+    @classmethod
+    def desde_textos(cls, textos, umbral=UMBRAL):
+        """Índice con el orden de trigramas calculado sobre `textos`"""
+        frecuencias = Counter()
+        for texto in textos:
+            frecuencias.update(trigramas(clave(texto)))
+        return cls(frecuencias, umbral)
+
+    def _preparar(self, texto_clave):
+        ordenados = sorted(trigramas(texto_clave), key=lambda g: (self.frecuencias.get(g, 0), g))
+        return ordenados, _numeros(texto_clave)
+
+    def _largo_prefijo(self, largo, indice=False):
+        if indice and self.por_largo:
+            return largo - math.ceil(2 * self.umbral / (1 + self.umbral) * largo) + 1
+        return largo - math.ceil(self.umbral * largo) + 1
+
+    def _similares(self, texto_clave, ordenados, numeros):
+        if texto_clave in self._por_clave:
+            return [(self._registros[self._por_clave[texto_clave]][0], 1.0)]
+        largo = len(ordenados)
+        minimo, maximo = self.umbral * largo, largo / self.umbral
+        # Solape mínimo con un nombre de k trigramas: Jaccard >= t <=> |x∩y| >= t/(1+t)·(|x|+|y|)
+        factor = self.umbral / (1 + self.umbral)
+        necesarios = [math.ceil(factor * (largo + k)) for k in range(int(maximo) + 1)]
+        candidatos = set()
+        for grupo in ordenados[:self._largo_prefijo(largo)]:
+            if self.frecuencias.get(grupo, 0) > FRECUENCIA_MAXIMA:
+                break  # los siguientes son aún más comunes
+            lista = self._listas.get(grupo)
+            if not lista:
+                continue
+            if self.por_largo:
+                # Ordenada por largo: lo que ya es corto para este lo será para los siguientes
+                cortas = bisect.bisect_left(lista, minimo, key=self._largos.__getitem__)
+                del lista[:cortas]
+            candidatos.update(lista)
+
+        conjunto = frozenset(ordenados)
+        encontrados = []
+        for posicion in candidatos:
+            referencia, otros, otros_numeros = self._registros[posicion]
+            largo_otro = len(otros)
+            if largo_otro < minimo or largo_otro > maximo:
+                continue
+            comunes = len(conjunto & otros)
+            if comunes < necesarios[largo_otro]:
+                continue
+            if numeros and otros_numeros and numeros != otros_numeros:
+                continue
+            encontrados.append((referencia, comunes / (largo + largo_otro - comunes)))
+        encontrados.sort(key=lambda par: -par[1])
+        return encontrados
+
+    def _agregar(self, referencia, texto_clave, ordenados, numeros):
+        if not ordenados or texto_clave in self._por_clave:
+            return
+        posicion = len(self._registros)
+        self._por_clave[texto_clave] = posicion
+        self._registros.append((referencia, frozenset(ordenados), numeros))
+        largo = len(ordenados)
+        self._largos.append(largo)
+        for grupo in ordenados[:self._largo_prefijo(largo, indice=True)]:
+            if self.frecuencias.get(grupo, 0) > FRECUENCIA_MAXIMA:
+                break
+            self._listas[grupo].append(posicion)
+
+    def similares(self, texto):
+        """[(referencia, similitud)] de los textos ya agregados que superan el umbral"""
+        texto_clave = clave(texto)
+        ordenados, numeros = self._preparar(texto_clave)
+        return self._similares(texto_clave, ordenados, numeros) if ordenados else []
+
+    def agregar(self, referencia, texto):
+        texto_clave = clave(texto)
+        self._agregar(referencia, texto_clave, *self._preparar(texto_clave))
+
+    def __len__(self):
+        return len(self._registros)
+
+
+def grupos_duplicados(filas, umbral=UMBRAL):
+    """
+    Agrupa `filas` [(id, nombre), ...] en grupos de posibles duplicados.
+
+    Devuelve [{'ids': [...], 'similitud': mínima de los pares que unieron
+    el grupo}], los grupos más grandes primero.
+    """
+    claves = []
+    frecuencias = Counter()
+    for pk, nombre in filas:
+        texto_clave = clave(nombre)
+        grupos = trigramas(texto_clave)
+        if grupos:
+            frecuencias.update(grupos)
+            claves.append((len(grupos), pk, texto_clave))
+    claves.sort(key=lambda c: c[0])
+    indice = IndiceNgramas(frecuencias, umbral, por_largo=True)
+    padre = {}
+
+    def raiz(pk):
+        padre.setdefault(pk, pk)
+        while padre[pk] != pk:
+            padre[pk] = padre[padre[pk]]
+            pk = padre[pk]
+        return pk
+
+    pares = []
+    for _, pk, texto_clave in claves:
+        ordenados, numeros = indice._preparar(texto_clave)
+        for otro, valor in indice._similares(texto_clave, ordenados, numeros):
+            pares.append((pk, valor))
+            padre[raiz(pk)] = raiz(otro)  # unión
+        indice._agregar(pk, texto_clave, ordenados, numeros)
+
+    grupos = defaultdict(lambda: {'ids': [], 'similitud': 1.0})
+    for pk in padre:
+        grupos[raiz(pk)]['ids'].append(pk)
+    for pk, valor in pares:
+        grupo = grupos[raiz(pk)]
+        grupo['similitud'] = min(grupo['similitud'], round(valor, 2))
+    resultado = [g for g in grupos.values() if len(g['ids']) > 1]
+    for grupo in resultado:
+        grupo['ids'].sort()
+    resultado.sort(key=lambda g: (-len(g['ids']), g['ids'][0]))
+    return resultado
+
+
+def grupos_empresas(umbral=UMBRAL, using='default'):
+    """grupos_duplicados sobre toda la tabla, leyendo solo id y compania_norm"""
+    from .models import Empresa
+    filas = Empresa.objects.using(using).values_list('id', 'compania_norm').iterator(chunk_size=5000)
+    return grupos_duplicados(filas, umbral)
@@ -0,0 +1,222 @@
+# myapp/exportacion.py
+"""
+Exportación del directorio a CSV y XLSX con memoria constante.
+
+- CSV: generador de líneas para StreamingHttpResponse; el primer byte
+  (cabecera) sale antes de tocar la base de datos.
+- XLSX: generador de bloques del ZIP. Las partes fijas del libro se
+  escriben primero y la hoja se comprime y se envía cada CHUNK filas
+  (zipfile sobre un pseudo-archivo sin seek: tamaños y CRC van en data
+  descriptors), sin archivo temporal ni esperar al final.
+
+En ambos casos el queryset se recorre con .values_list().iterator(), así
+que nunca hay más de CHUNK filas cargadas a la vez.
+
+Fórmulas: en el CSV los textos que empiezan por =, +, -, @, tabulador o
+retorno de carro se prefijan con ' para que Excel no los evalúe; en el
+XLSX todas las celdas de texto van como cadena (t="inlineStr"), que Excel
+nunca interpreta como fórmula.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .busqueda import buscar_empresas
+from .models import Empresa
+
+CHUNK = 2000
+COLUMNAS = (
+    ('codigo', 'Código'),
+    ('cliente', 'Cliente'),
+    ('compania', 'Compañía'),
+    ('telefono', 'Teléfono'),
+    ('correo', 'Correo'),
+    ('pais', 'País'),
+    ('fecha_creacion', 'Fecha de creación'),
+    ('fecha_actualizacion', 'Fecha de actualización'),
+)
+FORMATOS = ('csv', 'xlsx')
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def filtrar_empresas(q='', campo='all', is_admin=False):
+    """Mismos filtros que home, en orden estable (id descendente)"""
+    empresas = Empresa.objects.order_by('-id')
+    if q:
+        empresas = buscar_empresas(empresas, q, campo, is_admin, por_relevancia=False)
+    return empresas
+
+
+def _filas(queryset):
+    campos = [campo for campo, _ in COLUMNAS]
+    return queryset.values_list(*campos).iterator(chunk_size=CHUNK)
+
+
+def _fecha_local(valor):
+    # Excel no admite zonas horarias: hora local sin tzinfo
+    return timezone.localtime(valor).replace(tzinfo=None) if valor else None
+
+
+def _neutralizar(valor):
+    """'=1+1' -> "'=1+1" (inyección de fórmulas al abrir el CSV en Excel)"""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(queryset):
+    """Genera el CSV línea a línea (con BOM para que Excel detecte UTF-8)"""
+    writer = csv.writer(_Eco())
+    yield '\ufeff' + writer.writerow([titulo for _, titulo in COLUMNAS])
+    for fila in _filas(queryset):
+        *datos, creada, actualizada = fila
+        yield writer.writerow([
+            *(_neutralizar(valor) for valor in datos),
+            _fecha_local(creada).isoformat(sep=' ', timespec='seconds') if creada else '',
+            _fecha_local(actualizada).isoformat(sep=' ', timespec='seconds') if actualizada else '',
+        ])
+
+
+# -- XLSX ----------------------------------------------------------------------
+
+_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_NS_PAQUETE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_PARTES_FIJAS = {
+    '[Content_Types].xml': (
+        f'{_XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        f'{_XML}<Relationships xmlns="{_NS_PAQUETE}">'
+        f'<Relationship Id="rId1" Type="{_NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        f'{_XML}<workbook xmlns="{_NS}" xmlns:r="{_NS_REL}">'
+        '<sheets><sheet name="Empresas" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        f'{_XML}<Relationships xmlns="{_NS_PAQUETE}">'
+        f'<Relationship Id="rId1" Type="{_NS_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_NS_REL}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Estilo 1: fecha y hora (el mismo formato que usaba openpyxl)
+    'xl/styles.xml': (
+        f'{_XML}<styleSheet xmlns="{_NS}">'
+        '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd h:mm:ss"/></numFmts>'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+_LETRAS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+# Caracteres de control que XML 1.0 no admite
+_NO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _Tubo:
+    """Pseudo-archivo sin seek para zipfile: guarda lo escrito hasta vaciarlo"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _celda(columna, fila, valor):
+    ref = f'{_LETRAS[columna]}{fila}'
+    if valor is None or valor == '':
+        return ''
+    if isinstance(valor, datetime):
+        serie = (valor - _EPOCA_EXCEL).total_seconds() / 86400
+        return f'<c r="{ref}" s="1"><v>{serie!r}</v></c>'
+    texto = escape(_NO_XML.sub('', str(valor)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero, valores):
+    celdas = ''.join(_celda(i, numero, valor) for i, valor in enumerate(valores))
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+def bloques_xlsx(queryset):
+    """Genera el XLSX por bloques (para StreamingHttpResponse o un archivo)"""
+    tubo = _Tubo()
+    with zipfile.ZipFile(tubo, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _PARTES_FIJAS.items():
+            libro.writestr(nombre, contenido)
+        yield tubo.vaciar()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w') as hoja:
+            hoja.write(f'{_XML}<worksheet xmlns="{_NS}"><sheetData>'.encode())
+            hoja.write(_fila_xml(1, [titulo for _, titulo in COLUMNAS]).encode())
+            bloque = []
+            for numero, fila in enumerate(_filas(queryset), 2):
+                *datos, creada, actualizada = fila
+                bloque.append(_fila_xml(numero, [*datos, _fecha_local(creada), _fecha_local(actualizada)]))
+                if len(bloque) >= CHUNK:
+                    hoja.write(''.join(bloque).encode())
+                    bloque = []
+                    yield tubo.vaciar()
+            hoja.write((''.join(bloque) + '</sheetData></worksheet>').encode())
+    yield tubo.vaciar()
+
+
+def escribir_xlsx(queryset, destino):
+    """Escribe el XLSX en `destino` (ruta o archivo binario)"""
+    if hasattr(destino, 'write'):
+        destino.writelines(bloques_xlsx(queryset))
+        return destino
+    with open(destino, 'wb') as archivo:
+        archivo.writelines(bloques_xlsx(queryset))
+    return destino
+
+
+def nombre_archivo(formato):
+    return f"empresas_{timezone.localtime():%Y%m%d_%H%M}.{formato}"
@@ -0,0 +1,372 @@
+# myapp/importacion.py
+"""
+Motor de importación de empresas desde Excel por lotes.
+
+- Lee el libro en modo read_only con iter_rows (memoria constante).
+- Carga una sola vez las empresas existentes en mapas en memoria
+  (por código y por compañía) en lugar de 2 consultas por fila.
+- Escribe con bulk_create / bulk_update dentro de una transacción por lote,
+  así el bloqueo de escritura de SQLite solo se mantiene lo que dura cada lote.
+- Genera las miniaturas de los logos en un pool de hilos mientras se leen filas.
+- Los logos se guardan por contenido (enlace duro, sin copia; ver
+  myapp/almacenamiento.py): un logo repetido ocupa un solo archivo.
+- Guarda en cada empresa la huella de su fila (cliente, compañía, código y
+  sha256 del logo): si al reimportar la fila no cambió, no se reescribe ni
+  se vuelve a copiar el logo. Con `simular` se calcula solo el resumen.
+- Anota en PuntoControlImportacion la última fila guardada (en la misma
+  transacción que el lote): si se corta, la siguiente ejecución con el
+  mismo archivo retoma desde ahí.
+"""
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .almacenamiento import almacenamiento_logos, nombre_por_contenido, sha256_archivo
+from .cache_busqueda import invalidar_busquedas
+from .codigos import asegurar_minimo, formatear_codigo, reservar_codigos
+from .duplicados import UMBRAL, IndiceNgramas
+from .miniaturas import generar_miniaturas
+from .models import Empresa, PuntoControlImportacion
+from .normalizacion import normalizar, normalizar_instancia
+
+CAMPOS_ACTUALIZABLES = ['cliente', 'compania', 'logo', 'logo_miniatura', 'huella_importacion', 'fecha_actualizacion']
+# Cambios que se detallan en una simulación (el resto solo se cuentan)
+LIMITE_CAMBIOS = 500
+# Sin cambios que guardar, el punto de control avanza cada tantos lotes de filas
+LOTES_POR_PUNTO_CONTROL = 10
+
+
+@dataclass
+class ResultadoImportacion:
+    procesadas: int = 0
+    creadas: int = 0
+    actualizadas: int = 0
+    saltadas: int = 0
+    errores: int = 0
+    mensajes_error: list = field(default_factory=list)
+    duplicados: int = 0
+    mensajes_duplicado: list = field(default_factory=list)
+    sin_cambios: int = 0
+    mensajes_cambio: list = field(default_factory=list)
+    reanudada_desde: int = 0
+    inicio: float = field(default_factory=time.perf_counter)
+    segundos: float = 0.0
+
+    @property
+    def filas_por_segundo(self):
+        return self.procesadas / self.segundos if self.segundos else 0.0
+
+    def registrar_error(self, fila, error):
+        self.errores += 1
+        self.mensajes_error.append(f"Fila {fila}: {error}")
+
+    def registrar_duplicado(self, fila, compania, parecida, similitud):
+        self.duplicados += 1
+        codigo = parecida.codigo or 'nueva en este archivo'
+        self.mensajes_duplicado.append(
+            f"Fila {fila}: «{compania}» se parece a «{parecida.compania}» ({codigo}, similitud {similitud:.2f})"
+        )
+
+    def registrar_cambio(self, fila, empresa, cambios):
+        if len(self.mensajes_cambio) < LIMITE_CAMBIOS:
+            self.mensajes_cambio.append(f"Fila {fila} [{empresa.codigo}]: {'; '.join(cambios)}")
+
+
+def _texto(valor):
+    return str(valor).strip() if valor else ""
+
+
+def huella_fila(cliente, compania, codigo, sha_logo):
+    """Resumen de 32 caracteres de lo que la fila aporta a la empresa"""
+    datos = '\x1f'.join((cliente, compania, codigo, sha_logo)).encode('utf-8')
+    return hashlib.blake2b(datos, digest_size=16).hexdigest()
+
+
+
+
+class ImportadorEmpresas:
+    """
+    Importa un .xlsx (A=Cliente, B=Compañía, C=Código, encabezados en la
+    fila 1). `logos` es la lista ordenada de imágenes extraídas: la imagen
+    en la posición i corresponde a la fila i (igual que antes).
+
+    Con `revisar_duplicados` las filas nuevas cuyo nombre se parece a una
+    empresa existente (o a una anterior del mismo archivo) no se crean: se
+    informan en el resultado para revisarlas (ver myapp/duplicados.py).
+
+    Con `simular` no se escribe nada (ni base de datos ni logos): el
+    resultado cuenta lo que se crearía, actualizaría o quedaría igual y
+    detalla los cambios. `forzar` ignora huellas y punto de control.
+    """
+
+    def __init__(self, xlsx_path, logos=None, batch_size=1000, progreso=None,
+                 revisar_duplicados=False, umbral_duplicados=UMBRAL, simular=False, forzar=False):
+        self.xlsx_path = Path(xlsx_path)
+        self.logos = list(logos or [])
+        self.batch_size = max(1, batch_size)
+        self.progreso = progreso
+
+        self.por_codigo = {}
+        self.por_compania = {}
+        self._crear = []
+        self._actualizar = {}
+        self._filas = {}
+        self._miniaturas = []
+        self._pool = None
+        self.revisar_duplicados = revisar_duplicados
+        self.umbral_duplicados = umbral_duplicados
+        self._indice_duplicados = None
+        self.simular = simular
+        self.forzar = forzar
+        self._huella_archivo = None
+        self._ultima_fila = 1
+        self._filas_sin_guardar = 0
+        self._sha_logos = {}  # carpeta -> {archivo: sha256} del manifest.json
+
+    # -- Preparación -------------------------------------------------------
+
+    def _cargar_existentes(self):
+        """Una sola consulta para construir los mapas de búsqueda"""
+        existentes = Empresa.objects.only(
+            'id', 'cliente', 'compania', 'compania_norm', 'codigo', 'logo', 'logo_miniatura', 'huella_importacion')
+        cargadas = []
+        for empresa in existentes.iterator(chunk_size=2000):
+            self._indexar(empresa)
+            if self.revisar_duplicados:
+                cargadas.append(empresa)
+        if self.revisar_duplicados:
+            self._indice_duplicados = IndiceNgramas.desde_textos(
+                (e.compania_norm for e in cargadas), self.umbral_duplicados)
+            for empresa in cargadas:
+                self._indice_duplicados.agregar(empresa, empresa.compania_norm)
+
+    def _indexar(self, empresa):
+        if empresa.codigo:
+            self.por_codigo.setdefault(empresa.codigo, empresa)
+        # Clave normalizada: "COMPAÑÍA  Sur" empareja con "Compania Sur"
+        if empresa.compania_norm:
+            self.por_compania.setdefault(empresa.compania_norm, empresa)
+
+    def _buscar(self, codigo, compania):
+        empresa = None
+        if codigo:
+            empresa = self.por_codigo.get(codigo)
+        if not empresa and compania:
+            empresa = self.por_compania.get(normalizar(compania))
+        return empresa
+
+    def _sha_logo(self, idx):
+        """sha256 del logo de la fila: del manifest de la extracción o leyendo el archivo"""
+        if idx >= len(self.logos):
+            return ''
+        logo_path = Path(self.logos[idx])
+        carpeta = logo_path.parent
+        if carpeta not in self._sha_logos:
+            from extract_images_zip import leer_manifiesto
+            self._sha_logos[carpeta] = {e['archivo']: e['sha256'] for e in leer_manifiesto(carpeta) if 'sha256' in e}
+        return self._sha_logos[carpeta].get(logo_path.name) or sha256_archivo(logo_path)
+
+    def _guardar_logo(self, idx, sha):
+        if idx >= len(self.logos):
+            return None
+        logo_path = Path(self.logos[idx])
+        if self.simular:
+            return nombre_por_contenido(sha, logo_path.suffix)
+        return almacenamiento_logos.importar(logo_path, sha)
+
+    # -- Punto de control ----------------------------------------------------
+
+    def _leer_punto_control(self):
+        """Fila desde la que retomar (1 = desde el principio)"""
+        if self.simular:
+            return 1
+        self._huella_archivo = sha256_archivo(self.xlsx_path)
+        if self.forzar:
+            PuntoControlImportacion.objects.filter(pk=self._huella_archivo).delete()
+            return 1
+        punto = PuntoControlImportacion.objects.filter(pk=self._huella_archivo).first()
+        return punto.fila if punto else 1
+
+    def _marcar_punto_control(self):
+        if self._huella_archivo:
+            PuntoControlImportacion.objects.update_or_create(
+                huella_archivo=self._huella_archivo, defaults={'fila': self._ultima_fila})
+
+    # -- Escritura por lotes -----------------------------------------------
+
+    def _pendientes(self):
+        return len(self._crear) + len(self._actualizar)
+
+    def _asignar_codigos(self, nuevas):
+        sin_codigo = [e for e in nuevas if not e.codigo]
+        for empresa, numero in zip(sin_codigo, reservar_codigos(len(sin_codigo))):
+            empresa.codigo = formatear_codigo(numero)
+            self.por_codigo.setdefault(empresa.codigo, empresa)
+        explicitos = [int(e.codigo) for e in nuevas if e.codigo.isdigit()]
+        if explicitos:
+            asegurar_minimo(max(explicitos))
+
+    def _esperar_miniaturas(self):
+        for empresa, futuro in self._miniaturas:
+            empresa.logo_miniatura = futuro.result()
+        self._miniaturas = []
+
+    def _guardar_lote(self, resultado):
+        self._esperar_miniaturas()
+        crear, actualizar = self._crear, list(self._actualizar.values())
+        self._crear, self._actualizar = [], {}
+        self._filas_sin_guardar = 0
+
+        if self.simular:
+            resultado.creadas += len(crear)
+            resultado.actualizadas += len(actualizar)
+        elif crear or actualizar:
+            ahora = timezone.now()
+            for empresa in actualizar:
+                empresa.fecha_actualizacion = ahora
+            try:
+                with transaction.atomic():
+                    self._asignar_codigos(crear)
+                    Empresa.objects.bulk_create(crear, batch_size=self.batch_size)
+                    Empresa.objects.bulk_update(actualizar, CAMPOS_ACTUALIZABLES, batch_size=self.batch_size)
+                    self._marcar_punto_control()
+                resultado.creadas += len(crear)
+                resultado.actualizadas += len(actualizar)
+            except IntegrityError:
+                # Algún registro del lote choca: se reintenta fila a fila para aislarlo
+                self._guardar_uno_a_uno(crear, actualizar, resultado)
+                self._marcar_punto_control()
+
+            # bulk_create/bulk_update no emiten post_save
+            invalidar_busquedas()
+        else:
+            # Todo el tramo sin cambios: solo avanza el punto de control
+            self._marcar_punto_control()
+
+        self._filas = {}
+        resultado.segundos = time.perf_counter() - resultado.inicio
+        if self.progreso:
+            self.progreso(resultado)
+
+    def _guardar_uno_a_uno(self, crear, actualizar, resultado):
+        for empresa in crear:
+            empresa.pk = None
+            try:
+                with transaction.atomic():
+                    empresa.save()
+                resultado.creadas += 1
+            except Exception as e:
+                resultado.registrar_error(self._filas.get(id(empresa), '?'), e)
+        for empresa in actualizar:
+            try:
+                with transaction.atomic():
+                    empresa.save(update_fields=CAMPOS_ACTUALIZABLES)
+                resultado.actualizadas += 1
+            except Exception as e:
+                resultado.registrar_error(self._filas.get(id(empresa), '?'), e)
+
+    # -- Proceso principal -------------------------------------------------
+
+    def ejecutar(self):
+        resultado = ResultadoImportacion()
+        desde = self._leer_punto_control()
+        if desde > 1:
+            # Las filas hasta `desde` ya están guardadas (y cargadas en los mapas)
+            resultado.reanudada_desde = desde
+            resultado.procesadas = desde - 1
+        self._cargar_existentes()
+
+        wb = load_workbook(self.xlsx_path, read_only=True, data_only=True)
+        self._pool = ThreadPoolExecutor()
+        try:
+            ws = wb.active
+            filas = ws.iter_rows(min_row=max(2, desde + 1), max_col=3, values_only=True)
+            for idx, valores in enumerate(filas, start=max(0, desde - 1)):
+                fila = idx + 2
+                resultado.procesadas += 1
+                self._filas_sin_guardar += 1
+                valores = tuple(valores) + (None,) * (3 - len(valores))
+                cliente, compania, codigo = (_texto(v) for v in valores[:3])
+
+                if not (cliente or compania):
+                    resultado.saltadas += 1
+                    continue
+
+                try:
+                    self._procesar_fila(resultado, idx, fila, cliente, compania, codigo)
+                except Exception as e:
+                    resultado.registrar_error(fila, e)
+
+                self._ultima_fila = fila
+                if (self._pendientes() >= self.batch_size
+                        or self._filas_sin_guardar >= self.batch_size * LOTES_POR_PUNTO_CONTROL):
+                    self._guardar_lote(resultado)
+
+            self._guardar_lote(resultado)
+            if self._huella_archivo:
+                # Terminó: la próxima vez con este archivo se compara desde el principio
+                PuntoControlImportacion.objects.filter(pk=self._huella_archivo).delete()
+        finally:
+            self._pool.shutdown()
+            wb.close()
+
+        resultado.segundos = time.perf_counter() - resultado.inicio
+        return resultado
+
+    def _procesar_fila(self, resultado, idx, fila, cliente, compania, codigo):
+        empresa = self._buscar(codigo, compania)
+        sha_logo = self._sha_logo(idx)
+        huella = huella_fila(cliente, compania, codigo, sha_logo)
+        if empresa and empresa.huella_importacion == huella and not self.forzar:
+            resultado.sin_cambios += 1
+            return
+        if not empresa and self._indice_duplicados is not None:
+            parecidas = self._indice_duplicados.similares(compania)
+            if parecidas:
+                resultado.registrar_duplicado(fila, compania, *parecidas[0])
+                return
+        logo_field = self._guardar_logo(idx, sha_logo)
+        generar = logo_field and not self.simular
+
+        if empresa:
+            if self.simular:
+                cambios = [
+                    f"{campo}: «{getattr(empresa, campo)}» → «{nuevo}»"
+                    for campo, nuevo in (('cliente', cliente), ('compania', compania))
+                    if getattr(empresa, campo) != nuevo
+                ]
+                resultado.registrar_cambio(fila, empresa, cambios or ['logo'])
+            empresa.cliente = cliente
+            empresa.compania = compania
+            empresa.huella_importacion = huella
+            if logo_field:
+                empresa.logo = logo_field
+            if generar:
+                self._miniaturas.append((empresa, self._pool.submit(generar_miniaturas, logo_field)))
+            if empresa.pk is not None:
+                self._actualizar[empresa.pk] = empresa
+        else:
+            empresa = Empresa(
+                cliente=cliente,
+                compania=compania,
+                codigo=codigo,
+                telefono='',
+                correo='',
+                pais='',
+                logo=logo_field or '',
+                huella_importacion=huella,
+            )
+            if generar:
+                self._miniaturas.append((empresa, self._pool.submit(generar_miniaturas, logo_field)))
+            self._crear.append(empresa)
+            if self._indice_duplicados is not None:
+                self._indice_duplicados.agregar(empresa, compania)
+        self._filas[id(empresa)] = fila
+        normalizar_instancia(empresa)
+        self._indexar(empresa)
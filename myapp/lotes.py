@@ -0,0 +1,80 @@
+# myapp/lotes.py
+"""
+Edición y borrado de varias empresas a la vez (home y admin).
+
+Cada operación cuesta las mismas consultas seleccione una empresa o mil:
+
+- editar_en_lote: un UPDATE ... WHERE id IN (...) (EmpresaQuerySet.update
+  rellena las columnas *_norm).
+- eliminar_en_lote: un DELETE ... RETURNING y el ajuste del contador de
+  referencias, sin cargar las empresas ni emitir un post_delete por cada
+  una. Los archivos de logo que quedan sin uso se borran en segundo plano
+  tras confirmar (ver ajustar_referencias).
+
+En SQLite los triggers mantienen el índice FTS y el registro de cambios de
+la API (bajas incluidas); en otros motores eliminar_en_lote escribe las
+bajas con un solo upsert (cambios.registrar_bajas). Cada operación va en
+una sola transacción.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .almacenamiento import ajustar_referencias
+from .cache_busqueda import invalidar_busquedas
+from .cambios import con_triggers, registrar_bajas
+from .models import Empresa
+
+CAMPOS_EDITABLES = ('cliente', 'compania', 'telefono', 'correo', 'pais')
+MAXIMO_LOTE = 1000
+
+
+def leer_ids(valores):
+    """['3', '7', '7'] -> [3, 7]; ValidationError si algo no es un id"""
+    try:
+        ids = sorted({int(valor) for valor in valores})
+    except (TypeError, ValueError):
+        raise ValidationError('La selección contiene ids no válidos.')
+    if not ids:
+        raise ValidationError('No seleccionaste ninguna empresa.')
+    if len(ids) > MAXIMO_LOTE:
+        raise ValidationError(f'Como máximo {MAXIMO_LOTE} empresas a la vez.')
+    return ids
+
+
+def editar_en_lote(ids, campo, valor, using='default'):
+    """Pone `campo` = `valor` en las empresas `ids`; devuelve cuántas cambió"""
+    if campo not in CAMPOS_EDITABLES:
+        raise ValidationError(f'El campo "{campo}" no se puede editar en lote.')
+    valor = (valor or '').strip()
+    if campo == 'cliente' and not valor:
+        raise ValidationError('El cliente no puede quedar vacío.')
+    # Largo máximo y formato de correo, igual que el modelo
+    Empresa._meta.get_field(campo).run_validators(valor)
+
+    with transaction.atomic(using=using):
+        cambiadas = Empresa.objects.using(using).filter(id__in=ids).update(
+            **{campo: valor, 'fecha_actualizacion': timezone.now()}
+        )
+    # queryset.update no emite post_save
+    invalidar_busquedas()
+    return cambiadas
+
+
+def eliminar_en_lote(ids, using='default'):
+    """Borra las empresas `ids`; devuelve cuántas borró"""
+    conexion = connections[using]
+    tabla = conexion.ops.quote_name(Empresa._meta.db_table)
+    with transaction.atomic(using=using):
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {tabla} WHERE id IN ({', '.join(['%s'] * len(ids))}) RETURNING id, codigo, logo",
+                list(ids),
+            )
+            filas = cursor.fetchall()
+        ajustar_referencias(restar=[logo for _, _, logo in filas], using=using)
+        if not con_triggers(using):
+            registrar_bajas([(id, codigo) for id, codigo, _ in filas], using=using)
+    # Sin post_delete: se invalida una sola vez
+    invalidar_busquedas()
+    return len(filas)
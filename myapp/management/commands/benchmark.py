@@ -0,0 +1,125 @@
+"""
+Benchmark reproducible de las rutas críticas del directorio.
+
+Crea una base de datos desechable (como la de los tests), la siembra con
+datos sintéticos y mide búsqueda en home por campo, paginación profunda,
+asignación de códigos en Empresa.save, import_empresas y la extracción de
+imágenes. Nunca toca la base de datos ni la carpeta media reales.
+
+    python manage.py benchmark --filas 20000 --salida resultados.json
+    python manage.py benchmark --baseline benchmarks/base.json          # falla si hay regresiones
+    python manage.py benchmark --baseline benchmarks/base.json --guardar-baseline
+"""
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from myapp import benchmark
+
+POR_PAGINA_MINIMO = benchmark.POR_PAGINA * 2
+
+
+class Command(BaseCommand):
+    help = "Mide las rutas críticas sobre una base de datos desechable y compara contra una línea base"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Empresas sintéticas a sembrar (default: 10000)')
+        parser.add_argument('--logos', type=int, default=50, help='Empresas con logo / imágenes en el Excel (default: 50)')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por escenario (default: 5)')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla de los datos sintéticos (default: 42)')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+        parser.add_argument('--baseline', help='JSON de referencia para detectar regresiones')
+        parser.add_argument(
+            '--umbral',
+            type=float,
+            default=0.25,
+            help='Empeoramiento relativo de tiempo tolerado (default: 0.25 = 25%%)'
+        )
+        parser.add_argument(
+            '--guardar-baseline',
+            action='store_true',
+            help='Sobrescribir --baseline con estos resultados en lugar de comparar'
+        )
+
+    def handle(self, *args, **options):
+        if options['filas'] < POR_PAGINA_MINIMO:
+            raise CommandError(f"❌ --filas debe ser al menos {POR_PAGINA_MINIMO}")
+        if options['guardar_baseline'] and not options['baseline']:
+            raise CommandError("❌ --guardar-baseline necesita --baseline")
+
+        temporal = Path(tempfile.mkdtemp(prefix='benchmark_'))
+        self.stdout.write(self.style.NOTICE(f"🧪 Base de datos y media temporales en {temporal}"))
+        try:
+            resultados = self._medir(temporal, options)
+        finally:
+            shutil.rmtree(temporal, ignore_errors=True)
+
+        self._mostrar(resultados)
+        contenido = json.dumps(resultados, indent=2, ensure_ascii=False)
+        if options['salida']:
+            Path(options['salida']).write_text(contenido, encoding='utf-8')
+            self.stdout.write(f"💾 Resultados en {options['salida']}")
+
+        if not options['baseline']:
+            return
+        baseline = Path(options['baseline'])
+        if options['guardar_baseline']:
+            baseline.parent.mkdir(parents=True, exist_ok=True)
+            baseline.write_text(contenido, encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"✅ Línea base guardada en {baseline}"))
+            return
+        if not baseline.exists():
+            raise CommandError(f"❌ No existe la línea base {baseline}")
+
+        base = json.loads(baseline.read_text(encoding='utf-8'))
+        for clave in ('filas', 'logos', 'repeticiones'):
+            if base.get('meta', {}).get(clave) != resultados['meta'][clave]:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️  La línea base usó {clave}={base.get('meta', {}).get(clave)}; la comparación puede no ser justa"
+                ))
+        regresiones = benchmark.comparar(resultados, base, options['umbral'])
+        if regresiones:
+            for regresion in regresiones:
+                self.stdout.write(self.style.ERROR(f"  ✗ {regresion}"))
+            raise CommandError(f"❌ {len(regresiones)} regresiones frente a {baseline}")
+        self.stdout.write(self.style.SUCCESS("✅ Sin regresiones frente a la línea base"))
+
+    def _medir(self, temporal, options):
+        # Base de datos en disco (no en memoria) para que las cifras se parezcan a producción
+        prueba = connection.settings_dict.setdefault('TEST', {})
+        nombre_previo = prueba.get('NAME')
+        if connection.vendor == 'sqlite':
+            prueba['NAME'] = str(temporal / 'benchmark.sqlite3')
+        nombre_original = connection.settings_dict['NAME']
+
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(MEDIA_ROOT=str(temporal / 'media')):
+                self.stdout.write(f"🌱 Sembrando {options['filas']} empresas...")
+                return benchmark.ejecutar(
+                    filas=options['filas'],
+                    logos=options['logos'],
+                    repeticiones=max(1, options['repeticiones']),
+                    semilla=options['semilla'],
+                    media_root=str(temporal / 'media'),
+                )
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+            prueba['NAME'] = nombre_previo
+
+    def _mostrar(self, resultados):
+        self.stdout.write(f"\n{'Escenario':<34}{'mediana ms':>12}{'mín ms':>10}{'consultas':>11}")
+        for nombre, medida in resultados['escenarios'].items():
+            extra = f"  ({medida['filas_por_segundo']} filas/s)" if 'filas_por_segundo' in medida else ''
+            self.stdout.write(
+                f"{nombre:<34}{medida['mediana_ms']:>12.1f}{medida['min_ms']:>10.1f}{medida['consultas']:>11}{extra}"
+            )
+        self.stdout.write('')
+
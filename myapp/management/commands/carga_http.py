@@ -0,0 +1,186 @@
+"""
+Prueba de carga HTTP contra un servidor en marcha (WSGI o ASGI).
+
+Sirve para comparar el mismo endpoint servido por ejemplo con
+`gunicorn Empresa.wsgi --threads 8` y con `uvicorn Empresa.asgi:application`
+(que activa las vistas async, ver settings.VISTAS_ASYNC):
+
+    python manage.py carga_http http://127.0.0.1:8000/home/?q=minera --usuario admin \\
+        --concurrencia 50 --duracion 15 --lentos 200 --salida asgi.json
+    python manage.py carga_http ... --salida wsgi.json --comparar asgi.json
+
+`--lentos N` abre N conexiones que envían la petición byte a byte (clientes
+lentos): en un servidor con pool de hilos cada una ocupa un hilo, en ASGI
+solo una corrutina. Todo el generador es asyncio, sin hilos.
+"""
+import asyncio
+import json
+import statistics
+import time
+from importlib import import_module
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+class Command(BaseCommand):
+    help = "Mide throughput y latencia de un endpoint con N clientes concurrentes (y clientes lentos)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='URL completa, p. ej. http://127.0.0.1:8000/home/?q=minera')
+        parser.add_argument('--concurrencia', type=int, default=20, help='Clientes simultáneos (default: 20)')
+        parser.add_argument('--duracion', type=float, default=10.0, help='Segundos de prueba (default: 10)')
+        parser.add_argument('--lentos', type=int, default=0, help='Conexiones lentas abiertas durante la prueba')
+        parser.add_argument('--usuario', help='Crea una sesión para este usuario y la envía como cookie')
+        parser.add_argument('--cookie', default='', help='Cabecera Cookie explícita')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Timeout por request en segundos')
+        parser.add_argument('--salida', help='Guardar el resultado en JSON')
+        parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar')
+
+    def handle(self, *args, **options):
+        partes = urlsplit(options['url'])
+        if partes.scheme != 'http' or not partes.hostname:
+            raise CommandError("❌ Solo se admiten URLs http://host[:puerto]/ruta")
+
+        cookie = options['cookie']
+        sesion = None
+        if options['usuario']:
+            sesion = self._crear_sesion(options['usuario'])
+            cookie = '; '.join(c for c in (cookie, f"{settings.SESSION_COOKIE_NAME}={sesion.session_key}") if c)
+
+        try:
+            resultado = asyncio.run(self._carga(partes, cookie, options))
+        finally:
+            if sesion is not None:
+                sesion.delete()
+
+        resultado['url'] = options['url']
+        self._mostrar(resultado)
+        if options['salida']:
+            Path(options['salida']).write_text(json.dumps(resultado, indent=2), encoding='utf-8')
+            self.stdout.write(f"💾 Resultado en {options['salida']}")
+        if options['comparar']:
+            previo = json.loads(Path(options['comparar']).read_text(encoding='utf-8'))
+            self._comparar(resultado, previo)
+
+    def _crear_sesion(self, username):
+        """Sesión válida sin pasar por el formulario de login"""
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"❌ No existe el usuario {username}")
+        sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+        sesion[SESSION_KEY] = str(user.pk)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        sesion.create()
+        return sesion
+
+    def _peticion(self, partes, cookie):
+        ruta = partes.path or '/'
+        if partes.query:
+            ruta += '?' + partes.query
+        lineas = [f"GET {ruta} HTTP/1.1", f"Host: {partes.netloc}", "Connection: close", "Accept-Encoding: identity"]
+        if cookie:
+            lineas.append(f"Cookie: {cookie}")
+        return ('\r\n'.join(lineas) + '\r\n\r\n').encode()
+
+    async def _una(self, partes, peticion, timeout):
+        inicio = time.perf_counter()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(partes.hostname, partes.port or 80), timeout)
+        try:
+            writer.write(peticion)
+            await writer.drain()
+            respuesta = await asyncio.wait_for(reader.read(), timeout)
+        finally:
+            writer.close()
+        status = int(respuesta.split(b' ', 2)[1]) if respuesta.startswith(b'HTTP/') else 0
+        return status, time.perf_counter() - inicio
+
+    async def _cliente(self, partes, peticion, fin, timeout, latencias, errores):
+        while time.perf_counter() < fin:
+            try:
+                status, segundos = await self._una(partes, peticion, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errores['conexion'] = errores.get('conexion', 0) + 1
+                continue
+            if status == 200:
+                latencias.append(segundos)
+            else:
+                errores[str(status)] = errores.get(str(status), 0) + 1
+
+    async def _lento(self, partes, peticion, fin):
+        """Envía la petición de a un byte por segundo hasta el final de la prueba"""
+        try:
+            _, writer = await asyncio.open_connection(partes.hostname, partes.port or 80)
+        except OSError:
+            return
+        try:
+            for byte in peticion[:-2]:
+                if time.perf_counter() >= fin:
+                    break
+                writer.write(bytes([byte]))
+                await writer.drain()
+                await asyncio.sleep(1)
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def _carga(self, partes, cookie, options):
+        peticion = self._peticion(partes, cookie)
+        espera = 0.5 if options['lentos'] else 0  # que los lentos ocupen el servidor antes de medir
+        fin = time.perf_counter() + espera + options['duracion']
+        latencias = []
+        errores = {}
+        lentos = [asyncio.create_task(self._lento(partes, peticion, fin)) for _ in range(options['lentos'])]
+        await asyncio.sleep(espera)
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            self._cliente(partes, peticion, fin, options['timeout'], latencias, errores)
+            for _ in range(max(1, options['concurrencia']))
+        ))
+        total = time.perf_counter() - inicio
+        for tarea in lentos:
+            tarea.cancel()
+        await asyncio.gather(*lentos, return_exceptions=True)
+
+        return {
+            'concurrencia': options['concurrencia'],
+            'lentos': options['lentos'],
+            'segundos': round(total, 2),
+            'exitosas': len(latencias),
+            'errores': errores,
+            'rps': round(len(latencias) / total, 1) if total else 0.0,
+            'p50_ms': round(statistics.median(latencias) * 1000, 1) if latencias else 0.0,
+            'p95_ms': round(_percentil(latencias, 0.95) * 1000, 1),
+            'p99_ms': round(_percentil(latencias, 0.99) * 1000, 1),
+        }
+
+    def _mostrar(self, r):
+        self.stdout.write(self.style.NOTICE(
+            f"🚀 {r['url']} · {r['concurrencia']} clientes · {r['lentos']} lentos · {r['segundos']}s"
+        ))
+        self.stdout.write(f"  ✓ Exitosas:  {r['exitosas']}  ({r['rps']} req/s)")
+        self.stdout.write(f"  ⏱️  Latencia:  p50 {r['p50_ms']} ms · p95 {r['p95_ms']} ms · p99 {r['p99_ms']} ms")
+        if r['errores']:
+            self.stdout.write(self.style.WARNING(f"  ⚠️  Errores:   {r['errores']}"))
+
+    def _comparar(self, actual, previo):
+        self.stdout.write(self.style.NOTICE(f"\n📊 Comparación con {previo.get('url', 'ejecución previa')}"))
+        for clave in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            antes, ahora = previo.get(clave, 0), actual[clave]
+            cambio = f"{(ahora - antes) / antes:+.0%}" if antes else 'n/a'
+            self.stdout.write(f"  {clave:<7} {antes:>10} → {ahora:<10} ({cambio})")
@@ -0,0 +1,111 @@
+"""
+Pasa los logos existentes a nombres por contenido (una copia por imagen),
+recalcula el contador de referencias y borra los archivos que nadie usa
+(ver myapp/almacenamiento.py)
+"""
+from collections import Counter
+from pathlib import Path, PurePosixPath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.almacenamiento import CARPETA, almacenamiento_logos, es_por_contenido, nombre_por_contenido, sha256_archivo
+from myapp.cache_busqueda import invalidar_busquedas
+from myapp.miniaturas import CARPETA as CARPETA_MINIATURAS
+from myapp.miniaturas import TAMANOS, generar_miniaturas, nombre_miniatura
+from myapp.models import Empresa, ReferenciaLogo
+
+
+class Command(BaseCommand):
+    help = "Une logos repetidos en un solo archivo por contenido y borra los que nadie usa"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo mostrar qué se haría y cuánto espacio se liberaría'
+        )
+
+    def handle(self, *args, **options):
+        simular = options['simular']
+        raiz = Path(almacenamiento_logos.path(CARPETA))
+        usos = Counter(
+            Empresa.objects.exclude(logo__isnull=True).exclude(logo='').values_list('logo', flat=True).iterator()
+        )
+
+        # 1) Logos con nombre antiguo -> nombre por contenido
+        renombrados, faltantes = {}, []
+        for viejo in usos:
+            if es_por_contenido(viejo):
+                continue
+            ruta = Path(almacenamiento_logos.path(viejo))
+            if not ruta.is_file():
+                faltantes.append(viejo)
+                continue
+            if simular:
+                renombrados[viejo] = nombre_por_contenido(sha256_archivo(ruta), ruta.suffix)
+            else:
+                renombrados[viejo] = almacenamiento_logos.importar(ruta)
+
+        for viejo, nuevo in renombrados.items():
+            if not simular:
+                miniatura = generar_miniaturas(nuevo)
+                Empresa.objects.filter(logo=viejo).update(
+                    logo=nuevo, logo_miniatura=miniatura, fecha_actualizacion=timezone.now())
+            usos[nuevo] += usos.pop(viejo)
+        if renombrados and not simular:
+            invalidar_busquedas()  # las páginas cacheadas apuntan a los nombres viejos
+
+        # 2) Contador de referencias desde cero
+        if not simular:
+            with transaction.atomic():
+                ReferenciaLogo.objects.all().delete()
+                ReferenciaLogo.objects.bulk_create(
+                    [ReferenciaLogo(nombre=nombre, referencias=n) for nombre, n in usos.items()],
+                    batch_size=2000,
+                )
+
+        # 3) Archivos que ya nadie usa (incluye los viejos recién renombrados)
+        vigentes = set(usos) - set(renombrados)
+        miniaturas_vigentes = {nombre_miniatura(n, t) for n in vigentes for t in TAMANOS}
+        huerfanos = []
+        for ruta in raiz.rglob('*') if raiz.exists() else ():
+            if not ruta.is_file():
+                continue
+            nombre = PurePosixPath(CARPETA, *ruta.relative_to(raiz).parts).as_posix()
+            if nombre.startswith(f'{CARPETA_MINIATURAS}/'):
+                if nombre not in miniaturas_vigentes:
+                    huerfanos.append((nombre, ruta))
+            elif nombre not in vigentes:
+                huerfanos.append((nombre, ruta))
+
+        # Al simular, el primer archivo viejo de cada contenido nuevo pasaría a
+        # ser ese contenido: borrar su nombre viejo no liberaría nada
+        conservados = set()
+        if simular:
+            primero = {}
+            for viejo, nuevo in renombrados.items():
+                primero.setdefault(nuevo, viejo)
+            conservados = {viejo for nuevo, viejo in primero.items() if not almacenamiento_logos.exists(nuevo)}
+
+        liberados = 0
+        for nombre, ruta in huerfanos:
+            # Un enlace duro a un archivo vigente no libera nada al borrarse
+            if ruta.stat().st_nlink == 1 and nombre not in conservados:
+                liberados += ruta.stat().st_size
+            if not simular:
+                almacenamiento_logos.delete(nombre)
+
+        accion = "Se moverían" if simular else "Movidos"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {accion} {len(renombrados)} logos a nombres por contenido "
+            f"({len(set(renombrados.values()))} archivos distintos)"
+        ))
+        accion = "Se borrarían" if simular else "Borrados"
+        self.stdout.write(
+            f"🗑️  {accion} {len(huerfanos)} archivos sin uso ({liberados / 1024 / 1024:.1f} MB liberados)"
+        )
+        self.stdout.write(f"📊 {len(usos)} archivos de logo en uso por {sum(usos.values())} empresas")
+        for nombre in faltantes:
+            self.stdout.write(self.style.WARNING(f"  ⚠️  No existe en disco: {nombre}"))
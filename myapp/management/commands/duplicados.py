@@ -0,0 +1,62 @@
+"""
+Lista grupos de empresas con nombres casi iguales ("BMW", "B.M.W.", "BMW S.A.")
+(índice de trigramas, ver myapp/duplicados.py)
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.duplicados import UMBRAL, grupos_empresas
+from myapp.models import Empresa
+
+
+class Command(BaseCommand):
+    help = "Informe de posibles empresas duplicadas por similitud del nombre"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--umbral',
+            type=float,
+            default=UMBRAL,
+            help=f'Similitud mínima entre 0 y 1 (default: {UMBRAL})'
+        )
+        parser.add_argument(
+            '--limite',
+            type=int,
+            default=50,
+            help='Grupos a mostrar, los más grandes primero (default: 50, 0 = todos)'
+        )
+        parser.add_argument(
+            '--json',
+            dest='salida_json',
+            help='Guardar todos los grupos en este archivo JSON'
+        )
+
+    def handle(self, *args, **options):
+        umbral = options['umbral']
+        if not 0 < umbral <= 1:
+            raise CommandError("❌ El umbral debe estar entre 0 y 1")
+
+        inicio = time.perf_counter()
+        grupos = grupos_empresas(umbral)
+        segundos = time.perf_counter() - inicio
+
+        mostrados = grupos[:options['limite']] if options['limite'] else grupos
+        ids = {pk for grupo in mostrados for pk in grupo['ids']}
+        empresas = Empresa.objects.only('id', 'codigo', 'compania').in_bulk(ids)
+
+        total = sum(len(g['ids']) for g in grupos)
+        self.stdout.write(self.style.NOTICE(
+            f"🔎 {len(grupos)} grupos de posibles duplicados ({total} empresas, umbral {umbral}) en {segundos:.1f} s"
+        ))
+        for grupo in mostrados:
+            nombres = ' · '.join(f"[{empresas[pk].codigo}] {empresas[pk].compania}" for pk in grupo['ids'])
+            self.stdout.write(f"  ≈ {grupo['similitud']:.2f}  {nombres}")
+        if len(mostrados) < len(grupos):
+            self.stdout.write(f"  … y {len(grupos) - len(mostrados)} grupos más (usa --limite 0 o --json)")
+
+        if options['salida_json']:
+            with open(options['salida_json'], 'w', encoding='utf-8') as archivo:
+                json.dump({'umbral': umbral, 'grupos': grupos}, archivo, indent=2)
+            self.stdout.write(f"💾 Grupos en {options['salida_json']}")
@@ -0,0 +1,27 @@
+"""
+Muestra las estadísticas de la caché de búsquedas de home
+"""
+from django.core.management.base import BaseCommand
+
+from myapp import cache_busqueda
+
+
+class Command(BaseCommand):
+    help = "Muestra aciertos/fallos de la caché de búsquedas (para dimensionarla)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Poner los contadores a cero después de mostrarlos'
+        )
+
+    def handle(self, *args, **options):
+        stats = cache_busqueda.estadisticas()
+        self.stdout.write(f"  ✓ Aciertos:   {stats['aciertos']}")
+        self.stdout.write(f"  ✗ Fallos:     {stats['fallos']}")
+        self.stdout.write(f"  📊 Tasa:       {stats['tasa_aciertos']:.1%}")
+        self.stdout.write(f"  🔢 Generación: {stats['generacion']}")
+        if options['reiniciar']:
+            cache_busqueda.reiniciar_estadisticas()
+            self.stdout.write(self.style.SUCCESS("✅ Contadores reiniciados"))
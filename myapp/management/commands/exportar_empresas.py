@@ -0,0 +1,58 @@
+"""
+Exporta el directorio de empresas a CSV o XLSX
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import exportacion
+
+
+class Command(BaseCommand):
+    help = "Exporta las empresas (con los mismos filtros que home) a CSV o XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'salida',
+            nargs='?',
+            default='-',
+            help='Archivo de salida ("-" = stdout, solo CSV)'
+        )
+        parser.add_argument(
+            '--formato',
+            choices=exportacion.FORMATOS,
+            default=None,
+            help='csv o xlsx (default: según la extensión de la salida, o csv)'
+        )
+        parser.add_argument(
+            '--q',
+            default='',
+            help='Texto a buscar (como el buscador de home)'
+        )
+        parser.add_argument(
+            '--field',
+            default='all',
+            help='Campo de búsqueda: all, compania, cliente, codigo, correo, telefono, pais'
+        )
+
+    def handle(self, *args, **options):
+        salida = options['salida']
+        formato = options['formato'] or ('xlsx' if salida.lower().endswith('.xlsx') else 'csv')
+        if formato == 'xlsx' and salida == '-':
+            raise CommandError("❌ El formato XLSX necesita un archivo de salida")
+
+        empresas = exportacion.filtrar_empresas(options['q'].strip(), options['field'], is_admin=True)
+        inicio = time.perf_counter()
+
+        if formato == 'xlsx':
+            exportacion.escribir_xlsx(empresas, salida)
+        elif salida == '-':
+            for linea in exportacion.lineas_csv(empresas):
+                self.stdout.write(linea, ending='')
+            return
+        else:
+            with open(salida, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(exportacion.lineas_csv(empresas))
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f"✅ Exportado a {salida} en {segundos:.1f}s"))
@@ -0,0 +1,75 @@
+"""
+Genera las miniaturas de logo que faltan (backfill para empresas existentes)
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from myapp.miniaturas import generar_miniaturas, miniatura_vigente, sin_miniatura
+from myapp.models import Empresa
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas WebP de los logos que aún no las tienen"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas',
+            action='store_true',
+            help='Regenerar también las miniaturas que ya existen'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Hilos para procesar imágenes (default: automático)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Empresas por lote de actualización (default: 200)'
+        )
+
+    def handle(self, *args, **options):
+        todas = options['todas']
+        batch_size = max(1, options['batch_size'])
+
+        # Se leen antes de escribir: en SQLite no conviene actualizar la tabla
+        # mientras se recorre con un cursor abierto
+        empresas = [
+            Empresa(id=pk, logo=logo, logo_miniatura=miniatura)
+            for pk, logo, miniatura in Empresa.objects.exclude(logo='').exclude(logo__isnull=True)
+            .order_by('id').values_list('id', 'logo', 'logo_miniatura')
+        ]
+        if not todas:
+            empresas = [e for e in empresas if not miniatura_vigente(e)]
+        self.stdout.write(self.style.NOTICE(f"🖼️  Logos a procesar: {len(empresas)}"))
+
+        generadas = 0
+        sin_soporte = 0
+        lote = []
+
+        def guardar(lote):
+            nonlocal generadas, sin_soporte
+            for empresa, futuro in lote:
+                empresa.logo_miniatura = futuro.result()
+                if not sin_miniatura(empresa):
+                    generadas += 1
+                else:
+                    sin_soporte += 1
+            Empresa.objects.bulk_update([e for e, _ in lote], ['logo_miniatura'])
+            self.stdout.write(f"  ⏳ {generadas + sin_soporte} logos procesados")
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for empresa in empresas:
+                lote.append((empresa, pool.submit(generar_miniaturas, empresa.logo.name)))
+                if len(lote) >= batch_size:
+                    guardar(lote)
+                    lote = []
+            if lote:
+                guardar(lote)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Miniaturas generadas: {generadas}"))
+        if sin_soporte:
+            self.stdout.write(self.style.WARNING(f"⚠️  Logos que no se pudieron procesar (se muestra el original): {sin_soporte}"))
@@ -1,12 +1,11 @@
 """
 Importa empresas desde Excel con logos extraídos
+(lectura en streaming y escritura por lotes, ver myapp/importacion.py)
 """
 from pathlib import Path
 from django.core.management.base import BaseCommand, CommandError
-from django.conf import settings
-from openpyxl import load_workbook
-from myapp.models import Empresa
-import shutil
+from myapp.duplicados import UMBRAL
+from myapp.importacion import ImportadorEmpresas
 
 class Command(BaseCommand):
     help = "Importa empresas desde Excel con logos en carpeta separada"
@@ -24,6 +23,33 @@ class Command(BaseCommand):
             action='store_true',
             help='Importar sin logos'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Filas por lote/transacción (default: 1000)'
+        )
+        parser.add_argument(
+            '--revisar-duplicados',
+            action='store_true',
+            help='No crear filas con nombre parecido a una empresa existente; solo informarlas'
+        )
+        parser.add_argument(
+            '--umbral-duplicados',
+            type=float,
+            default=UMBRAL,
+            help=f'Similitud mínima para considerar duplicado (default: {UMBRAL})'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='No escribir nada: solo mostrar qué filas se crearían, cambiarían o quedan igual'
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Reescribir todas las filas aunque no hayan cambiado (ignora huellas y punto de control)'
+        )
 
     def handle(self, *args, **options):
         xlsx_path = Path(options['xlsx_path'])
@@ -55,109 +81,57 @@ class Command(BaseCommand):
             
             self.stdout.write(self.style.SUCCESS(f"📂 Logos encontrados: {len(logos_disponibles)}"))
 
-        # Cargar Excel
+        # Importar por lotes (lectura en streaming + bulk_create/bulk_update)
         self.stdout.write(self.style.NOTICE(f"📂 Abriendo Excel: {xlsx_path.name}\n"))
-        
+
+        importador = ImportadorEmpresas(
+            xlsx_path,
+            logos=logos_disponibles,
+            batch_size=options['batch_size'],
+            progreso=self._mostrar_progreso,
+            revisar_duplicados=options['revisar_duplicados'],
+            umbral_duplicados=options['umbral_duplicados'],
+            simular=options['simular'],
+            forzar=options['forzar'],
+        )
         try:
-            wb = load_workbook(xlsx_path, data_only=True)
-            ws = wb.active
+            resultado = importador.ejecutar()
         except Exception as e:
-            raise CommandError(f"❌ Error abriendo Excel: {e}")
-
-        # Crear carpeta de destino para logos
-        media_logos = Path(settings.MEDIA_ROOT) / 'logos'
-        media_logos.mkdir(parents=True, exist_ok=True)
-
-        # Contadores
-        created = 0
-        updated = 0
-        skipped = 0
-        errors = 0
-
-        # Procesar filas (asumiendo encabezados en fila 1)
-        start_row = 2
-        total_rows = ws.max_row
-
-        self.stdout.write(self.style.NOTICE(f"📊 Procesando {total_rows - 1} filas...\n"))
-
-        for idx, row_num in enumerate(range(start_row, total_rows + 1)):
-            # Leer columnas: A=Cliente, B=Compañía, C=Código
-            cliente_val = ws.cell(row=row_num, column=1).value
-            compania_val = ws.cell(row=row_num, column=2).value
-            codigo_val = ws.cell(row=row_num, column=3).value
-
-            # Normalizar
-            cliente = str(cliente_val).strip() if cliente_val else ""
-            compania = str(compania_val).strip() if compania_val else ""
-            codigo = str(codigo_val).strip() if codigo_val else ""
-
-            # Saltar filas vacías
-            if not (cliente or compania):
-                skipped += 1
-                continue
+            raise CommandError(f"❌ Error importando Excel: {e}")
 
-            self.stdout.write(f"Fila {row_num}: ", ending='')
-
-            try:
-                # Buscar empresa existente
-                empresa = None
-                if codigo:
-                    empresa = Empresa.objects.filter(codigo=codigo).first()
-                if not empresa and compania:
-                    empresa = Empresa.objects.filter(compania__iexact=compania).first()
-
-                # Asignar logo (la imagen en posición idx corresponde a esta fila)
-                logo_field = None
-                if not skip_logos and idx < len(logos_disponibles):
-                    logo_path = logos_disponibles[idx]
-                    
-                    # Copiar logo a media/logos/
-                    dest_filename = f"{codigo}_{logo_path.name}" if codigo else logo_path.name
-                    dest_path = media_logos / dest_filename
-                    
-                    shutil.copy2(logo_path, dest_path)
-                    logo_field = f"logos/{dest_filename}"
-                    
-                    self.stdout.write(f"📷 ", ending='')
-
-                # Crear o actualizar
-                if empresa:
-                    # Actualizar existente
-                    empresa.cliente = cliente
-                    empresa.compania = compania
-                    if logo_field:
-                        empresa.logo = logo_field
-                    empresa.save()
-                    
-                    updated += 1
-                    self.stdout.write(self.style.WARNING(f"↻ ACTUALIZADA: {compania}"))
-                else:
-                    # Crear nueva
-                    empresa = Empresa.objects.create(
-                        cliente=cliente,
-                        compania=compania,
-                        codigo=codigo,
-                        telefono='',
-                        correo='',
-                        pais='',
-                        logo=logo_field or ''
-                    )
-                    
-                    created += 1
-                    self.stdout.write(self.style.SUCCESS(f"✓ CREADA: {compania}"))
-
-            except Exception as e:
-                errors += 1
-                self.stdout.write(self.style.ERROR(f"✗ ERROR: {e}"))
+        for mensaje in resultado.mensajes_error:
+            self.stdout.write(self.style.ERROR(f"  ✗ {mensaje}"))
+        for mensaje in resultado.mensajes_duplicado:
+            self.stdout.write(self.style.WARNING(f"  ≈ {mensaje}"))
+        for mensaje in resultado.mensajes_cambio:
+            self.stdout.write(f"  ~ {mensaje}")
+        if options['simular'] and resultado.actualizadas > len(resultado.mensajes_cambio):
+            self.stdout.write(f"  … y {resultado.actualizadas - len(resultado.mensajes_cambio)} cambios más")
 
         # Resumen final
         self.stdout.write("\n" + "=" * 70)
-        self.stdout.write(self.style.SUCCESS(f"✅ IMPORTACIÓN COMPLETADA"))
+        if options['simular']:
+            self.stdout.write(self.style.SUCCESS(f"✅ SIMULACIÓN COMPLETADA (no se escribió nada)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ IMPORTACIÓN COMPLETADA"))
         self.stdout.write("=" * 70)
-        self.stdout.write(f"  📊 Total procesadas: {total_rows - 1}")
-        self.stdout.write(self.style.SUCCESS(f"  ✓ Creadas:          {created}"))
-        self.stdout.write(self.style.WARNING(f"  ↻ Actualizadas:     {updated}"))
-        self.stdout.write(f"  ⊘ Saltadas:         {skipped}")
-        if errors:
-            self.stdout.write(self.style.ERROR(f"  ✗ Errores:          {errors}"))
-        self.stdout.write("=" * 70)
\ No newline at end of file
+        if resultado.reanudada_desde:
+            self.stdout.write(self.style.NOTICE(f"  ⏩ Reanudada tras la fila {resultado.reanudada_desde}"))
+        self.stdout.write(f"  📊 Total procesadas: {resultado.procesadas}")
+        self.stdout.write(self.style.SUCCESS(f"  ✓ Creadas:          {resultado.creadas}"))
+        self.stdout.write(self.style.WARNING(f"  ↻ Actualizadas:     {resultado.actualizadas}"))
+        self.stdout.write(f"  = Sin cambios:      {resultado.sin_cambios}")
+        self.stdout.write(f"  ⊘ Saltadas:         {resultado.saltadas}")
+        if resultado.duplicados:
+            self.stdout.write(self.style.WARNING(f"  ≈ Posibles duplicados (no creadas): {resultado.duplicados}"))
+        if resultado.errores:
+            self.stdout.write(self.style.ERROR(f"  ✗ Errores:          {resultado.errores}"))
+        self.stdout.write(f"  ⏱️  Tiempo:           {resultado.segundos:.1f} s ({resultado.filas_por_segundo:,.0f} filas/s)")
+        self.stdout.write("=" * 70)
+
+    def _mostrar_progreso(self, resultado):
+        self.stdout.write(
+            f"  ⏳ {resultado.procesadas:,} filas · "
+            f"{resultado.creadas:,} creadas · {resultado.actualizadas:,} actualizadas · "
+            f"{resultado.filas_por_segundo:,.0f} filas/s"
+        )
@@ -0,0 +1,63 @@
+"""
+Re-codifica los logos que siguen sin optimizar (subidos antes de existir la
+optimización o cuyo encargo se perdió en un reinicio; ver myapp/optimizacion.py)
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from myapp.almacenamiento import almacenamiento_logos
+from myapp.models import Empresa
+from myapp.optimizacion import necesita_optimizar, optimizar_logo
+
+
+def _optimizar(nombre):
+    try:
+        return nombre, optimizar_logo(nombre)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Reduce y re-codifica los logos grandes, con EXIF o en formatos no web"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=2,
+            help='Logos a la vez (default: 2)'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo listar los logos que se optimizarían'
+        )
+
+    def handle(self, *args, **options):
+        nombres = Empresa.objects.exclude(logo__isnull=True).exclude(logo='').values_list('logo', flat=True).distinct()
+        pendientes = []
+        for nombre in nombres.iterator():
+            if not almacenamiento_logos.exists(nombre):
+                continue
+            with almacenamiento_logos.open(nombre, 'rb') as archivo:
+                if necesita_optimizar(archivo):
+                    pendientes.append(nombre)
+
+        self.stdout.write(self.style.NOTICE(f"🖼️  {len(pendientes)} logos por optimizar"))
+        if options['simular']:
+            for nombre in pendientes:
+                self.stdout.write(f"  · {nombre} ({almacenamiento_logos.size(nombre) / 1024:.0f} KB)")
+            return
+
+        antes = sum(almacenamiento_logos.size(n) for n in pendientes)
+        despues = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['hilos'])) as pool:
+            for nombre, nuevo in pool.map(_optimizar, pendientes):
+                despues += almacenamiento_logos.size(nuevo)
+                if nuevo == nombre:
+                    self.stdout.write(f"  = {nombre}: sin mejora")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(pendientes)} logos: {antes / 1024 / 1024:.1f} MB → {despues / 1024 / 1024:.1f} MB"
+        ))
@@ -0,0 +1,50 @@
+"""
+Procesa las importaciones subidas desde la web (cola en la tabla
+myapp_trabajoimportacion, pool de procesos locales; ver myapp/trabajos.py)
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.trabajos import atender
+
+
+class Command(BaseCommand):
+    help = "Worker de importaciones: ejecuta los trabajos en cola en procesos separados"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=2,
+            help='Importaciones simultáneas (default: 2)'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos entre consultas a la cola (default: 2)'
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Terminar cuando la cola quede vacía (para cron)'
+        )
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 1:
+            raise CommandError("❌ --procesos debe ser al menos 1")
+
+        self.stdout.write(self.style.NOTICE(
+            f"🔄 Atendiendo importaciones con {options['procesos']} procesos (Ctrl+C para salir)"
+        ))
+        try:
+            atender(
+                procesos=options['procesos'],
+                intervalo=options['intervalo'],
+                una_vez=options['una_vez'],
+                avisar=self.stdout.write,
+            )
+        except KeyboardInterrupt:
+            # Los trabajos cortados vuelven a la cola al vencer su latido
+            self.stdout.write(self.style.WARNING("⚠️  Worker detenido"))
+            return
+        self.stdout.write(self.style.SUCCESS("✅ Cola vacía"))
@@ -0,0 +1,26 @@
+"""
+Borra las bajas antiguas del registro de cambios (ver myapp/cambios.py)
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.cambios import purgar_bajas
+
+
+class Command(BaseCommand):
+    help = "Borra las bajas más antiguas que --dias del registro de cambios de la API"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=90,
+            help='Conservar las bajas de los últimos N días (default: 90). '
+                 'Un cliente que no sincronice en ese plazo tendrá que empezar de nuevo'
+        )
+
+    def handle(self, *args, **options):
+        borradas = purgar_bajas(timezone.now() - timedelta(days=options['dias']))
+        self.stdout.write(self.style.SUCCESS(f"✅ {borradas} bajas purgadas"))
@@ -0,0 +1,56 @@
+"""
+Respalda las empresas en NDJSON comprimido, completo o incremental
+(ver myapp/respaldo.py)
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp.respaldo import RespaldoInvalido, escribir_respaldo, interpretar_desde
+
+
+class Command(BaseCommand):
+    help = "Respalda el directorio de empresas en un archivo .ndjson.gz"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'salida',
+            nargs='?',
+            default=None,
+            help='Archivo de salida (default: respaldo_AAAAMMDD_HHMM.ndjson.gz)'
+        )
+        parser.add_argument(
+            '--since',
+            default=None,
+            help='Solo empresas actualizadas o borradas desde esta fecha (AAAA-MM-DD, ISO) '
+                 'o desde el respaldo anterior (ruta del archivo). Los borrados anteriores '
+                 'a la última purga de cambios (purgar_cambios) no se incluyen'
+        )
+        parser.add_argument(
+            '--logos',
+            action='store_true',
+            help='Incluir los archivos de logo (uno por contenido)'
+        )
+
+    def handle(self, *args, **options):
+        salida = options['salida'] or f"respaldo_{timezone.localtime():%Y%m%d_%H%M}.ndjson.gz"
+        try:
+            desde = interpretar_desde(options['since']) if options['since'] else None
+        except RespaldoInvalido as e:
+            raise CommandError(f"❌ {e}")
+
+        def progreso(resultado):
+            self.stdout.write(f"  · {resultado.empresas} empresas...", ending='\r')
+            self.stdout.flush()
+
+        resultado = escribir_respaldo(salida, desde=desde, logos=options['logos'], progreso=progreso)
+
+        tipo = f"incremental desde {timezone.localtime(desde):%Y-%m-%d %H:%M}" if desde else "completo"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Respaldo {tipo}: {resultado.empresas} empresas, {resultado.bajas} bajas, {resultado.logos} logos "
+            f"→ {salida} ({os.path.getsize(salida) / 1024 / 1024:.1f} MB) en {resultado.segundos:.1f}s"
+        ))
+        self.stdout.write(f"   Siguiente incremental: --since {salida}")
+        for nombre in resultado.logos_faltantes:
+            self.stdout.write(self.style.WARNING(f"  ⚠️  No existe en disco: {nombre}"))
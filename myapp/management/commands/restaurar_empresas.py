@@ -0,0 +1,45 @@
+"""
+Restaura empresas desde respaldos .ndjson.gz (ver myapp/respaldo.py)
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.respaldo import RespaldoInvalido, RestauradorEmpresas
+
+
+class Command(BaseCommand):
+    help = "Carga uno o más respaldos (el completo y luego los incrementales, en orden)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'respaldos',
+            nargs='+',
+            help='Archivos .ndjson.gz a cargar, en orden'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Empresas por lote/transacción (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        for ruta in options['respaldos']:
+            if not Path(ruta).is_file():
+                raise CommandError(f"❌ No existe el archivo: {ruta}")
+
+        def progreso(resultado):
+            self.stdout.write(f"  · {resultado.empresas} empresas...", ending='\r')
+            self.stdout.flush()
+
+        for ruta in options['respaldos']:
+            try:
+                resultado = RestauradorEmpresas(ruta, batch_size=options['batch_size'], progreso=progreso).ejecutar()
+            except RespaldoInvalido as e:
+                raise CommandError(f"❌ {e}")
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {ruta}: {resultado.creadas} creadas, {resultado.actualizadas} actualizadas, "
+                f"{resultado.eliminadas} eliminadas, "
+                f"{resultado.logos} logos nuevos en {resultado.segundos:.1f}s"
+            ))
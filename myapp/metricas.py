@@ -0,0 +1,256 @@
+# myapp/metricas.py
+"""
+Instrumentación por request: latencia, SQL y caché.
+
+MetricasMiddleware mide cada request (tiempo hasta devolver la respuesta,
+número y tiempo de consultas SQL, consulta más lenta, aciertos/fallos de
+la caché de búsquedas) y:
+
+- acumula histogramas y contadores por vista, expuestos en formato texto
+  de Prometheus en /metrics;
+- escribe una línea JSON por request en el logger 'myapp.metricas'
+  (DEBUG normalmente, WARNING si supera METRICAS_UMBRAL_LENTO_MS).
+
+Los contadores viven en memoria del proceso: con varios workers cada uno
+expone los suyos (Prometheus los suma por instancia).
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LARGO_SQL = 300
+TIPO_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@dataclass
+class MedicionRequest:
+    consultas: int = 0
+    sql_segundos: float = 0.0
+    sql_mas_lenta: str = ''
+    sql_mas_lenta_segundos: float = 0.0
+    cache_aciertos: int = 0
+    cache_fallos: int = 0
+
+
+_actual = contextvars.ContextVar('metricas_request', default=None)
+
+
+class Registro:
+    """Histogramas y contadores en memoria (seguros entre hilos)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.latencias = {}   # (vista, método) -> [buckets..., suma, cantidad]
+            self.requests = {}    # (vista, método, status) -> n
+            self.sql = {}         # vista -> [consultas, segundos]
+            self.lentas = {}      # vista -> n
+            self.cache = {}       # (alias, resultado) -> n
+
+    def observar(self, vista, metodo, status, segundos, medicion, lenta):
+        with self._lock:
+            serie = self.latencias.setdefault((vista, metodo), [0] * (len(BUCKETS) + 2))
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    serie[i] += 1
+            serie[-2] += segundos
+            serie[-1] += 1
+            clave = (vista, metodo, str(status))
+            self.requests[clave] = self.requests.get(clave, 0) + 1
+            sql = self.sql.setdefault(vista, [0, 0.0])
+            sql[0] += medicion.consultas
+            sql[1] += medicion.sql_segundos
+            if lenta:
+                self.lentas[vista] = self.lentas.get(vista, 0) + 1
+
+    def contar_cache(self, alias, acierto):
+        clave = (alias, 'acierto' if acierto else 'fallo')
+        with self._lock:
+            self.cache[clave] = self.cache.get(clave, 0) + 1
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus 0.0.4"""
+        with self._lock:
+            lineas = [
+                '# HELP directorio_request_duration_seconds Latencia de las vistas.',
+                '# TYPE directorio_request_duration_seconds histogram',
+            ]
+            for (vista, metodo), serie in sorted(self.latencias.items()):
+                etiquetas = f'vista="{_escapar(vista)}",metodo="{metodo}"'
+                for limite, n in zip(BUCKETS, serie):
+                    lineas.append(f'directorio_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {n}')
+                lineas.append(f'directorio_request_duration_seconds_bucket{{{etiquetas},le="+Inf"}} {serie[-1]}')
+                lineas.append(f'directorio_request_duration_seconds_sum{{{etiquetas}}} {serie[-2]:.6f}')
+                lineas.append(f'directorio_request_duration_seconds_count{{{etiquetas}}} {serie[-1]}')
+
+            lineas += ['# HELP directorio_requests_total Requests por vista y status.',
+                       '# TYPE directorio_requests_total counter']
+            for (vista, metodo, status), n in sorted(self.requests.items()):
+                lineas.append(f'directorio_requests_total{{vista="{_escapar(vista)}",metodo="{metodo}",status="{status}"}} {n}')
+
+            lineas += ['# HELP directorio_sql_queries_total Consultas SQL ejecutadas por vista.',
+                       '# TYPE directorio_sql_queries_total counter']
+            lineas += [f'directorio_sql_queries_total{{vista="{_escapar(v)}"}} {c}' for v, (c, _) in sorted(self.sql.items())]
+            lineas += ['# HELP directorio_sql_seconds_total Tiempo en consultas SQL por vista.',
+                       '# TYPE directorio_sql_seconds_total counter']
+            lineas += [f'directorio_sql_seconds_total{{vista="{_escapar(v)}"}} {s:.6f}' for v, (_, s) in sorted(self.sql.items())]
+
+            lineas += ['# HELP directorio_requests_lentas_total Requests por encima del umbral lento.',
+                       '# TYPE directorio_requests_lentas_total counter']
+            lineas += [f'directorio_requests_lentas_total{{vista="{_escapar(v)}"}} {n}' for v, n in sorted(self.lentas.items())]
+
+            lineas += ['# HELP directorio_cache_total Lecturas de caché por resultado.',
+                       '# TYPE directorio_cache_total counter']
+            lineas += [f'directorio_cache_total{{cache="{a}",resultado="{r}"}} {n}' for (a, r), n in sorted(self.cache.items())]
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def registrar_cache(alias, acierto):
+    """Lo llaman las cachés de la app en cada lectura (ver cache_busqueda.obtener)"""
+    registro.contar_cache(alias, acierto)
+    medicion = _actual.get()
+    if medicion is not None:
+        if acierto:
+            medicion.cache_aciertos += 1
+        else:
+            medicion.cache_fallos += 1
+
+
+def _envoltura_sql(execute, sql, params, many, context):
+    """Wrapper permanente de cada conexión; solo mide dentro de un request"""
+    medicion = _actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = time.perf_counter() - inicio
+        medicion.consultas += 1
+        medicion.sql_segundos += duracion
+        if duracion > medicion.sql_mas_lenta_segundos:
+            medicion.sql_mas_lenta_segundos = duracion
+            medicion.sql_mas_lenta = sql[:LARGO_SQL]
+
+
+@receiver(connection_created)
+def _instrumentar_conexion(sender, connection, **kwargs):
+    # Las conexiones son por hilo (el ORM async usa las del hilo de
+    # sync_to_async): se instrumentan todas al crearse y la medición del
+    # request llega por el contextvar, que sync_to_async propaga
+    if _envoltura_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_envoltura_sql)
+
+
+def _nombre_vista(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'sin_ruta'
+    return match.view_name
+
+
+def _usuario(request):
+    return getattr(request, 'user', None)
+
+
+def _usuario_ya_cargado(request):
+    """El usuario que ya resolvió la vista (auser() o request.user), sin consultas"""
+    return getattr(request, '_acached_user', None) or getattr(request, '_cached_user', None)
+
+
+class MetricasMiddleware:
+    """Mide cada request; va primero en MIDDLEWARE para incluir a los demás"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicion = MedicionRequest()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _actual.reset(token)
+        return self._registrar(request, response, time.perf_counter() - inicio, medicion, _usuario)
+
+    async def __acall__(self, request):
+        medicion = MedicionRequest()
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _actual.reset(token)
+        # Nunca request.user aquí: cargarlo sería ORM síncrono en el event loop
+        return self._registrar(request, response, time.perf_counter() - inicio, medicion, _usuario_ya_cargado)
+
+    def _registrar(self, request, response, segundos, medicion, usuario):
+        vista = _nombre_vista(request)
+        umbral_ms = getattr(settings, 'METRICAS_UMBRAL_LENTO_MS', 500)
+        lenta = segundos * 1000 >= umbral_ms
+        registro.observar(vista, request.method, response.status_code, segundos, medicion, lenta)
+        self._log(request, response, vista, segundos, medicion, lenta, usuario)
+        return response
+
+    def _log(self, request, response, vista, segundos, medicion, lenta, usuario):
+        nivel = logging.WARNING if lenta else logging.DEBUG
+        if not logger.isEnabledFor(nivel):
+            return
+        datos = {
+            'evento': 'request_lenta' if lenta else 'request',
+            'vista': vista,
+            'metodo': request.method,
+            'ruta': request.path,
+            'status': response.status_code,
+            'ms': round(segundos * 1000, 1),
+            'sql_consultas': medicion.consultas,
+            'sql_ms': round(medicion.sql_segundos * 1000, 1),
+            'cache_aciertos': medicion.cache_aciertos,
+            'cache_fallos': medicion.cache_fallos,
+            'usuario': getattr(usuario(request), 'pk', None),
+        }
+        if lenta and medicion.sql_mas_lenta:
+            datos['sql_mas_lenta_ms'] = round(medicion.sql_mas_lenta_segundos * 1000, 1)
+            datos['sql_mas_lenta'] = medicion.sql_mas_lenta
+        logger.log(nivel, json.dumps(datos, ensure_ascii=False), extra={'metricas': datos})
+
+
+def vista_metricas(request):
+    """/metrics: token Bearer (METRICAS_TOKEN) o usuario staff"""
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if token:
+        permitido = request.headers.get('Authorization', '') == f'Bearer {token}'
+    else:
+        permitido = request.user.is_authenticated and request.user.is_staff
+    if not permitido:
+        return HttpResponse('No autorizado.\n', status=401, content_type='text/plain; charset=utf-8')
+    return HttpResponse(registro.exportar(), content_type=TIPO_PROMETHEUS)
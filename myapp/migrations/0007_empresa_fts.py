@@ -0,0 +1,70 @@
+# Índice de búsqueda de texto completo (SQLite FTS5) para Empresa
+
+from django.db import migrations
+
+
+TABLA_FTS = 'myapp_empresa_fts'
+
+CREAR_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+        compania, cliente, codigo, correo, telefono, pais,
+        content='myapp_empresa',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Triggers: mantienen el índice sincronizado en INSERT/UPDATE/DELETE,
+    # incluso para bulk_create, queryset.update() y borrados masivos.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS myapp_empresa_fts_ai AFTER INSERT ON myapp_empresa BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, compania, cliente, codigo, correo, telefono, pais)
+        VALUES (new.id, new.compania, new.cliente, new.codigo, new.correo, new.telefono, new.pais);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS myapp_empresa_fts_ad AFTER DELETE ON myapp_empresa BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, compania, cliente, codigo, correo, telefono, pais)
+        VALUES ('delete', old.id, old.compania, old.cliente, old.codigo, old.correo, old.telefono, old.pais);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS myapp_empresa_fts_au AFTER UPDATE OF compania, cliente, codigo, correo, telefono, pais
+    ON myapp_empresa BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, compania, cliente, codigo, correo, telefono, pais)
+        VALUES ('delete', old.id, old.compania, old.cliente, old.codigo, old.correo, old.telefono, old.pais);
+        INSERT INTO {TABLA_FTS}(rowid, compania, cliente, codigo, correo, telefono, pais)
+        VALUES (new.id, new.compania, new.cliente, new.codigo, new.correo, new.telefono, new.pais);
+    END
+    """,
+    # Indexar las filas que ya existen
+    f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')",
+]
+
+BORRAR_SQL = [
+    "DROP TRIGGER IF EXISTS myapp_empresa_fts_ai",
+    "DROP TRIGGER IF EXISTS myapp_empresa_fts_ad",
+    "DROP TRIGGER IF EXISTS myapp_empresa_fts_au",
+    f"DROP TABLE IF EXISTS {TABLA_FTS}",
+]
+
+
+def _ejecutar(sentencias):
+    def operacion(apps, schema_editor):
+        # FTS5 solo existe en SQLite; en otros motores la búsqueda usa icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in sentencias:
+            schema_editor.execute(sql)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_delete_usuario'),
+    ]
+
+    operations = [
+        migrations.RunPython(_ejecutar(CREAR_SQL), _ejecutar(BORRAR_SQL)),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+def inicializar_secuencia(apps, schema_editor):
+    """Arranca el contador en el mayor código numérico ya asignado"""
+    Empresa = apps.get_model('myapp', 'Empresa')
+    SecuenciaCodigo = apps.get_model('myapp', 'SecuenciaCodigo')
+    db = schema_editor.connection.alias
+
+    mayor = 0
+    for codigo in Empresa.objects.using(db).exclude(codigo='').values_list('codigo', flat=True).iterator():
+        if codigo.isdigit():
+            mayor = max(mayor, int(codigo))
+    SecuenciaCodigo.objects.using(db).update_or_create(nombre='empresa', defaults={'valor': mayor})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_empresa_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaCodigo',
+            fields=[
+                ('nombre', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(inicializar_secuencia, migrations.RunPython.noop),
+    ]
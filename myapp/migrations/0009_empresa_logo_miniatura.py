@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_secuenciacodigo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='logo_miniatura',
+            field=models.ImageField(blank=True, editable=False, max_length=255, null=True, upload_to='logos/miniaturas/'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_empresa_logo_miniatura'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='empresa',
+            index=models.Index(fields=['fecha_actualizacion'], name='empresa_fecha_act_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:57
+
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia de myapp/normalizacion.py al momento de esta migración: si aquel
+# módulo cambia, esta migración debe seguir produciendo lo mismo
+CAMPOS_NORMALIZADOS = {
+    'compania': 'compania_norm',
+    'cliente': 'cliente_norm',
+    'pais': 'pais_norm',
+}
+
+
+def normalizar(texto):
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto).casefold())
+    sin_marcas = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_marcas.split())
+
+
+def rellenar_normalizados(apps, schema_editor):
+    # Las filas existentes: por lotes, sin cargar toda la tabla
+    Empresa = apps.get_model('myapp', 'Empresa')
+    db = schema_editor.connection.alias
+    empresas = Empresa.objects.using(db)
+    lote = []
+    for empresa in empresas.only('id', *CAMPOS_NORMALIZADOS).iterator(chunk_size=2000):
+        for campo, sombra in CAMPOS_NORMALIZADOS.items():
+            largo = Empresa._meta.get_field(sombra).max_length
+            setattr(empresa, sombra, normalizar(getattr(empresa, campo))[:largo])
+        lote.append(empresa)
+        if len(lote) >= 2000:
+            empresas.bulk_update(lote, list(CAMPOS_NORMALIZADOS.values()))
+            lote = []
+    if lote:
+        empresas.bulk_update(lote, list(CAMPOS_NORMALIZADOS.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_empresa_fecha_actualizacion_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='cliente_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='empresa',
+            name='compania_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='empresa',
+            name='pais_norm',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(rellenar_normalizados, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='empresa',
+            index=models.Index(fields=['compania_norm'], name='empresa_compania_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='empresa',
+            index=models.Index(fields=['cliente_norm'], name='empresa_cliente_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='empresa',
+            index=models.Index(fields=['pais_norm'], name='empresa_pais_norm_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_empresa_campos_normalizados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255)),
+                ('ruta', models.CharField(max_length=500)),
+                ('revisar_duplicados', models.BooleanField(default=False)),
+                ('estado', models.CharField(choices=[('pendiente', 'En cola'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('fase', models.CharField(blank=True, max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('filas_totales', models.PositiveIntegerField(blank=True, null=True)),
+                ('procesadas', models.PositiveIntegerField(default=0)),
+                ('creadas', models.PositiveIntegerField(default=0)),
+                ('actualizadas', models.PositiveIntegerField(default=0)),
+                ('saltadas', models.PositiveIntegerField(default=0)),
+                ('errores', models.PositiveIntegerField(default=0)),
+                ('duplicados', models.PositiveIntegerField(default=0)),
+                ('mensajes', models.JSONField(blank=True, default=list)),
+                ('detalle_error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('terminado', models.DateTimeField(blank=True, null=True)),
+                ('latido', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx')],
+            },
+        ),
+    ]
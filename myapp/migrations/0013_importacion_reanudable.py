@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntoControlImportacion',
+            fields=[
+                ('huella_archivo', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('fila', models.PositiveIntegerField(default=1)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='empresa',
+            name='huella_importacion',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='sin_cambios',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
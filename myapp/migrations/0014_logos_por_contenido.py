@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:44
+
+import myapp.almacenamiento
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def contar_referencias(apps, schema_editor):
+    # Los archivos actuales conservan su nombre; `manage.py deduplicar_logos` los une
+    Empresa = apps.get_model('myapp', 'Empresa')
+    ReferenciaLogo = apps.get_model('myapp', 'ReferenciaLogo')
+    db = schema_editor.connection.alias
+    usos = Empresa.objects.using(db).exclude(logo__isnull=True).exclude(logo='').values('logo').annotate(n=Count('id'))
+    ReferenciaLogo.objects.using(db).bulk_create(
+        [ReferenciaLogo(nombre=fila['logo'], referencias=fila['n']) for fila in usos],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_importacion_reanudable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenciaLogo',
+            fields=[
+                ('nombre', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('referencias', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='empresa',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, storage=myapp.almacenamiento.AlmacenamientoLogos(), upload_to='logos/'),
+        ),
+        migrations.RunPython(contar_referencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:58
+
+from django.db import migrations, models
+
+# Copia de myapp/cambios.py al momento de esta migración (igual que
+# 0007_empresa_fts): si aquel módulo cambia, esta migración sigue creando
+# los mismos triggers
+SECUENCIA_CAMBIOS = 'cambios'
+
+_SIGUIENTE_VERSION = """
+    INSERT INTO myapp_secuenciacodigo (nombre, valor) VALUES ('cambios', 1)
+    ON CONFLICT (nombre) DO UPDATE SET valor = myapp_secuenciacodigo.valor + 1;"""
+
+
+def _registrar(fila, eliminada, fecha):
+    return f"""
+        INSERT INTO myapp_cambioempresa (empresa_id, codigo, eliminada, version, fecha)
+        VALUES ({fila}.id, {fila}.codigo, {eliminada},
+                (SELECT valor FROM myapp_secuenciacodigo WHERE nombre = 'cambios'), {fecha})
+        ON CONFLICT (empresa_id) DO UPDATE SET
+            codigo = excluded.codigo, eliminada = excluded.eliminada,
+            version = excluded.version, fecha = excluded.fecha;"""
+
+
+TRIGGERS_CAMBIOS = {
+    'myapp_empresa_cambios_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_cambios_ai AFTER INSERT ON myapp_empresa BEGIN
+            {_SIGUIENTE_VERSION}
+            {_registrar('new', 0, 'new.fecha_actualizacion')}
+        END""",
+    'myapp_empresa_cambios_au': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_cambios_au AFTER UPDATE ON myapp_empresa
+        WHEN old.cliente IS NOT new.cliente OR old.compania IS NOT new.compania
+          OR old.codigo IS NOT new.codigo OR old.telefono IS NOT new.telefono
+          OR old.correo IS NOT new.correo OR old.pais IS NOT new.pais
+          OR old.logo IS NOT new.logo OR old.logo_miniatura IS NOT new.logo_miniatura BEGIN
+            {_SIGUIENTE_VERSION}
+            {_registrar('new', 0, 'new.fecha_actualizacion')}
+        END""",
+    'myapp_empresa_cambios_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS myapp_empresa_cambios_ad AFTER DELETE ON myapp_empresa BEGIN
+            {_SIGUIENTE_VERSION}
+            {_registrar('old', 1, "strftime('%Y-%m-%d %H:%M:%f', 'now')")}
+        END""",
+}
+
+
+def registrar_existentes(apps, schema_editor):
+    # Cada empresa actual entra con su versión: un cliente que empieza con
+    # since=0 recibe el directorio completo y a partir de ahí solo cambios
+    Empresa = apps.get_model('myapp', 'Empresa')
+    CambioEmpresa = apps.get_model('myapp', 'CambioEmpresa')
+    SecuenciaCodigo = apps.get_model('myapp', 'SecuenciaCodigo')
+    db = schema_editor.connection.alias
+    filas = Empresa.objects.using(db).order_by('id').values_list('id', 'codigo', 'fecha_actualizacion')
+    lote, version = [], 0
+    for version, (id, codigo, fecha) in enumerate(filas.iterator(chunk_size=2000), start=1):
+        lote.append(CambioEmpresa(empresa_id=id, codigo=codigo, version=version, fecha=fecha))
+        if len(lote) >= 2000:
+            CambioEmpresa.objects.using(db).bulk_create(lote)
+            lote = []
+    CambioEmpresa.objects.using(db).bulk_create(lote)
+    SecuenciaCodigo.objects.using(db).update_or_create(nombre=SECUENCIA_CAMBIOS, defaults={'valor': version})
+
+    # En otros motores se registran con señales (ver myapp/cambios.py)
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in TRIGGERS_CAMBIOS.values():
+            schema_editor.execute(sql)
+
+
+def borrar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for nombre in TRIGGERS_CAMBIOS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_logos_por_contenido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioEmpresa',
+            fields=[
+                ('empresa_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('codigo', models.CharField(max_length=10)),
+                ('eliminada', models.BooleanField(default=False)),
+                ('version', models.BigIntegerField(unique=True)),
+                ('fecha', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(registrar_existentes, borrar_triggers),
+    ]
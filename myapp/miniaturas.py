@@ -0,0 +1,92 @@
+# myapp/miniaturas.py
+"""
+Miniaturas de logos con Pillow.
+
+Por cada logo se guardan variantes WebP de ancho fijo junto al original
+(logos/miniaturas/<ruta>_<ext>_200.webp y _400.webp, con la ruta completa
+del logo para que acme.png y acme.jpg no se pisen). La de 200 px es la que
+se guarda en Empresa.logo_miniatura; la de 400 px se usa como 2x en srcset.
+Los logos guardados por contenido (ver myapp/almacenamiento.py) comparten
+miniaturas: si ya existen no se vuelven a generar.
+
+Si Pillow no sabe abrir el logo (EMF/WMF...) se guarda el nombre del propio
+logo como miniatura: home muestra el original y no se reintenta en cada
+save ni en cada `generar_miniaturas` (sí con --todas o si cambia el logo).
+"""
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .almacenamiento import CARPETA as CARPETA_LOGOS
+from .almacenamiento import es_por_contenido
+
+CARPETA = 'logos/miniaturas'
+TAMANO_BASE = 200
+TAMANOS = (TAMANO_BASE, TAMANO_BASE * 2)
+CALIDAD_WEBP = 80
+
+
+def nombre_miniatura(nombre_logo, tamano=TAMANO_BASE):
+    """logos/sub/acme.png -> logos/miniaturas/sub/acme_png_200.webp"""
+    ruta = PurePosixPath(nombre_logo)
+    if ruta.parts[:1] == (CARPETA_LOGOS,):
+        ruta = ruta.relative_to(CARPETA_LOGOS)
+    extension = ruta.suffix.lstrip('.').lower()
+    base = ruta.with_suffix('').as_posix() + (f"_{extension}" if extension else '')
+    return f"{CARPETA}/{base}_{tamano}.webp"
+
+
+def sin_miniatura(empresa):
+    """True si el logo no se pudo convertir y se muestra el original"""
+    return bool(empresa.logo) and empresa.logo_miniatura.name == empresa.logo.name
+
+
+def variante(nombre_miniatura_base, tamano):
+    """Nombre de otra variante a partir de la miniatura base"""
+    return nombre_miniatura_base.replace(f"_{TAMANO_BASE}.webp", f"_{tamano}.webp")
+
+
+def _codificar(imagen, tamano):
+    copia = imagen.copy()
+    copia.thumbnail((tamano, tamano), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    copia.save(buffer, 'WEBP', quality=CALIDAD_WEBP, method=4)
+    return buffer.getvalue()
+
+
+def generar_miniaturas(nombre_logo, storage=None):
+    """
+    Genera todas las variantes del logo y devuelve el nombre de la miniatura
+    base. Si el archivo no es una imagen que Pillow sepa abrir (p. ej.
+    EMF/WMF) devuelve el nombre del propio logo (ver sin_miniatura).
+    """
+    if not nombre_logo:
+        return None
+    storage = storage or default_storage
+    if es_por_contenido(nombre_logo) and all(storage.exists(nombre_miniatura(nombre_logo, t)) for t in TAMANOS):
+        # Mismo nombre = mismos bytes = mismas miniaturas
+        return nombre_miniatura(nombre_logo)
+    try:
+        with storage.open(nombre_logo, 'rb') as archivo:
+            imagen = Image.open(archivo)
+            imagen = ImageOps.exif_transpose(imagen)
+            imagen = imagen.convert('RGBA' if imagen.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return nombre_logo
+
+    for tamano in TAMANOS:
+        destino = nombre_miniatura(nombre_logo, tamano)
+        if storage.exists(destino):
+            storage.delete(destino)
+        storage.save(destino, ContentFile(_codificar(imagen, tamano)))
+    return nombre_miniatura(nombre_logo)
+
+
+def miniatura_vigente(empresa):
+    """True si logo_miniatura corresponde al logo actual (sin tocar disco)"""
+    if not empresa.logo:
+        return not empresa.logo_miniatura
+    return empresa.logo_miniatura.name in (nombre_miniatura(empresa.logo.name), empresa.logo.name)
@@ -1,48 +1,297 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+
+from .almacenamiento import ajustar_referencias, almacenamiento_logos
+from .codigos import asegurar_minimo, formatear_codigo, reservar_codigos
+from .miniaturas import TAMANOS, generar_miniaturas, miniatura_vigente, sin_miniatura, variante
+from .normalizacion import CAMPOS_NORMALIZADOS, con_sombras, normalizar, normalizar_instancia
+from .optimizacion import encargar, necesita_optimizar
 
 # Create your models here.
 
+# Valor de Empresa._logo_guardado cuando el logo no se cargó (.only/.defer)
+LOGO_DIFERIDO = object()
+
+
+class EmpresaQuerySet(models.QuerySet):
+    """Mantiene las columnas *_norm también en las escrituras masivas"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for empresa in objs:
+            normalizar_instancia(empresa)
+        creadas = super().bulk_create(objs, *args, **kwargs)
+        ajustar_referencias(sumar=[e.logo for e in objs], using=self.db)
+        for empresa in objs:
+            empresa._logo_guardado = empresa.logo.name or ''
+        return creadas
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        for empresa in objs:
+            normalizar_instancia(empresa)
+        if 'logo' not in fields:
+            return super().bulk_update(objs, con_sombras(fields), *args, **kwargs)
+
+        diferidas = [e.pk for e in objs if e._logo_guardado is LOGO_DIFERIDO]
+        guardados = dict(self.model.objects.using(self.db).filter(pk__in=diferidas).values_list('pk', 'logo')) if diferidas else {}
+        anteriores = [guardados.get(e.pk) if e._logo_guardado is LOGO_DIFERIDO else e._logo_guardado for e in objs]
+        filas = super().bulk_update(objs, con_sombras(fields), *args, **kwargs)
+        ajustar_referencias(sumar=[e.logo for e in objs], restar=anteriores, using=self.db)
+        for empresa in objs:
+            empresa._logo_guardado = empresa.logo.name or ''
+        return filas
+
+    def update(self, **kwargs):
+        # Solo valores literales: una expresión (F, Concat...) no se puede normalizar en Python
+        for campo, sombra in CAMPOS_NORMALIZADOS.items():
+            if campo in kwargs and sombra not in kwargs and isinstance(kwargs[campo], (str, type(None))):
+                largo = self.model._meta.get_field(sombra).max_length
+                kwargs[sombra] = normalizar(kwargs[campo])[:largo]
+        return super().update(**kwargs)
+
 
 # Definicion de la tabla en Django Admin 
 class Empresa(models.Model):
     cliente = models.CharField(max_length=100)
     compania = models.CharField(max_length=100)
     codigo = models.CharField(max_length=10, unique=True, blank=True, editable=False)
-    logo = models.ImageField(upload_to='logos/', blank=True, null=True)
+    # Guardado por hash del contenido, una sola copia por imagen (ver myapp/almacenamiento.py)
+    logo = models.ImageField(upload_to='logos/', storage=almacenamiento_logos, blank=True, null=True)
+    # Miniatura WebP de 200px generada a partir de logo (ver myapp/miniaturas.py)
+    logo_miniatura = models.ImageField(upload_to='logos/miniaturas/', max_length=255, blank=True, null=True, editable=False)
     telefono = models.CharField(max_length=15)
     correo = models.EmailField()
     pais = models.CharField(max_length=50)
+
+    # Copias normalizadas (minúsculas, sin tildes) para buscar y emparejar (ver myapp/normalizacion.py)
+    compania_norm = models.CharField(max_length=100, blank=True, default='', editable=False)
+    cliente_norm = models.CharField(max_length=100, blank=True, default='', editable=False)
+    pais_norm = models.CharField(max_length=50, blank=True, default='', editable=False)
+    # Huella de la fila del Excel que la importó por última vez (ver myapp/importacion.py)
+    huella_importacion = models.CharField(max_length=32, blank=True, default='', editable=False)
     
     fecha_creacion = models.DateTimeField(auto_now_add=True)  
     fecha_actualizacion = models.DateTimeField(auto_now=True) 
 
+    class Meta:
+        indexes = [
+            # Conditional GET de la API y sincronización incremental
+            models.Index(fields=['fecha_actualizacion'], name='empresa_fecha_act_idx'),
+            # Emparejamiento de la importación y búsquedas exactas/por prefijo
+            models.Index(fields=['compania_norm'], name='empresa_compania_norm_idx'),
+            models.Index(fields=['cliente_norm'], name='empresa_cliente_norm_idx'),
+            models.Index(fields=['pais_norm'], name='empresa_pais_norm_idx'),
+        ]
+
+    objects = EmpresaQuerySet.as_manager()
+
+    # Nombre del logo tal como está en la base (para el contador de referencias)
+    _logo_guardado = ''
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        empresa = super().from_db(db, field_names, values)
+        empresa._logo_guardado = empresa.__dict__.get('logo', LOGO_DIFERIDO) or ''
+        return empresa
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        if 'logo' in self.__dict__:
+            self._logo_guardado = self.logo.name or ''
+
+    def _logo_anterior(self, using):
+        if self._state.adding or self.pk is None:
+            return ''
+        if self._logo_guardado is LOGO_DIFERIDO:
+            return Empresa.objects.using(using).filter(pk=self.pk).values_list('logo', flat=True).first() or ''
+        return self._logo_guardado
+
     def save(self, *args, **kwargs):
-        creando = self.pk is None
+        normalizar_instancia(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = con_sombras(kwargs['update_fields'])
+        if self.pk is None:
+            if not self.codigo:
+                # Un solo UPDATE ... RETURNING atómico, sin leer el "último" código
+                self.codigo = formatear_codigo(reservar_codigos(1, using=kwargs.get('using'))[0])
+            elif self.codigo.isdigit():
+                # Código explícito (p. ej. importado): que la secuencia no lo repita
+                asegurar_minimo(int(self.codigo), using=kwargs.get('using'))
+        cambia_logo = kwargs.get('update_fields') is None or 'logo' in kwargs['update_fields']
+        if cambia_logo:
+            using = kwargs.get('using') or 'default'
+            anterior = self._logo_anterior(using)
+        # Subida pesada (foto de móvil, EXIF...): se guarda el original y se optimiza fuera de la request
+        optimizar = cambia_logo and bool(self.logo) and not self.logo._committed and necesita_optimizar(self.logo.file)
         super().save(*args, **kwargs)
-        
-        if creando and not self.codigo:
-            # Obtener el último código numérico existente
-            ultimo_codigo = Empresa.objects.exclude(codigo='').exclude(pk=self.pk).order_by('-codigo').first()
-            
-            if ultimo_codigo and ultimo_codigo.codigo:
-                try:
-                    # Extraer el número del último código (ej: "0020" -> 20)
-                    ultimo_num = int(ultimo_codigo.codigo)
-                    nuevo_num = ultimo_num + 1
-                except ValueError:
-                    # Si no se puede convertir, usar el ID
-                    nuevo_num = self.id
-            else:
-                # Si no hay códigos, empezar desde 1
-                nuevo_num = 1
-            
-            self.codigo = f"{nuevo_num:04d}"
-            super().save(update_fields=['codigo'])
+        # Los UPDATE de abajo, en la misma base de datos que el save
+        esta = type(self)._base_manager.using(self._state.db).filter(pk=self.pk)
+        if cambia_logo:
+            # super().save() ya guardó el archivo subido: aquí el nombre es el definitivo
+            nuevo = self.logo.name or ''
+            if nuevo != anterior:
+                ajustar_referencias(sumar=[nuevo], restar=[anterior], using=using)
+            self._logo_guardado = nuevo
+
+        if optimizar:
+            nombre = self.logo.name
+            transaction.on_commit(lambda: encargar(nombre), using=using)
+            if self.logo_miniatura:
+                # Hasta que esté lista, home muestra el original
+                self.logo_miniatura = None
+                esta.update(logo_miniatura=None)
+        # Regenerar miniaturas solo si el logo cambió
+        elif not miniatura_vigente(self):
+            self.logo_miniatura = generar_miniaturas(self.logo.name) if self.logo else None
+            esta.update(logo_miniatura=self.logo_miniatura)
+
+    @property
+    def logo_thumb_url(self):
+        """URL de la miniatura (o del original si aún no hay miniatura)"""
+        if self.logo_miniatura:
+            return self.logo_miniatura.url
+        return self.logo.url if self.logo else ''
+
+    @property
+    def logo_srcset(self):
+        """srcset 1x/2x para <img>; vacío si no hay miniatura"""
+        if not self.logo_miniatura or sin_miniatura(self):
+            return ''
+        base = self.logo_miniatura.name
+        return ', '.join(
+            f"{self.logo_miniatura.storage.url(variante(base, tamano))} {i}x"
+            for i, tamano in enumerate(TAMANOS, 1)
+        )
 
     def __str__(self):
         return f"{self.cliente} ({self.codigo})"
 
 
+# Contador para asignar códigos de Empresa (ver myapp/codigos.py)
+class SecuenciaCodigo(models.Model):
+    nombre = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+
+# Cuántas empresas usan cada archivo de logo (ver myapp/almacenamiento.py)
+class ReferenciaLogo(models.Model):
+    nombre = models.CharField(max_length=100, primary_key=True)
+    referencias = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.referencias}"
+
+
+# Último cambio de cada empresa, para la sincronización incremental de la
+# API; las borradas quedan como baja (ver myapp/cambios.py)
+class CambioEmpresa(models.Model):
+    empresa_id = models.BigIntegerField(primary_key=True)
+    codigo = models.CharField(max_length=10)
+    eliminada = models.BooleanField(default=False)
+    version = models.BigIntegerField(unique=True)
+    fecha = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.codigo} v{self.version}{' (baja)' if self.eliminada else ''}"
+
+
+# Última fila guardada de una importación a medias, por contenido del archivo:
+# si se corta, la siguiente ejecución con el mismo .xlsx sigue desde ahí
+class PuntoControlImportacion(models.Model):
+    huella_archivo = models.CharField(max_length=64, primary_key=True)
+    fila = models.PositiveIntegerField(default=1)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.huella_archivo[:12]}: fila {self.fila}"
 
 
+# Importación de Excel encolada desde la web y ejecutada por
+# `manage.py procesar_importaciones` (ver myapp/trabajos.py)
+class TrabajoImportacion(models.Model):
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', 'En cola'
+        EN_PROCESO = 'en_proceso', 'En proceso'
+        COMPLETADO = 'completado', 'Completado'
+        ERROR = 'error', 'Error'
 
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    nombre = models.CharField(max_length=255)
+    ruta = models.CharField(max_length=500)
+    revisar_duplicados = models.BooleanField(default=False)
+
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    fase = models.CharField(max_length=20, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+
+    filas_totales = models.PositiveIntegerField(null=True, blank=True)
+    procesadas = models.PositiveIntegerField(default=0)
+    creadas = models.PositiveIntegerField(default=0)
+    actualizadas = models.PositiveIntegerField(default=0)
+    saltadas = models.PositiveIntegerField(default=0)
+    errores = models.PositiveIntegerField(default=0)
+    duplicados = models.PositiveIntegerField(default=0)
+    sin_cambios = models.PositiveIntegerField(default=0)
+    mensajes = models.JSONField(default=list, blank=True)
+    detalle_error = models.TextField(blank=True)
+
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    terminado = models.DateTimeField(null=True, blank=True)
+    latido = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # El worker busca el siguiente pendiente y los abandonados
+            models.Index(fields=['estado', 'creado'], name='trabajo_estado_creado_idx'),
+        ]
+
+    @property
+    def activo(self):
+        return self.estado in (self.Estado.PENDIENTE, self.Estado.EN_PROCESO)
+
+    @property
+    def porcentaje(self):
+        if self.estado == self.Estado.COMPLETADO:
+            return 100
+        if not self.filas_totales:
+            return 0
+        return min(99, int(self.procesadas * 100 / self.filas_totales))
+
+    def posicion_en_cola(self):
+        """1 si es el siguiente; None si ya no está en cola"""
+        if self.estado != self.Estado.PENDIENTE:
+            return None
+        anteriores = TrabajoImportacion.objects.filter(estado=self.Estado.PENDIENTE, id__lt=self.id)
+        return anteriores.count() + 1
+
+    def como_dict(self):
+        """Lo que la página de importaciones consulta periódicamente"""
+        return {
+            'id': self.id,
+            'nombre': self.nombre,
+            'estado': self.estado,
+            'estado_texto': self.get_estado_display(),
+            'fase': self.fase,
+            'posicion': self.posicion_en_cola(),
+            'filas_totales': self.filas_totales,
+            'procesadas': self.procesadas,
+            'creadas': self.creadas,
+            'actualizadas': self.actualizadas,
+            'saltadas': self.saltadas,
+            'errores': self.errores,
+            'duplicados': self.duplicados,
+            'sin_cambios': self.sin_cambios,
+            'porcentaje': self.porcentaje,
+            'mensajes': self.mensajes,
+            'detalle_error': self.detalle_error,
+            'activo': self.activo,
+        }
+
+    def __str__(self):
+        return f"{self.nombre} ({self.get_estado_display()})"
@@ -0,0 +1,43 @@
+# myapp/normalizacion.py
+"""
+Texto normalizado para comparar sin distinguir mayúsculas ni tildes.
+
+"  Compañía  ÁGUILA " -> "compania aguila". Empresa guarda una copia
+normalizada de compania, cliente y pais (columnas *_norm, indexadas) que
+se mantiene en save(), bulk_create, bulk_update y queryset.update() (ver
+EmpresaQuerySet). Así "Mexico" encuentra "México" y la importación puede
+emparejar por compañía con una igualdad en lugar de iexact.
+"""
+import unicodedata
+
+# campo original -> columna normalizada
+CAMPOS_NORMALIZADOS = {
+    'compania': 'compania_norm',
+    'cliente': 'cliente_norm',
+    'pais': 'pais_norm',
+}
+
+
+def normalizar(texto):
+    """Minúsculas, sin diacríticos y con los espacios colapsados"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto).casefold())
+    sin_marcas = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_marcas.split())
+
+
+def normalizar_instancia(empresa):
+    """Rellena las columnas *_norm de `empresa` a partir de sus campos"""
+    for campo, sombra in CAMPOS_NORMALIZADOS.items():
+        largo = empresa._meta.get_field(sombra).max_length
+        setattr(empresa, sombra, normalizar(getattr(empresa, campo))[:largo])
+
+
+def con_sombras(campos):
+    """Agrega a `campos` las columnas *_norm de los campos que incluye"""
+    campos = list(campos)
+    for campo, sombra in CAMPOS_NORMALIZADOS.items():
+        if campo in campos and sombra not in campos:
+            campos.append(sombra)
+    return campos
@@ -0,0 +1,105 @@
+# myapp/optimizacion.py
+"""
+Re-codificación de logos subidos fuera de la request.
+
+Empresa.save mira la cabecera del logo recién subido (necesita_optimizar):
+si es más grande que LOGO_MAX_LADO, trae EXIF, no es un formato web o pesa
+más de LOGO_BYTES_OPTIMO, guarda el original tal cual y, al confirmar la
+transacción, encarga optimizar_logo al pool de LOGOS_HILOS hilos (Pillow
+suelta el GIL al decodificar, escalar y codificar). Mientras tanto la
+empresa apunta al original y home muestra el original como miniatura.
+
+optimizar_logo reduce, aplica la orientación EXIF y la descarta, y guarda
+PNG optimizado (si hay transparencia o ya era PNG) o WebP. Cambia el logo
+de todas las empresas que usaban el original; el contador de referencias
+borra el original cuando queda sin uso. `manage.py optimizar_logos` hace lo
+mismo con los que hayan quedado pendientes (p. ej. tras un reinicio).
+"""
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .almacenamiento import almacenamiento_logos, borrar_sin_uso, en_segundo_plano
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_WEB = frozenset({'PNG', 'WEBP', 'JPEG', 'GIF'})
+CALIDAD_WEBP = 85
+
+
+def necesita_optimizar(archivo):
+    """Decide con la cabecera (sin decodificar la imagen) si vale la pena re-codificarla"""
+    try:
+        archivo.seek(0)
+        with Image.open(archivo) as imagen:
+            formato, tamano, info = imagen.format, imagen.size, imagen.info
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        return False  # no es algo que Pillow sepa re-codificar: se queda como está
+    finally:
+        archivo.seek(0)
+    return (
+        max(tamano) > settings.LOGO_MAX_LADO
+        or 'exif' in info
+        or formato not in FORMATOS_WEB
+        or archivo.size > settings.LOGO_BYTES_OPTIMO
+    )
+
+
+def reencodificar(archivo, tamano_original):
+    """(bytes, extensión) de la versión optimizada, o None si no mejora al original"""
+    with Image.open(archivo) as imagen:
+        formato = imagen.format
+        tenia_exif = 'exif' in imagen.info
+        imagen = ImageOps.exif_transpose(imagen)
+        reducir = max(imagen.size) > settings.LOGO_MAX_LADO
+        if reducir:
+            imagen.thumbnail((settings.LOGO_MAX_LADO, settings.LOGO_MAX_LADO), Image.Resampling.LANCZOS)
+
+        buffer = BytesIO()
+        transparente = imagen.mode in ('RGBA', 'LA') or 'transparency' in imagen.info
+        if formato == 'PNG' or transparente:
+            if imagen.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                imagen = imagen.convert('RGBA')
+            imagen.save(buffer, 'PNG', optimize=True)  # sin exif: no se copia
+            extension = '.png'
+        else:
+            imagen.convert('RGB').save(buffer, 'WEBP', quality=CALIDAD_WEBP, method=6)
+            extension = '.webp'
+    datos = buffer.getvalue()
+    if len(datos) >= tamano_original and not (reducir or tenia_exif):
+        return None
+    return datos, extension
+
+
+def optimizar_logo(nombre):
+    """Re-codifica el archivo `nombre` y pasa a la versión nueva las empresas que lo usan"""
+    from .models import Empresa
+
+    try:
+        with almacenamiento_logos.open(nombre, 'rb') as archivo:
+            resultado = reencodificar(archivo, almacenamiento_logos.size(nombre))
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning("No se pudo optimizar el logo %s: %s", nombre, e)
+        resultado = None
+    nuevo = almacenamiento_logos.save(f"logos/optimizado{resultado[1]}", ContentFile(resultado[0])) if resultado else nombre
+
+    empresas = list(Empresa.objects.filter(logo=nombre))
+    for empresa in empresas:
+        # save(): ajusta referencias (el original se borra si queda sin uso),
+        # genera las miniaturas aquí y no en la request, invalida cachés
+        empresa.logo = nuevo
+        empresa.fecha_actualizacion = timezone.now()
+        empresa.save(update_fields=['logo', 'fecha_actualizacion'])
+    if not empresas and nuevo != nombre:
+        # La empresa cambió de logo o se borró mientras tanto
+        borrar_sin_uso([nuevo])
+    return nuevo
+
+
+def encargar(nombre):
+    """Optimiza `nombre` en el pool de logos (o en el momento si LOGOS_HILOS = 0)"""
+    en_segundo_plano(optimizar_logo, nombre)
@@ -0,0 +1,112 @@
+# myapp/paginacion.py
+"""
+Paginación por cursor (keyset) sobre `id` descendente.
+
+A diferencia de django.core.paginator.Paginator no ejecuta COUNT(*) ni
+OFFSET: cada página es `WHERE id < cursor ORDER BY id DESC LIMIT n + 1`,
+así que la página 1.000 cuesta lo mismo que la primera.
+"""
+import base64
+import binascii
+
+from django.utils.functional import cached_property
+
+
+def codificar_cursor(direccion, pk):
+    """Token opaco para la URL: 'n' = siguiente página, 'p' = anterior"""
+    return base64.urlsafe_b64encode(f'{direccion}:{pk}'.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve (direccion, pk) o (None, None) si el token no es válido"""
+    if not token:
+        return None, None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        direccion, pk = base64.urlsafe_b64decode(token + relleno).decode().split(':', 1)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None, None
+    if direccion not in ('n', 'p'):
+        return None, None
+    return direccion, pk
+
+
+def _pk(objeto):
+    # Admite instancias de modelo y filas de .values()
+    return objeto['id'] if isinstance(objeto, dict) else objeto.pk
+
+
+class PaginaCursor:
+    """Página de resultados con tokens next/prev y total perezoso"""
+
+    def __init__(self, queryset, object_list, has_next, has_previous):
+        self._queryset = queryset
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return codificar_cursor('n', _pk(self.object_list[-1]))
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return codificar_cursor('p', _pk(self.object_list[0]))
+        return None
+
+    @cached_property
+    def total(self):
+        """COUNT(*) exacto; solo se ejecuta si alguien lo pide"""
+        return self._queryset.count()
+
+    async def atotal(self):
+        """total para vistas asíncronas (queda cacheado igual que total)"""
+        if 'total' not in self.__dict__:
+            self.__dict__['total'] = await self._queryset.acount()
+        return self.total
+
+
+class CursorPaginator:
+    """Pagina `queryset` por `id` descendente usando tokens opacos"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def _consulta(self, direccion, pk):
+        if direccion == 'p':
+            return self.queryset.filter(pk__gt=pk).order_by('pk')[:self.per_page + 1]
+        qs = self.queryset.order_by('-pk')
+        if direccion == 'n':
+            qs = qs.filter(pk__lt=pk)
+        return qs[:self.per_page + 1]
+
+    def _pagina(self, direccion, filas):
+        if direccion == 'p':
+            has_previous = len(filas) > self.per_page
+            filas = filas[:self.per_page][::-1]
+            return PaginaCursor(self.queryset, filas, has_next=True, has_previous=has_previous)
+        has_next = len(filas) > self.per_page
+        return PaginaCursor(self.queryset, filas[:self.per_page], has_next=has_next, has_previous=direccion == 'n')
+
+    def get_page(self, cursor=None):
+        direccion, pk = decodificar_cursor(cursor)
+        return self._pagina(direccion, list(self._consulta(direccion, pk)))
+
+    async def aget_page(self, cursor=None):
+        """Igual que get_page, con el ORM asíncrono (vistas ASGI)"""
+        direccion, pk = decodificar_cursor(cursor)
+        return self._pagina(direccion, [fila async for fila in self._consulta(direccion, pk)])
@@ -0,0 +1,173 @@
+# myapp/permisos.py
+"""
+Foto de permisos por usuario, calculada una vez y cacheada.
+
+`request.permisos` (PermisosMiddleware) y `{{ permisos }}` en plantillas
+(context processor) exponen un PermisosEmpresa inmutable, así que cada
+comprobación es un acceso a atributo. La caché (local a cada proceso) se
+indexa con un contador de generación guardado en la base de datos (fila
+'permisos' de myapp_secuenciacodigo) que se sube cuando cambian usuarios,
+grupos o permisos: leerlo es una consulta por clave primaria y un permiso
+retirado deja de valer en todos los procesos en la siguiente request.
+Las vistas asíncronas usan `await request.apermisos()` (ORM y caché
+asíncronos).
+"""
+from dataclasses import dataclass
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from .codigos import reservar_codigos
+
+SECUENCIA_PERMISOS = 'permisos'
+TIMEOUT = 5 * 60  # las generaciones viejas no se borran: caducan solas
+
+
+@dataclass(frozen=True)
+class PermisosEmpresa:
+    is_superuser: bool = False
+    add: bool = False
+    change: bool = False
+    delete: bool = False
+    view: bool = False
+
+    @property
+    def is_admin(self):
+        return self.is_superuser or self.add or self.change or self.delete
+
+
+SIN_PERMISOS = PermisosEmpresa()
+
+
+def calcular_permisos(user):
+    """Resuelve los permisos de Empresa (2 consultas como máximo)"""
+    if not user.is_active or user.is_anonymous:
+        return SIN_PERMISOS
+    if user.is_superuser:
+        return PermisosEmpresa(is_superuser=True, add=True, change=True, delete=True, view=True)
+    todos = user.get_all_permissions()
+    return PermisosEmpresa(
+        add='myapp.add_empresa' in todos,
+        change='myapp.change_empresa' in todos,
+        delete='myapp.delete_empresa' in todos,
+        view='myapp.view_empresa' in todos,
+    )
+
+
+async def acalcular_permisos(user):
+    """calcular_permisos para vistas asíncronas"""
+    if not user.is_active or user.is_anonymous:
+        return SIN_PERMISOS
+    if user.is_superuser:
+        return PermisosEmpresa(is_superuser=True, add=True, change=True, delete=True, view=True)
+    todos = await user.aget_all_permissions()
+    return PermisosEmpresa(
+        add='myapp.add_empresa' in todos,
+        change='myapp.change_empresa' in todos,
+        delete='myapp.delete_empresa' in todos,
+        view='myapp.view_empresa' in todos,
+    )
+
+
+def _generaciones():
+    from .models import SecuenciaCodigo
+    return SecuenciaCodigo.objects.filter(nombre=SECUENCIA_PERMISOS).values_list('valor', flat=True)
+
+
+def _clave(generacion, user):
+    # date_joined distingue a un usuario nuevo que reutiliza el id de uno
+    # borrado (SQLite reutiliza rowids) aunque la generación coincida
+    return f'permisos:{generacion or 0}:{user.pk}:{user.date_joined.timestamp()}'
+
+
+def obtener_permisos(user):
+    """Foto de permisos del usuario, desde caché si está disponible"""
+    if user.is_anonymous:
+        return SIN_PERMISOS
+    clave = _clave(_generaciones().first(), user)
+    permisos = cache.get(clave)
+    if permisos is None:
+        permisos = calcular_permisos(user)
+        cache.set(clave, permisos, TIMEOUT)
+    return permisos
+
+
+async def aobtener_permisos(user):
+    """obtener_permisos sin consultas ni caché síncronas"""
+    if user.is_anonymous:
+        return SIN_PERMISOS
+    clave = _clave(await _generaciones().afirst(), user)
+    permisos = await cache.aget(clave)
+    if permisos is None:
+        permisos = await acalcular_permisos(user)
+        await cache.aset(clave, permisos, TIMEOUT)
+    return permisos
+
+
+def invalidar_permisos():
+    """Descarta las fotos cacheadas en todos los procesos"""
+    reservar_codigos(1, secuencia=SECUENCIA_PERMISOS)
+
+
+class PermisosMiddleware:
+    """
+    Añade request.permisos (perezoso: solo se calcula si se usa) y, para
+    vistas asíncronas, la corrutina request.apermisos().
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.permisos = SimpleLazyObject(lambda: obtener_permisos(request.user))
+        request.apermisos = partial(_apermisos, request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+async def _apermisos(request):
+    """Resuelve los permisos sin ORM síncrono y los deja en request.permisos"""
+    permisos = await aobtener_permisos(await request.auser())
+    request.permisos = permisos
+    return permisos
+
+
+def context_processor(request):
+    return {'permisos': getattr(request, 'permisos', SIN_PERMISOS)}
+
+
+# -- Invalidación ------------------------------------------------------------
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def _m2m_permisos_cambiados(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_permisos()
+
+
+@receiver(post_save, sender=User)
+def _usuario_guardado(sender, instance, update_fields=None, **kwargs):
+    # last_login se guarda en cada inicio de sesión y no afecta a permisos
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidar_permisos()
+
+
+@receiver(post_delete, sender=Group)
+def _grupo_borrado(sender, **kwargs):
+    invalidar_permisos()
@@ -0,0 +1,350 @@
+# myapp/respaldo.py
+"""
+Respaldo y restauración del directorio de empresas en NDJSON comprimido.
+
+Formato (un archivo .ndjson.gz, un objeto JSON por línea):
+
+- Primera línea, cabecera: {"formato": FORMATO, "version": 1, "creado",
+  "desde", "hasta", "secuencia"}. `hasta` es el instante en que empezó el
+  respaldo: el siguiente incremental usa `--since` con ese valor (o con la
+  ruta de este archivo, que es lo mismo).
+- {"logo": nombre, "sha256", "datos": base64}: solo con `logos=True`, una
+  vez por archivo y antes de la primera empresa que lo usa.
+- {"baja": codigo}: solo en un incremental, una por empresa borrada entre
+  `desde` y `hasta` (sale de las bajas de myapp_cambioempresa, ver
+  cambios.py). Van antes de las empresas: si el código se volvió a usar,
+  la empresa nueva se restaura después de borrar la vieja.
+- {"empresa": codigo, "cliente", ...}: una por empresa, en orden de id.
+
+Respaldar recorre la tabla con .values().iterator() y escribe por bloques
+de CHUNK líneas, sin cargar el directorio en memoria. Restaurar lee línea
+a línea y escribe con bulk_create / bulk_update por lotes (una transacción
+cada uno), conservando código y fechas: no pasa por Empresa.save, así que
+no reserva códigos ni hace consultas por fila (las actualizaciones son un
+UPDATE preparado por fila con executemany). Las empresas se emparejan
+por código: las que ya existen se actualizan y las bajas se borran por
+lotes con lotes.eliminar_en_lote.
+
+Un incremental solo conoce las bajas que siguen en myapp_cambioempresa:
+`manage.py purgar_cambios` borra las antiguas, así que un `--since`
+anterior a la última purga no trae los borrados de antes de ella (hay que
+partir de un respaldo completo).
+"""
+import base64
+import gzip
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, time as hora
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .almacenamiento import ajustar_referencias, almacenamiento_logos, es_por_contenido
+from .cache_busqueda import invalidar_busquedas
+from .codigos import SECUENCIA_EMPRESA, asegurar_minimo
+from .lotes import eliminar_en_lote
+from .miniaturas import generar_miniaturas
+from .models import CambioEmpresa, Empresa, SecuenciaCodigo
+from .normalizacion import con_sombras, normalizar_instancia
+
+FORMATO = 'directorio-empresas'
+VERSION = 1
+CHUNK = 2000
+CAMPOS = ('codigo', 'cliente', 'compania', 'telefono', 'correo', 'pais', 'logo',
+          'huella_importacion', 'fecha_creacion', 'fecha_actualizacion')
+CAMPOS_RESTAURABLES = [c for c in CAMPOS if c != 'codigo'] + ['logo_miniatura']
+
+
+class RespaldoInvalido(Exception):
+    pass
+
+
+@dataclass
+class ResultadoRespaldo:
+    empresas: int = 0
+    bajas: int = 0
+    logos: int = 0
+    logos_faltantes: list = field(default_factory=list)
+    creadas: int = 0
+    actualizadas: int = 0
+    eliminadas: int = 0
+    cabecera: dict = field(default_factory=dict)
+    inicio: float = field(default_factory=time.perf_counter)
+    segundos: float = 0.0
+
+
+def _json(valor):
+    # DjangoJSONEncoder recorta a milisegundos: las fechas no volverían iguales
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} no es serializable")
+
+
+def _linea(objeto):
+    return json.dumps(objeto, default=_json, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def leer_cabecera(ruta):
+    """Cabecera de un respaldo (solo lee la primera línea)"""
+    try:
+        with gzip.open(ruta, 'rt', encoding='utf-8') as archivo:
+            cabecera = json.loads(archivo.readline() or 'null')
+    except (OSError, ValueError) as e:
+        raise RespaldoInvalido(f"{ruta} no es un respaldo válido: {e}") from e
+    if not isinstance(cabecera, dict) or cabecera.get('formato') != FORMATO:
+        raise RespaldoInvalido(f"{ruta} no es un respaldo del directorio")
+    if cabecera.get('version', 0) > VERSION:
+        raise RespaldoInvalido(f"{ruta} es de una versión más nueva ({cabecera['version']})")
+    return cabecera
+
+
+def interpretar_desde(valor):
+    """
+    '2025-10-01', '2025-10-01T08:30:00+00:00' o la ruta de un respaldo
+    anterior (se usa su `hasta`) -> datetime con zona horaria
+    """
+    if Path(valor).is_file():
+        valor = leer_cabecera(valor)['hasta']
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        if dia is None:
+            raise RespaldoInvalido(f"Fecha no válida: {valor}")
+        fecha = datetime.combine(dia, hora.min)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+# -- Respaldar --------------------------------------------------------------
+
+def _registro_logo(nombre):
+    """Línea del logo `nombre`, o None si el archivo no está en disco"""
+    try:
+        with almacenamiento_logos.open(nombre, 'rb') as archivo:
+            datos = archivo.read()
+    except OSError:
+        return None
+    return {
+        'logo': nombre,
+        'sha256': hashlib.sha256(datos).hexdigest(),
+        'datos': base64.b64encode(datos).decode('ascii'),
+    }
+
+
+def escribir_respaldo(destino, desde=None, logos=False, progreso=None):
+    """
+    Escribe el respaldo en `destino` (ruta). Con `desde`, solo las empresas
+    actualizadas y las borradas a partir de ese instante (incremental).
+    """
+    resultado = ResultadoRespaldo()
+    hasta = timezone.now()
+    empresas = Empresa.objects.filter(fecha_actualizacion__lt=hasta).order_by('id')
+    if desde:
+        empresas = empresas.filter(fecha_actualizacion__gte=desde)
+    secuencia = SecuenciaCodigo.objects.filter(nombre=SECUENCIA_EMPRESA).values_list('valor', flat=True).first()
+    resultado.cabecera = {
+        'formato': FORMATO,
+        'version': VERSION,
+        'creado': hasta,
+        'desde': desde,
+        'hasta': hasta,
+        'secuencia': secuencia or 0,
+        'logos': logos,
+    }
+
+    incluidos = set()  # nombres de logo ya escritos (uno por archivo)
+    with gzip.open(destino, 'wt', encoding='utf-8', compresslevel=6) as archivo:
+        archivo.write(_linea(resultado.cabecera))
+        bloque = []
+        if desde:
+            bajas = CambioEmpresa.objects.filter(eliminada=True, fecha__gte=desde, fecha__lt=hasta)
+            for codigo in bajas.order_by('version').values_list('codigo', flat=True).iterator(chunk_size=CHUNK):
+                bloque.append(_linea({'baja': codigo}))
+                resultado.bajas += 1
+        for fila in empresas.values(*CAMPOS).iterator(chunk_size=CHUNK):
+            logo = fila['logo'] or ''
+            if logos and logo and logo not in incluidos:
+                incluidos.add(logo)
+                registro = _registro_logo(logo)
+                if registro:
+                    bloque.append(_linea(registro))
+                    resultado.logos += 1
+                else:
+                    resultado.logos_faltantes.append(logo)
+            fila['logo'] = logo
+            bloque.append(_linea({'empresa': fila.pop('codigo'), **fila}))
+            resultado.empresas += 1
+            if len(bloque) >= CHUNK:
+                archivo.writelines(bloque)
+                bloque = []
+                if progreso:
+                    progreso(resultado)
+        archivo.writelines(bloque)
+
+    resultado.segundos = time.perf_counter() - resultado.inicio
+    return resultado
+
+
+# -- Restaurar --------------------------------------------------------------
+
+def _actualizar(empresas, campos):
+    """
+    Como Empresa.objects.bulk_update(empresas, campos), pero con un UPDATE
+    preparado por fila (executemany): el CASE WHEN que arma bulk_update
+    cuesta filas × campos expresiones de Python por lote, y restaurar sobre
+    un directorio existente pasaba casi todo el tiempo ahí.
+    """
+    if not empresas:
+        return
+    conexion = connections[Empresa.objects.db]
+    columnas = [Empresa._meta.get_field(campo) for campo in con_sombras(campos)]
+    qn = conexion.ops.quote_name
+    sql = (
+        f"UPDATE {qn(Empresa._meta.db_table)} SET {', '.join(f'{qn(c.column)} = %s' for c in columnas)} "
+        f"WHERE {qn(Empresa._meta.pk.column)} = %s"
+    )
+    filas = []
+    for empresa in empresas:
+        normalizar_instancia(empresa)
+        filas.append([c.get_db_prep_save(getattr(empresa, c.attname), conexion) for c in columnas] + [empresa.pk])
+    with conexion.cursor() as cursor:
+        cursor.executemany(sql, filas)
+    if 'logo' in campos:
+        ajustar_referencias(sumar=[e.logo for e in empresas], restar=[e._logo_guardado for e in empresas])
+        for empresa in empresas:
+            empresa._logo_guardado = empresa.logo.name or ''
+
+
+class RestauradorEmpresas:
+    """Carga un respaldo por lotes; ver el docstring del módulo"""
+
+    def __init__(self, ruta, batch_size=1000, progreso=None):
+        self.ruta = ruta
+        self.batch_size = batch_size
+        self.progreso = progreso
+        self._renombrados = {}  # logo del respaldo -> nombre con el que quedó guardado
+        self._miniaturas = {}   # logo -> futuro de generar_miniaturas
+        self._lote = []
+        self._bajas = []
+
+    def _guardar_logo(self, registro, resultado):
+        nombre = registro['logo']
+        if almacenamiento_logos.exists(nombre):
+            return
+        datos = base64.b64decode(registro['datos'])
+        if hashlib.sha256(datos).hexdigest() != registro['sha256']:
+            raise RespaldoInvalido(f"El logo {nombre} está dañado (sha256 no coincide)")
+        # El almacenamiento nombra por contenido: un nombre antiguo
+        # (logos/0001_x.png) queda como logos/aa/<sha>.png
+        guardado = almacenamiento_logos.save(nombre, ContentFile(datos))
+        if guardado != nombre:
+            if es_por_contenido(nombre):
+                raise RespaldoInvalido(f"El logo {nombre} no corresponde a su contenido")
+            self._renombrados[nombre] = guardado
+        resultado.logos += 1
+
+    def _empresa(self, registro):
+        logo = registro.get('logo') or ''
+        logo = self._renombrados.get(logo, logo)
+        if logo and logo not in self._miniaturas:
+            self._miniaturas[logo] = self._pool.submit(generar_miniaturas, logo)
+        empresa = Empresa(codigo=registro['empresa'])
+        for campo in CAMPOS_RESTAURABLES:
+            if campo in registro:
+                setattr(empresa, campo, registro[campo])
+        empresa.logo = logo or None
+        for campo in ('fecha_creacion', 'fecha_actualizacion'):
+            valor = registro.get(campo)
+            setattr(empresa, campo, parse_datetime(valor) if valor else timezone.now())
+        return empresa
+
+    def _guardar_lote(self, resultado):
+        lote, self._lote = self._lote, []
+        if not lote:
+            return
+        for empresa in lote:
+            empresa.logo_miniatura = self._miniaturas[empresa.logo.name].result() if empresa.logo else None
+
+        # Un código repetido dentro del lote: gana el último (el más reciente)
+        por_codigo = {empresa.codigo: empresa for empresa in lote}
+        existentes = Empresa.objects.filter(codigo__in=por_codigo).in_bulk(field_name='codigo')
+        crear, actualizar = [], []
+        for codigo, empresa in por_codigo.items():
+            actual = existentes.get(codigo)
+            if actual is None:
+                crear.append(empresa)
+                continue
+            for campo in CAMPOS_RESTAURABLES:
+                setattr(actual, campo, getattr(empresa, campo))
+            actualizar.append(actual)
+
+        # bulk_create pone fecha_creacion/fecha_actualizacion = ahora (auto_now,
+        # también en el objeto): se vuelven a poner las del respaldo
+        fechas = [(e.fecha_creacion, e.fecha_actualizacion) for e in crear]
+        with transaction.atomic():
+            Empresa.objects.bulk_create(crear, batch_size=self.batch_size)
+            for empresa, (creada, actualizada) in zip(crear, fechas):
+                empresa.fecha_creacion, empresa.fecha_actualizacion = creada, actualizada
+            _actualizar(crear, ['fecha_creacion', 'fecha_actualizacion'])
+            _actualizar(actualizar, CAMPOS_RESTAURABLES)
+            numericos = [int(codigo) for codigo in por_codigo if codigo.isdigit()]
+            if numericos:
+                asegurar_minimo(max(numericos))
+
+        resultado.creadas += len(crear)
+        resultado.actualizadas += len(actualizar)
+        resultado.segundos = time.perf_counter() - resultado.inicio
+        if self.progreso:
+            self.progreso(resultado)
+
+    def _borrar_bajas(self, resultado):
+        codigos, self._bajas = self._bajas, []
+        if not codigos:
+            return
+        ids = list(Empresa.objects.filter(codigo__in=codigos).values_list('id', flat=True))
+        if ids:
+            resultado.eliminadas += eliminar_en_lote(ids)
+
+    def ejecutar(self):
+        resultado = ResultadoRespaldo()
+        resultado.cabecera = leer_cabecera(self.ruta)
+        self._pool = ThreadPoolExecutor()
+        try:
+            with gzip.open(self.ruta, 'rt', encoding='utf-8') as archivo:
+                archivo.readline()  # cabecera
+                for numero, linea in enumerate(archivo, start=2):
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError as e:
+                        raise RespaldoInvalido(f"Línea {numero} no es JSON válido: {e}") from e
+                    if 'logo' in registro and 'datos' in registro:
+                        self._guardar_logo(registro, resultado)
+                    elif 'baja' in registro:
+                        self._bajas.append(registro['baja'])
+                        resultado.bajas += 1
+                        if len(self._bajas) >= self.batch_size:
+                            self._borrar_bajas(resultado)
+                    elif 'empresa' in registro:
+                        self._borrar_bajas(resultado)  # las bajas van primero
+                        self._lote.append(self._empresa(registro))
+                        resultado.empresas += 1
+                        if len(self._lote) >= self.batch_size:
+                            self._guardar_lote(resultado)
+                self._borrar_bajas(resultado)
+                self._guardar_lote(resultado)
+        finally:
+            self._pool.shutdown()
+
+        if resultado.cabecera.get('secuencia'):
+            asegurar_minimo(resultado.cabecera['secuencia'])
+        # bulk_create/bulk_update no emiten post_save
+        invalidar_busquedas()
+        resultado.segundos = time.perf_counter() - resultado.inicio
+        return resultado
@@ -0,0 +1,87 @@
+# myapp/subidas.py
+"""
+Límites para las imágenes subidas (logo), aplicados mientras llega el cuerpo.
+
+LimiteImagenesHandler va primero en FILE_UPLOAD_HANDLERS, delante de
+TemporaryFileUploadHandler (que escribe el archivo en disco por bloques, sin
+tenerlo en memoria). Para los campos de CAMPOS_IMAGEN:
+
+- Si el Content-Length de la request ya supera LOGO_MAX_BYTES se corta sin
+  leer el resto del cuerpo.
+- Cuenta los bytes recibidos y corta al pasar del límite.
+- Con los primeros bloques Pillow lee la cabecera: si las dimensiones pasan
+  de LOGO_MAX_PIXELES (o no es una imagen) el archivo se descarta.
+
+El motivo queda en request.subidas_rechazadas[campo]; las vistas lo
+consultan con rechazo(request, campo).
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from PIL import Image, ImageFile
+
+CAMPOS_IMAGEN = frozenset({'logo'})
+# Lo que ocupan el resto de campos del formulario y los separadores multipart
+MARGEN_FORMULARIO = 64 * 1024
+# Bytes tras los que una imagen ya debería tener la cabecera legible
+BYTES_CABECERA = 512 * 1024
+
+
+def rechazo(request, campo):
+    """Motivo por el que se descartó el archivo `campo`, o None"""
+    return getattr(request, 'subidas_rechazadas', {}).get(campo)
+
+
+class LimiteImagenesHandler(FileUploadHandler):
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.largo_request = content_length
+        self.request.subidas_rechazadas = {}
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.vigilado = field_name in CAMPOS_IMAGEN
+        if not self.vigilado:
+            return
+        self.recibidos = 0
+        self.parser = ImageFile.Parser()
+        self.dimensiones = None
+        maximo = settings.LOGO_MAX_BYTES
+        if (self.content_length or 0) > maximo or (self.largo_request or 0) > maximo + MARGEN_FORMULARIO:
+            self._rechazar(f'pesa más de {maximo // (1024 * 1024)} MB', StopUpload(connection_reset=True))
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.vigilado:
+            return raw_data
+        self.recibidos += len(raw_data)
+        if self.recibidos > settings.LOGO_MAX_BYTES:
+            # Sin Content-Length fiable: se corta en cuanto se pasa
+            self._rechazar(
+                f'pesa más de {settings.LOGO_MAX_BYTES // (1024 * 1024)} MB', StopUpload(connection_reset=True))
+        if self.dimensiones is None:
+            self._leer_cabecera(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.vigilado and self.dimensiones is None:
+            # Archivo pequeño que Pillow no reconoce: el siguiente handler ya
+            # lo guardó, la vista lo ignora por el motivo registrado
+            self.request.subidas_rechazadas[self.field_name] = 'no es una imagen válida'
+        return None
+
+    def _leer_cabecera(self, datos):
+        try:
+            self.parser.feed(datos)
+        except (OSError, Image.DecompressionBombError):
+            self._rechazar('no es una imagen válida', SkipFile())
+        if self.parser.image is not None:
+            self.dimensiones = self.parser.image.size
+            ancho, alto = self.dimensiones
+            if ancho * alto > settings.LOGO_MAX_PIXELES:
+                self._rechazar(f'{ancho}×{alto} px supera el máximo permitido', SkipFile())
+        elif self.recibidos > BYTES_CABECERA:
+            self._rechazar('no es una imagen válida', SkipFile())
+
+    def _rechazar(self, motivo, excepcion):
+        self.request.subidas_rechazadas[self.field_name] = motivo
+        self.vigilado = False
+        raise excepcion
@@ -1,6 +1,7 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.db import models
 from myapp import models as my_models
 
@@ -91,3 +92,1419 @@ class ModelsTestCase(TestCase):
         # Comprobaciones básicas
         self.assertEqual(Empresa.objects.count(), 1)
         self.assertEqual(getattr(empresa, text_field.name), "Empresa Demo de Test")
+
+
+class BusquedaTestCase(TestCase):
+    def setUp(self):
+        caches['busquedas'].clear()
+        Empresa = my_models.Empresa
+        self.bmw = Empresa.objects.create(cliente='Ana', compania='BMW', telefono='555', correo='ana@bmw.com', pais='México')
+        self.otra = Empresa.objects.create(cliente='Luis', compania='Compañía Azul', telefono='777', correo='luis@azul.com', pais='Chile')
+        self.admin = User.objects.create(username='admin_test', is_superuser=True, is_staff=True)
+        self.lector = User.objects.create(username='lector_test')
+
+    def test_busqueda_por_prefijo_y_sin_acentos(self):
+        from myapp.busqueda import buscar_empresas
+        qs = my_models.Empresa.objects.order_by('-id')
+        self.assertEqual(list(buscar_empresas(qs, 'bm')), [self.bmw])
+        self.assertEqual(list(buscar_empresas(qs, 'compania', 'compania')), [self.otra])
+
+    def test_texto_por_palabra_codigo_y_telefono_por_subcadena(self):
+        from myapp.busqueda import buscar_empresas
+        qs = my_models.Empresa.objects.order_by('-id')
+        # FTS5 busca por comienzo de palabra: "mw" ya no encuentra "BMW"
+        self.assertEqual(list(buscar_empresas(qs, 'mw', 'compania')), [])
+        trozo = self.bmw.codigo[2:]
+        self.assertIn(self.bmw, list(buscar_empresas(qs, trozo, 'codigo')))
+        self.assertEqual(list(buscar_empresas(qs, '55', 'telefono', is_admin=True)), [self.bmw])
+
+    def test_indice_sincronizado_al_editar_y_borrar(self):
+        from myapp.busqueda import buscar_empresas
+        qs = my_models.Empresa.objects.all()
+        self.otra.compania = 'Zeta'
+        self.otra.save()
+        self.assertEqual(list(buscar_empresas(qs, 'zeta')), [self.otra])
+        self.otra.delete()
+        self.assertEqual(list(buscar_empresas(qs, 'zeta')), [])
+
+    def test_triggers_se_reparan_tras_rehacer_la_tabla(self):
+        from django.db import connection
+        from myapp.busqueda import asegurar_indice_fts, buscar_empresas
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER myapp_empresa_fts_ai')
+        nueva = my_models.Empresa.objects.create(cliente='Eva', compania='Quetzal')
+        self.assertTrue(asegurar_indice_fts())
+        self.assertEqual(list(buscar_empresas(my_models.Empresa.objects.all(), 'quetzal')), [nueva])
+        self.assertFalse(asegurar_indice_fts())
+
+    def test_campos_privados_solo_para_admin(self):
+        self.client.force_login(self.lector)
+        response = self.client.get(reverse('home'), {'q': 'chile', 'field': 'pais'})
+        self.assertEqual(response.context['empresas'].paginator.count, 2)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('home'), {'q': 'chile', 'field': 'pais'})
+        self.assertEqual([e.pk for e in response.context['empresas']], [self.otra.pk])
+
+
+class PaginacionCursorTestCase(TestCase):
+    def setUp(self):
+        caches['busquedas'].clear()
+        for i in range(30):
+            my_models.Empresa.objects.create(cliente=f'Cliente {i}', compania=f'Compania {i}')
+
+    def test_recorre_paginas_en_ambos_sentidos(self):
+        from myapp.paginacion import CursorPaginator
+        paginator = CursorPaginator(my_models.Empresa.objects.all(), 12)
+        todas = list(my_models.Empresa.objects.order_by('-id').values_list('id', flat=True))
+
+        pagina1 = paginator.get_page(None)
+        pagina2 = paginator.get_page(pagina1.next_cursor)
+        pagina3 = paginator.get_page(pagina2.next_cursor)
+        self.assertEqual([e.id for e in pagina1] + [e.id for e in pagina2] + [e.id for e in pagina3], todas)
+        self.assertFalse(pagina1.has_previous)
+        self.assertFalse(pagina3.has_next)
+
+        anterior = paginator.get_page(pagina3.previous_cursor)
+        self.assertEqual([e.id for e in anterior], [e.id for e in pagina2])
+        self.assertEqual(pagina2.total, 30)
+
+    def test_home_en_modo_cursor_no_cuenta(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.force_login(User.objects.create(username='lector_cursor'))
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('home'), {'modo': 'cursor'})
+        self.assertEqual(len(response.context['empresas']), 12)
+        self.assertFalse(any('COUNT(' in c['sql'] for c in consultas.captured_queries))
+
+        # El total pedido sigue en los enlaces de la página siguiente
+        response = self.client.get(reverse('home'), {'modo': 'cursor', 'total': '1'})
+        self.assertIn('total=1', response.context['filtros_qs'])
+        self.assertContains(response, f"total=1&cursor={response.context['empresas'].next_cursor}")
+
+
+class CodigoSecuenciaTestCase(TestCase):
+    def test_codigos_consecutivos_con_formato(self):
+        Empresa = my_models.Empresa
+        primera = Empresa.objects.create(cliente='Uno', compania='Uno')
+        segunda = Empresa.objects.create(cliente='Dos', compania='Dos')
+        self.assertEqual(int(segunda.codigo), int(primera.codigo) + 1)
+        self.assertEqual(len(primera.codigo), 4)
+
+    def test_reserva_en_bloque_y_codigo_explicito(self):
+        from myapp.codigos import reservar_codigos
+        Empresa = my_models.Empresa
+        Empresa.objects.create(cliente='Importada', compania='Importada', codigo='9999')
+        bloque = reservar_codigos(3)
+        self.assertEqual(list(bloque), [10000, 10001, 10002])
+        siguiente = Empresa.objects.create(cliente='Nueva', compania='Nueva')
+        self.assertEqual(siguiente.codigo, '10003')
+
+    def test_crear_empresa_usa_tres_consultas(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as consultas:
+            my_models.Empresa.objects.create(cliente='Rapida', compania='Rapida')
+        # código + INSERT + generación de búsquedas
+        self.assertEqual(len(consultas.captured_queries), 3)
+
+
+class ImportacionTestCase(TestCase):
+    def _crear_excel(self, filas):
+        import tempfile
+        from openpyxl import Workbook
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Cliente', 'Compañía', 'Código'])
+        for fila in filas:
+            ws.append(fila)
+        archivo = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+        wb.save(archivo.name)
+        self.addCleanup(lambda: __import__('os').unlink(archivo.name))
+        return archivo.name
+
+    def test_importa_por_lotes_creando_y_actualizando(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        existente = my_models.Empresa.objects.create(cliente='Viejo', compania='ACME')
+        filas = [[f'Cliente {i}', f'Compania {i}', None] for i in range(50)]
+        filas += [['Nuevo', 'acme', None], [None, None, None], ['Con código', 'Explícita', '0500']]
+        xlsx = self._crear_excel(filas)
+
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('import_empresas', xlsx, '--skip-logos', '--batch-size', '20', stdout=StringIO())
+
+        self.assertEqual(my_models.Empresa.objects.count(), 52)
+        existente.refresh_from_db()
+        self.assertEqual(existente.cliente, 'Nuevo')
+        self.assertTrue(my_models.Empresa.objects.filter(codigo='0500').exists())
+        self.assertEqual(my_models.Empresa.objects.exclude(codigo__regex=r'^\d{4}$').count(), 0)
+        self.assertLess(len(consultas.captured_queries), 40)
+
+
+class MiniaturasTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _png(self, nombre='logo.png', tamano=(1200, 800)):
+        from io import BytesIO
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', tamano, (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(nombre, buffer.getvalue(), content_type='image/png')
+
+    def test_guardar_logo_genera_miniaturas(self):
+        from PIL import Image
+        empresa = my_models.Empresa.objects.create(cliente='Logo', compania='Logo', logo=self._png())
+        empresa.refresh_from_db()
+        self.assertTrue(empresa.logo_miniatura.name.endswith('_200.webp'))
+        with Image.open(empresa.logo_miniatura.path) as miniatura:
+            self.assertEqual(miniatura.format, 'WEBP')
+            self.assertEqual(max(miniatura.size), 200)
+        self.assertIn('_400.webp 2x', empresa.logo_srcset)
+
+        # Guardar sin cambiar el logo no vuelve a generar nada
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as consultas:
+            empresa.save()
+        self.assertEqual(len(consultas.captured_queries), 2)  # UPDATE + generación de búsquedas
+
+    def test_nombres_distintos_y_formato_sin_soporte_no_se_reintenta(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from myapp.miniaturas import nombre_miniatura
+        nombres = {nombre_miniatura(n) for n in ('logos/acme.png', 'logos/acme.jpg', 'logos/otra/acme.png')}
+        self.assertEqual(len(nombres), 3)
+        self.assertEqual(nombre_miniatura('logos/otra/acme.png', 400), 'logos/miniaturas/otra/acme_png_400.webp')
+
+        empresa = my_models.Empresa.objects.create(
+            cliente='Emf', compania='Emf', logo=SimpleUploadedFile('logo.emf', b'\x01\x00\x00\x00no es imagen'))
+        empresa.refresh_from_db()
+        # Se registra el propio logo: home muestra el original, sin srcset
+        self.assertEqual(empresa.logo_miniatura.name, empresa.logo.name)
+        self.assertEqual(empresa.logo_thumb_url, empresa.logo.url)
+        self.assertEqual(empresa.logo_srcset, '')
+        with CaptureQueriesContext(connection) as consultas:
+            empresa.save()
+        self.assertEqual(len(consultas.captured_queries), 2)  # UPDATE + generación de búsquedas
+
+
+class PermisosTestCase(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group, Permission
+        from django.core.cache import cache
+        cache.clear()
+        caches['busquedas'].clear()
+        self.grupo = Group.objects.create(name='administrador_test')
+        self.grupo.permissions.add(Permission.objects.get(codename='change_empresa'))
+        self.usuario = User.objects.create(username='editor_test')
+
+    def test_foto_cacheada_e_invalidada_al_cambiar_grupos(self):
+        from myapp.permisos import obtener_permisos
+        self.assertFalse(obtener_permisos(self.usuario).is_admin)
+        self.usuario.groups.add(self.grupo)
+        usuario = User.objects.get(pk=self.usuario.pk)
+        permisos = obtener_permisos(usuario)
+        self.assertTrue(permisos.change)
+        self.assertFalse(permisos.delete)
+        # Solo la generación (una consulta por clave primaria)
+        with self.assertNumQueries(1):
+            self.assertEqual(obtener_permisos(usuario), permisos)
+
+    def test_revocar_sube_la_generacion_en_la_base_de_datos(self):
+        from myapp.permisos import obtener_permisos
+        self.usuario.groups.add(self.grupo)
+        usuario = User.objects.get(pk=self.usuario.pk)
+        self.assertTrue(obtener_permisos(usuario).change)
+        generacion = my_models.SecuenciaCodigo.objects.get(nombre='permisos').valor
+        # El contador vive en la base de datos: lo ven todos los procesos,
+        # no solo el que tiene la foto en su caché local
+        self.usuario.groups.remove(self.grupo)
+        self.assertGreater(my_models.SecuenciaCodigo.objects.get(nombre='permisos').valor, generacion)
+        usuario = User.objects.get(pk=self.usuario.pk)
+        self.assertFalse(obtener_permisos(usuario).change)
+
+    async def test_permisos_asincronos_usan_la_cache(self):
+        from myapp.permisos import aobtener_permisos
+        usuario = await User.objects.aget(pk=self.usuario.pk)
+        primera = await aobtener_permisos(usuario)
+        self.assertEqual(await aobtener_permisos(usuario), primera)
+
+    def test_home_no_consulta_permisos_en_cada_request(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        for i in range(12):
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'C{i}')
+        self.usuario.groups.add(self.grupo)
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, '✏️ Editar')
+        self.assertFalse(any('auth_permission' in c['sql'] for c in consultas.captured_queries))
+
+
+class ModalCompartidoTestCase(TestCase):
+    def setUp(self):
+        caches['busquedas'].clear()
+
+    def test_un_solo_modal_y_datos_bajo_demanda(self):
+        for i in range(12):
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'Compania {i}', correo=f'c{i}@x.com')
+        empresa = my_models.Empresa.objects.order_by('id').first()
+        self.client.force_login(User.objects.create(username='admin_modal', is_superuser=True))
+
+        response = self.client.get(reverse('home'))
+        html = response.content.decode()
+        self.assertEqual(html.count('id="editarEmpresaModal"'), 1)
+        self.assertEqual(html.count('id="eliminarEmpresaModal"'), 1)
+
+        datos = self.client.get(reverse('empresa_datos', args=[empresa.id])).json()
+        self.assertEqual(datos['compania'], 'Compania 0')
+        self.assertEqual(datos['correo'], 'c0@x.com')
+
+    def test_datos_requieren_permiso(self):
+        empresa = my_models.Empresa.objects.create(cliente='C', compania='C')
+        self.client.force_login(User.objects.create(username='lector_modal'))
+        response = self.client.get(reverse('empresa_datos', args=[empresa.id]))
+        self.assertEqual(response.status_code, 403)
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        for i in range(5):
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'Compania {i}', correo=f'c{i}@x.com', pais='Chile')
+        self.lector = User.objects.create(username='lector_api')
+        self.admin = User.objects.create(username='admin_api', is_superuser=True)
+
+    def test_proyeccion_y_campos_privados(self):
+        self.client.force_login(self.lector)
+        datos = self.client.get(reverse('api_empresas'), {'fields': 'compania,codigo', 'limit': 2}).json()
+        self.assertEqual(len(datos['results']), 2)
+        self.assertEqual(set(datos['results'][0]), {'id', 'compania', 'codigo'})
+        self.assertIsNotNone(datos['next'])
+        self.assertNotIn('correo', self.client.get(reverse('api_empresas')).json()['results'][0])
+        self.assertEqual(self.client.get(reverse('api_empresas'), {'fields': 'correo'}).status_code, 400)
+
+        self.client.force_login(self.admin)
+        datos = self.client.get(reverse('api_empresas'), {'q': 'chile', 'field': 'pais', 'fields': 'correo'}).json()
+        self.assertEqual(datos['count'], 5)
+
+    def test_get_condicional_responde_304(self):
+        self.client.force_login(self.lector)
+        response = self.client.get(reverse('api_empresas'))
+        etag = response.headers['ETag']
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        # sesión + usuario + generación de permisos + MAX + versión de cambios, sin COUNT
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.get(reverse('api_empresas'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(len(consultas.captured_queries), 5)
+        self.assertFalse(any('COUNT(' in c['sql'] for c in consultas.captured_queries))
+
+        my_models.Empresa.objects.first().delete()
+        self.assertEqual(self.client.get(reverse('api_empresas'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        empresa = my_models.Empresa.objects.first()
+        url = reverse('api_empresa_detalle', args=[empresa.id])
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_requiere_autenticacion(self):
+        self.assertEqual(self.client.get(reverse('api_empresas')).status_code, 401)
+
+    def test_url_del_logo_sale_de_su_storage(self):
+        from unittest import mock
+        from myapp.almacenamiento import almacenamiento_logos
+        my_models.Empresa.objects.filter(pk=my_models.Empresa.objects.first().pk).update(logo='logos/ab/x.png')
+        self.client.force_login(self.lector)
+        with mock.patch.object(almacenamiento_logos, 'url', lambda nombre: f'https://cdn.example/{nombre}'):
+            datos = self.client.get(reverse('api_empresas'), {'fields': 'logo', 'limit': 200}).json()
+        self.assertIn('https://cdn.example/logos/ab/x.png', [fila['logo'] for fila in datos['results']])
+
+
+class CacheBusquedaTestCase(TestCase):
+    def setUp(self):
+        caches['busquedas'].clear()
+        for i in range(3):
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'Compania {i}')
+        self.client.force_login(User.objects.create(username='lector_cache'))
+
+    def test_segunda_visita_sin_consultas_de_empresas(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from myapp import cache_busqueda
+        self.client.get(reverse('home'), {'q': 'compania'})
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('home'), {'q': 'compania'})
+        self.assertContains(response, 'Compania 2')
+        self.assertFalse(any('myapp_empresa' in c['sql'] for c in consultas.captured_queries))
+        self.assertEqual(cache_busqueda.estadisticas()['aciertos'], 1)
+
+    def test_guardar_empresa_invalida_la_cache(self):
+        self.client.get(reverse('home'))
+        my_models.Empresa.objects.create(cliente='Nueva', compania='Recien Llegada')
+        self.assertContains(self.client.get(reverse('home')), 'Recien Llegada')
+
+    def test_generacion_subida_desde_otro_proceso(self):
+        from django.db.models import F
+        from myapp.cache_busqueda import SECUENCIA_BUSQUEDAS
+        self.client.get(reverse('home'))
+        # Sin señales, como un worker con su propia caché: solo la base de datos cambia
+        my_models.Empresa.objects.bulk_create([my_models.Empresa(cliente='Otro', compania='Desde Worker', codigo='9001')])
+        self.assertNotContains(self.client.get(reverse('home')), 'Desde Worker')
+        my_models.SecuenciaCodigo.objects.filter(nombre=SECUENCIA_BUSQUEDAS).update(valor=F('valor') + 1)
+        self.assertContains(self.client.get(reverse('home')), 'Desde Worker')
+
+
+class AssetsTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors=True)
+
+    def test_servir_media_con_etag_y_304(self):
+        import os
+        from django.test import RequestFactory, override_settings
+        from myapp.assets import servir_media
+        with open(os.path.join(self.raiz, 'logo.png'), 'wb') as f:
+            f.write(b'x' * 100)
+        factory = RequestFactory()
+        with override_settings(MEDIA_ROOT=self.raiz, MEDIA_CACHE_CONTROL='public, max-age=60'):
+            response = servir_media(factory.get('/media/logo.png'), 'logo.png')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+            etag = response['ETag']
+            response = servir_media(factory.get('/media/logo.png', HTTP_IF_NONE_MATCH=etag), 'logo.png')
+            self.assertEqual(response.status_code, 304)
+
+    def test_logos_inmutables_y_css_ausente_vuelve_al_cdn(self):
+        import os
+        from django.test import RequestFactory, override_settings
+        from myapp.assets import servir_media
+        os.makedirs(os.path.join(self.raiz, 'logos'))
+        with open(os.path.join(self.raiz, 'logos', 'a.png'), 'wb') as f:
+            f.write(b'x' * 100)
+        with override_settings(MEDIA_ROOT=self.raiz):
+            response = servir_media(RequestFactory().get('/media/logos/a.png'), 'logos/a.png')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        response.close()
+
+        # Producción sin el bundle compilado: la página se sirve con Tailwind desde CDN
+        from django.conf import settings
+        estaticos = {'BACKEND': 'myapp.assets.AlmacenamientoEstaticoComprimido'}
+        with override_settings(DEBUG=False, ASSETS_PRODUCCION=True, STATIC_ROOT=self.raiz,
+                               STORAGES={**settings.STORAGES, 'staticfiles': estaticos}):
+            with self.assertLogs('myapp.assets', 'WARNING') as logs:
+                response = self.client.get(reverse('login'))
+                self.client.get(reverse('login'))
+        self.assertEqual(len(logs.records), 1)  # se resuelve una vez, no en cada página
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'cdn.tailwindcss.com')
+
+    def test_estatico_con_hash_es_inmutable_y_comprimido(self):
+        import os
+        from django.test import RequestFactory, override_settings
+        from myapp.assets import AlmacenamientoEstaticoComprimido, servir_estatico
+        storage = AlmacenamientoEstaticoComprimido(location=self.raiz)
+        nombre = 'app.0123456789ab.css'
+        with open(os.path.join(self.raiz, nombre), 'w') as f:
+            f.write('body { color: red; }\n' * 50)
+        storage._comprimir(nombre)
+        self.assertTrue(os.path.exists(os.path.join(self.raiz, nombre + '.gz')))
+
+        with override_settings(STATIC_ROOT=self.raiz):
+            request = RequestFactory().get('/static/' + nombre, HTTP_ACCEPT_ENCODING='gzip')
+            response = servir_estatico(request, nombre)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response.close()
+
+
+class ExportacionTestCase(TestCase):
+    def setUp(self):
+        for i in range(3):
+            my_models.Empresa.objects.create(cliente=f'Cliente {i}', compania=f'Exporta {i}', correo=f'e{i}@x.com')
+        my_models.Empresa.objects.create(cliente='Otro', compania='Ajena')
+        self.admin = User.objects.create(username='admin_export', is_superuser=True)
+        self.lector = User.objects.create(username='lector_export')
+
+    def test_csv_en_streaming_con_filtros_de_home(self):
+        import csv
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('exportar_empresas'), {'formato': 'csv', 'q': 'Exporta', 'field': 'compania'})
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        filas = list(csv.reader(contenido.splitlines()))
+        self.assertEqual(filas[0][:3], ['Código', 'Cliente', 'Compañía'])
+        self.assertEqual([f[2] for f in filas[1:]], ['Exporta 2', 'Exporta 1', 'Exporta 0'])
+
+    def test_xlsx_y_permisos(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        self.client.force_login(self.lector)
+        response = self.client.get(reverse('exportar_empresas'), {'formato': 'xlsx'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('exportar_empresas'), {'formato': 'xlsx'})
+        self.assertTrue(response.streaming)
+        ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(ws.max_row, 5)
+        self.assertEqual(ws.cell(row=2, column=3).value, 'Ajena')
+        self.assertEqual(ws.cell(row=1, column=2).value, 'Cliente')
+        self.assertIsNotNone(ws.cell(row=2, column=7).value.year)
+
+    def test_xlsx_por_bloques_y_sin_formulas(self):
+        import csv
+        from io import BytesIO
+        from openpyxl import load_workbook
+        from myapp import exportacion
+        my_models.Empresa.objects.create(cliente='=HYPERLINK("http://x")', compania='@SUM(A1)', telefono='+52 555')
+        bloques = exportacion.bloques_xlsx(exportacion.filtrar_empresas())
+        # Las partes fijas del libro salen antes de leer ninguna fila
+        with self.assertNumQueries(0):
+            primero = next(bloques)
+        self.assertTrue(primero.startswith(b'PK'))
+        ws = load_workbook(BytesIO(primero + b''.join(bloques))).active
+        self.assertEqual((ws.cell(row=2, column=2).value, ws.cell(row=2, column=2).data_type), ('=HYPERLINK("http://x")', 's'))
+
+        contenido = ''.join(exportacion.lineas_csv(exportacion.filtrar_empresas())).lstrip('\ufeff')
+        fila = list(csv.reader(contenido.splitlines()))[1]
+        self.assertEqual(fila[1:4], ['\'=HYPERLINK("http://x")', "'@SUM(A1)", "'+52 555"])
+
+
+class BenchmarkTestCase(TestCase):
+    def test_comparar_detecta_regresiones_de_tiempo_y_consultas(self):
+        from myapp.benchmark import comparar
+        base = {'escenarios': {
+            'home_busqueda_all': {'mediana_ms': 10.0, 'consultas': 4},
+            'import_empresas': {'mediana_ms': 100.0, 'consultas': 30},
+        }}
+        actual = {'escenarios': {
+            'home_busqueda_all': {'mediana_ms': 12.0, 'consultas': 5},
+            'import_empresas': {'mediana_ms': 140.0, 'consultas': 30},
+            'escenario_nuevo': {'mediana_ms': 1.0, 'consultas': 1},
+        }}
+        regresiones = comparar(actual, base, umbral=0.25)
+        self.assertEqual(len(regresiones), 2)
+        self.assertIn('home_busqueda_all: 5 consultas > 4', regresiones)
+        self.assertTrue(regresiones[1].startswith('import_empresas'))
+
+
+class MetricasTestCase(TestCase):
+    def setUp(self):
+        from myapp.metricas import registro
+        registro.reiniciar()
+        caches['busquedas'].clear()
+        my_models.Empresa.objects.create(cliente='Cliente', compania='Medida')
+        self.staff = User.objects.create(username='staff_metricas', is_staff=True, is_superuser=True)
+
+    def test_metrics_expone_latencia_sql_y_cache(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('home'))
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('metricas'))
+        self.assertEqual(response.status_code, 200)
+        texto = response.content.decode()
+        self.assertIn('directorio_request_duration_seconds_count{vista="home",metodo="GET"} 2', texto)
+        self.assertIn('directorio_requests_total{vista="home",metodo="GET",status="200"} 2', texto)
+        self.assertRegex(texto, r'directorio_sql_queries_total\{vista="home"\} [1-9]')
+        self.assertIn('directorio_cache_total{cache="busquedas",resultado="acierto"} 1', texto)
+
+    def test_metrics_protegido_y_log_de_requests_lentas(self):
+        import json
+        from django.test import override_settings
+        lector = User.objects.create(username='lector_metricas')
+        self.client.force_login(lector)
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 401)
+
+        with override_settings(METRICAS_UMBRAL_LENTO_MS=0), self.assertLogs('myapp.metricas', 'WARNING') as logs:
+            self.client.get(reverse('home'))
+        datos = json.loads(logs.records[0].getMessage())
+        self.assertEqual(datos['vista'], 'home')
+        self.assertGreater(datos['sql_consultas'], 0)
+        self.assertIn('sql_mas_lenta', datos)
+
+
+class VistasAsyncTestCase(TestCase):
+    def setUp(self):
+        import importlib
+        from django.test import override_settings
+        from django.urls import clear_url_caches
+        import Empresa.urls
+
+        def recargar_urls():
+            importlib.reload(Empresa.urls)
+            clear_url_caches()
+
+        ajustes = override_settings(VISTAS_ASYNC=True)
+        ajustes.enable()
+        recargar_urls()
+        self.addCleanup(recargar_urls)
+        self.addCleanup(ajustes.disable)
+
+        caches['busquedas'].clear()
+        for i in range(15):
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'Asincrona {i}', correo=f'a{i}@x.com')
+        self.admin = User.objects.create(username='admin_async', is_superuser=True)
+
+    async def test_home_busqueda_y_paginacion_sin_orm_sincrono(self):
+        from django.urls import resolve
+        from myapp import views
+        from myapp.metricas import registro
+        self.assertIs(resolve(reverse('home')).func, views.ahome)
+        registro.reiniciar()
+        await self.async_client.aforce_login(self.admin)
+
+        response = await self.async_client.get(reverse('home'), {'q': 'Asincrona 3', 'field': 'compania'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Asincrona 3')
+
+        response = await self.async_client.get(reverse('home'), {'page': 2})
+        self.assertEqual(response.context['empresas'].paginator.count, 15)
+        self.assertEqual(len(response.context['empresas'].object_list), 3)
+
+        response = await self.async_client.get(reverse('home'), {'modo': 'cursor', 'total': '1'})
+        self.assertEqual(response.context['empresas'].total, 15)
+        self.assertRegex(registro.exportar(), r'directorio_sql_queries_total\{vista="home"\} [1-9]')
+
+    async def test_cache_de_busquedas_asincrona(self):
+        from unittest import mock
+        from myapp import cache_busqueda
+        real = caches['busquedas']
+
+        class SoloAsincrona:
+            def __getattr__(self, nombre):
+                if nombre not in ('aget', 'aset', 'aincr', 'aadd'):
+                    raise AssertionError(f"cache.{nombre}() síncrono dentro del event loop")
+                return getattr(real, nombre)
+
+        await self.async_client.aforce_login(self.admin)
+        with mock.patch.object(cache_busqueda, '_cache', SoloAsincrona):
+            for _ in range(2):
+                response = await self.async_client.get(reverse('home'), {'q': 'Asincrona 3'})
+                self.assertContains(response, 'Asincrona 3')
+        self.assertEqual(await real.aget(cache_busqueda.CLAVE_ACIERTOS), 1)
+
+    async def test_api_async_con_permisos(self):
+        response = await self.async_client.get(reverse('api_empresas'))
+        self.assertEqual(response.status_code, 401)
+
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('api_empresas'), {'limit': 10, 'fields': 'compania,correo'})
+        datos = response.json()
+        self.assertEqual(datos['count'], 15)
+        self.assertEqual(len(datos['results']), 10)
+        self.assertIn('correo', datos['results'][0])
+
+        empresa = await my_models.Empresa.objects.afirst()
+        response = await self.async_client.get(reverse('api_empresa_detalle', args=[empresa.id]))
+        self.assertEqual(response.json()['compania'], empresa.compania)
+
+    async def test_request_lenta_async_se_registra_sin_orm_sincrono(self):
+        import json
+        from django.test import override_settings
+        await self.async_client.aforce_login(self.admin)
+        with override_settings(METRICAS_UMBRAL_LENTO_MS=0), self.assertLogs('myapp.metricas', 'WARNING') as logs:
+            response = await self.async_client.get(reverse('api_empresas'), {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['usuario'], self.admin.pk)
+
+
+class PerfilSqliteTestCase(TestCase):
+    def _conexiones(self, perfil):
+        import shutil
+        import tempfile
+        from django.db.utils import ConnectionHandler
+        from Empresa.basedatos import configuracion_sqlite
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        # Handler aparte: la base de test es en memoria y no admite WAL
+        conexiones = ConnectionHandler({'default': configuracion_sqlite(f'{carpeta}/db.sqlite3', perfil)})
+        return conexiones
+
+    def test_perfil_produccion(self):
+        from Empresa.basedatos import configuracion_sqlite
+        config = configuracion_sqlite('/tmp/x.sqlite3', 'produccion')
+        self.assertIn('journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(configuracion_sqlite('/tmp/x.sqlite3', 'basico')['CONN_MAX_AGE'], 0)
+
+        # Sin DB_PERFIL manda el defecto que elige settings (basico con DEBUG)
+        import os
+        from unittest import mock
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DB_PERFIL', None)
+            self.assertNotIn('init_command', configuracion_sqlite('/tmp/x.sqlite3', defecto='basico')['OPTIONS'])
+
+    def test_lectores_no_se_bloquean_durante_una_importacion_masiva(self):
+        """Un escritor mantiene abierta una transacción por lotes; los lectores siguen respondiendo"""
+        import threading
+        import time
+        conexiones = self._conexiones('produccion')
+        with conexiones['default'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('CREATE TABLE empresa (id INTEGER PRIMARY KEY, compania TEXT)')
+            cursor.executemany('INSERT INTO empresa (compania) VALUES (%s)', [(f'Previa {i}',) for i in range(100)])
+
+        escribiendo = threading.Event()
+        terminado = threading.Event()
+        errores = []
+
+        def importar():
+            try:
+                with conexiones['default'].cursor() as cursor:
+                    cursor.execute('BEGIN IMMEDIATE')
+                    escribiendo.set()
+                    for lote in range(10):
+                        cursor.executemany(
+                            'INSERT INTO empresa (compania) VALUES (%s)',
+                            [(f'Importada {lote}-{i}',) for i in range(2000)],
+                        )
+                        time.sleep(0.05)  # el lock de escritura se mantiene todo el rato
+                    cursor.execute('COMMIT')
+            except Exception as e:
+                errores.append(e)
+            finally:
+                escribiendo.set()
+                terminado.set()
+                conexiones['default'].close()
+
+        latencias = []
+        vistos = []
+
+        def leer():
+            try:
+                escribiendo.wait(5)
+                while not terminado.is_set():
+                    inicio = time.perf_counter()
+                    with conexiones['default'].cursor() as cursor:
+                        cursor.execute('SELECT COUNT(*) FROM empresa')
+                        vistos.append(cursor.fetchone()[0])
+                    latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                conexiones['default'].close()
+
+        hilos = [threading.Thread(target=importar)] + [threading.Thread(target=leer) for _ in range(3)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(30)
+
+        self.assertEqual(errores, [])
+        self.assertGreater(len(latencias), 10)
+        self.assertLess(max(latencias), 0.2)
+        # Mientras dura la transacción los lectores ven la foto anterior, sin esperar
+        self.assertEqual(vistos[0], 100)
+        conexiones['default'].close()
+
+
+class NormalizacionTestCase(TestCase):
+    def setUp(self):
+        caches['busquedas'].clear()
+        self.empresa = my_models.Empresa.objects.create(cliente='José Núñez', compania='Compañía  Águila', pais='México')
+
+    def test_columnas_normalizadas_en_save_bulk_y_update(self):
+        from myapp.normalizacion import normalizar
+        Empresa = my_models.Empresa
+        self.assertEqual(normalizar('  Compañía \t ÁGUILA '), 'compania aguila')
+        self.assertEqual((self.empresa.compania_norm, self.empresa.cliente_norm, self.empresa.pais_norm),
+                         ('compania aguila', 'jose nunez', 'mexico'))
+
+        Empresa.objects.bulk_create([Empresa(cliente='Ñandú', compania='Perú SA', codigo='0900')])
+        self.assertTrue(Empresa.objects.filter(compania_norm='peru sa', cliente_norm='nandu').exists())
+
+        self.empresa.compania = 'Érica'
+        Empresa.objects.bulk_update([self.empresa], ['compania'])
+        Empresa.objects.filter(pk=self.empresa.pk).update(pais='Perú')
+        self.empresa.refresh_from_db()
+        self.assertEqual((self.empresa.compania_norm, self.empresa.pais_norm), ('erica', 'peru'))
+
+    def test_emparejar_por_compania_usa_el_indice(self):
+        from django.db import connection
+        consulta = my_models.Empresa.objects.filter(compania_norm='compania aguila')
+        with connection.cursor() as cursor:
+            sql, params = consulta.query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(fila) for fila in cursor.fetchall())
+        self.assertIn('empresa_compania_norm_idx', plan)
+
+    def test_busqueda_sin_fts_y_admin_ignoran_tildes(self):
+        from unittest import mock
+        from myapp.busqueda import buscar_empresas
+        with mock.patch('myapp.busqueda.fts_disponible', return_value=False):
+            qs = my_models.Empresa.objects.all()
+            self.assertEqual(list(buscar_empresas(qs, 'COMPANIA aguila')), [self.empresa])
+            self.assertEqual(list(buscar_empresas(qs, 'mexico', 'pais', is_admin=True)), [self.empresa])
+
+        self.client.force_login(User.objects.create(username='admin_norm', is_superuser=True, is_staff=True))
+        response = self.client.get(reverse('admin:myapp_empresa_changelist'), {'q': 'nunez'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.empresa])
+
+    def test_importacion_empareja_sin_tildes_ni_mayusculas(self):
+        from myapp.importacion import ImportadorEmpresas
+        xlsx = ImportacionTestCase._crear_excel(self, [['Otro cliente', 'COMPANIA   aguila', None]])
+        resultado = ImportadorEmpresas(xlsx).ejecutar()
+        self.assertEqual((resultado.creadas, resultado.actualizadas), (0, 1))
+        self.empresa.refresh_from_db()
+        self.assertEqual(self.empresa.cliente, 'Otro cliente')
+
+
+class DuplicadosTestCase(TestCase):
+    def setUp(self):
+        Empresa = my_models.Empresa
+        self.bmw = [Empresa.objects.create(cliente='Ana', compania=nombre) for nombre in ('BMW', 'B.M.W.', 'BMW S.A.')]
+        self.perez = Empresa.objects.create(cliente='Luis', compania='Constructora Pérez')
+        Empresa.objects.create(cliente='Eva', compania='Norte 1')
+        Empresa.objects.create(cliente='Eva', compania='Norte 2')
+
+    def test_clave_y_grupos(self):
+        from myapp.duplicados import clave, grupos_empresas
+        self.assertEqual(clave('B. M. W. S.A. de C.V.'), 'bmw')
+        self.assertEqual(clave('Coca-Cola y Cía. Ltda.'), 'coca cola')
+        my_models.Empresa.objects.create(cliente='Luis', compania='CONSTRUCTORA PERES LTDA')
+        grupos = grupos_empresas()
+        self.assertEqual([len(g['ids']) for g in grupos], [3, 2])
+        self.assertEqual(grupos[0]['ids'], [e.pk for e in self.bmw])
+        self.assertIn(self.perez.pk, grupos[1]['ids'])
+
+    def test_indice_escala_sin_comparar_todos_contra_todos(self):
+        import random
+        import time
+        from myapp.duplicados import grupos_duplicados
+        rnd = random.Random(0)
+        filas = [(i, 'Comercial ' + ''.join(rnd.choices('abcdefghijklmnopqrstuvwxyz', k=9))) for i in range(20000)]
+        filas += [(20000 + i, nombre.upper() + ' S.A.') for i, nombre in filas[:50]]
+        inicio = time.perf_counter()
+        grupos = grupos_duplicados(filas)
+        self.assertEqual(len(grupos), 50)
+        self.assertLess(time.perf_counter() - inicio, 10)
+
+    def test_importacion_marca_en_vez_de_crear(self):
+        from myapp.importacion import ImportadorEmpresas
+        xlsx = ImportacionTestCase._crear_excel(self, [
+            ['Nuevo', 'B M W SA', None],
+            ['Nuevo', 'Quetzal Minera', None],
+            ['Nuevo', 'QUETZAL MINERA S.A.', None],
+            ['Nuevo', 'Norte 3', None],
+        ])
+        resultado = ImportadorEmpresas(xlsx, revisar_duplicados=True).ejecutar()
+        self.assertEqual((resultado.creadas, resultado.duplicados), (2, 2))
+        self.assertIn('«BMW»', resultado.mensajes_duplicado[0])
+        self.assertFalse(my_models.Empresa.objects.filter(compania='B M W SA').exists())
+
+    def test_vista_admin_y_comando(self):
+        from io import StringIO
+        from django.core.management import call_command
+        self.client.force_login(User.objects.create(username='admin_dup', is_superuser=True, is_staff=True))
+        response = self.client.get(reverse('admin:myapp_empresa_duplicados'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(g['empresas']) for g in response.context['grupos']], [3])
+        self.assertContains(self.client.get(reverse('admin:myapp_empresa_changelist')), 'Posibles duplicados')
+
+        salida = StringIO()
+        call_command('duplicados', stdout=salida)
+        self.assertIn('1 grupos de posibles duplicados', salida.getvalue())
+        self.assertIn('B.M.W.', salida.getvalue())
+
+
+class TrabajosTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(IMPORTACIONES_DIR=carpeta)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.admin = User.objects.create(username='admin_importa', is_superuser=True)
+
+    def _subir(self, filas, nombre='empresas.xlsx'):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        with open(ImportacionTestCase._crear_excel(self, filas), 'rb') as archivo:
+            return SimpleUploadedFile(nombre, archivo.read())
+
+    def test_subida_solo_encola(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('importaciones'), {'archivo': self._subir([['Web', 'Subida Web', None]])})
+        self.assertRedirects(response, reverse('importaciones'))
+        trabajo = my_models.TrabajoImportacion.objects.get()
+        self.assertEqual((trabajo.estado, trabajo.usuario), ('pendiente', self.admin))
+        self.assertFalse(my_models.Empresa.objects.filter(compania='Subida Web').exists())
+
+        self.client.post(reverse('importaciones'), {'archivo': SimpleUploadedFile('falso.xlsx', b'no es zip')})
+        self.assertEqual(my_models.TrabajoImportacion.objects.count(), 1)
+
+        self.client.force_login(User.objects.create(username='lector_importa'))
+        self.assertRedirects(self.client.get(reverse('importaciones')), reverse('home'), fetch_redirect_response=False)
+
+    def test_reparto_justo_entre_usuarios(self):
+        from myapp.trabajos import encolar, tomar_siguiente
+        otro = User.objects.create(username='otro_importa')
+        a1 = encolar(self._subir([]), self.admin)
+        a2 = encolar(self._subir([]), self.admin)
+        b1 = encolar(self._subir([]), otro)
+        # admin ya tiene uno en proceso: el de otro pasa antes que su segundo archivo
+        self.assertEqual(tomar_siguiente('w1'), a1.id)
+        self.assertEqual(tomar_siguiente('w2'), b1.id)
+        self.assertEqual(tomar_siguiente('w1'), a2.id)
+        self.assertIsNone(tomar_siguiente('w1'))
+
+    def test_reparto_justo_con_sql_estandar(self):
+        from unittest import mock
+        from django.db import connection
+        from myapp.trabajos import encolar, tomar_siguiente
+        # Otros motores: IS NOT DISTINCT FROM (SQLite 3.39+ también lo entiende)
+        sin_usuario = [encolar(self._subir([])) for _ in range(2)]
+        a1 = encolar(self._subir([]), self.admin)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertEqual(tomar_siguiente('w1'), sin_usuario[0].id)
+            self.assertEqual(tomar_siguiente('w2'), a1.id)
+            self.assertEqual(tomar_siguiente('w1'), sin_usuario[1].id)
+
+    def test_ejecutar_actualiza_progreso_y_estado(self):
+        from myapp.trabajos import ejecutar, encolar, recuperar_abandonados, tomar_siguiente
+        trabajo = encolar(self._subir([[f'Cliente {i}', f'Cola {i}', None] for i in range(5)]), self.admin)
+        tomar_siguiente('w1')
+        self.assertEqual(ejecutar(trabajo.id), 'completado')
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.creadas, trabajo.procesadas, trabajo.filas_totales), (5, 5, 5))
+        self.assertEqual(my_models.Empresa.objects.filter(compania__startswith='Cola').count(), 5)
+
+        self.client.force_login(self.admin)
+        datos = self.client.get(reverse('importacion_estado', args=[trabajo.id])).json()
+        self.assertEqual((datos['estado'], datos['porcentaje'], datos['activo']), ('completado', 100, False))
+
+        # Un worker que muere deja el trabajo en proceso: vuelve a la cola
+        colgado = encolar(self._subir([]), self.admin)
+        tomar_siguiente('w1')
+        my_models.TrabajoImportacion.objects.filter(pk=colgado.pk).update(latido='2000-01-01T00:00Z')
+        self.assertEqual(recuperar_abandonados(), (1, 0))
+        self.assertEqual(tomar_siguiente('w2'), colgado.id)
+
+
+class ReimportacionTestCase(TestCase):
+    def _excel(self, filas):
+        return ImportacionTestCase._crear_excel(self, filas)
+
+    def test_reimportar_solo_escribe_lo_que_cambio(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from myapp.importacion import ImportadorEmpresas
+        filas = [[f'Cliente {i}', f'Huella {i}', None] for i in range(100)]
+        ImportadorEmpresas(self._excel(filas), batch_size=20).ejecutar()
+
+        filas[7][0] = 'Cliente cambiado'
+        filas.append(['Nuevo', 'Huella nueva', None])
+        xlsx = self._excel(filas)
+
+        resumen = ImportadorEmpresas(xlsx, simular=True).ejecutar()
+        self.assertEqual((resumen.creadas, resumen.actualizadas, resumen.sin_cambios), (1, 1, 99))
+        self.assertIn('«Cliente 7» → «Cliente cambiado»', resumen.mensajes_cambio[0])
+        self.assertFalse(my_models.Empresa.objects.filter(compania='Huella nueva').exists())
+
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = ImportadorEmpresas(xlsx, batch_size=20).ejecutar()
+        self.assertEqual((resultado.creadas, resultado.actualizadas, resultado.sin_cambios), (1, 1, 99))
+        self.assertEqual(my_models.Empresa.objects.get(compania='Huella 7').cliente, 'Cliente cambiado')
+        self.assertLess(len(consultas.captured_queries), 20)
+
+    def test_reanuda_desde_el_ultimo_lote_guardado(self):
+        from myapp.importacion import ImportadorEmpresas
+
+        class Corte(Exception):
+            pass
+
+        def cortar(resultado):
+            if resultado.creadas >= 30:
+                raise Corte()
+
+        xlsx = self._excel([[f'Cliente {i}', f'Reanuda {i}', None] for i in range(50)])
+        with self.assertRaises(Corte):
+            ImportadorEmpresas(xlsx, batch_size=10, progreso=cortar).ejecutar()
+        self.assertEqual(my_models.PuntoControlImportacion.objects.get().fila, 31)
+
+        resultado = ImportadorEmpresas(xlsx, batch_size=10).ejecutar()
+        self.assertEqual((resultado.reanudada_desde, resultado.creadas, resultado.procesadas), (31, 20, 50))
+        self.assertEqual(my_models.Empresa.objects.filter(compania__startswith='Reanuda').count(), 50)
+        self.assertFalse(my_models.PuntoControlImportacion.objects.exists())
+
+
+class LogosPorContenidoTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, LOGOS_HILOS=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _referencias(self, nombre):
+        fila = my_models.ReferenciaLogo.objects.filter(nombre=nombre).first()
+        return fila.referencias if fila else 0
+
+    def test_mismos_bytes_un_solo_archivo_con_contador(self):
+        import os
+        from myapp.almacenamiento import es_por_contenido
+        png = MiniaturasTestCase._png(self, 'acme.png').read()
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        a = my_models.Empresa.objects.create(cliente='A', compania='A', logo=SimpleUploadedFile('uno.png', png))
+        b = my_models.Empresa.objects.create(cliente='B', compania='B', logo=SimpleUploadedFile('otro.PNG', png))
+        self.assertEqual(a.logo.name, b.logo.name)
+        self.assertTrue(es_por_contenido(a.logo.name))
+        self.assertEqual(len(os.listdir(os.path.dirname(a.logo.path))), 1)
+        self.assertEqual(a.logo_miniatura.name, b.logo_miniatura.name)
+        self.assertEqual(self._referencias(a.logo.name), 2)
+
+        ruta, miniatura = a.logo.path, a.logo_miniatura.path
+        with self.captureOnCommitCallbacks(execute=True):
+            a.delete()
+        self.assertTrue(os.path.exists(ruta))
+        with self.captureOnCommitCallbacks(execute=True):
+            my_models.Empresa.objects.filter(pk=b.pk).delete()
+        self.assertFalse(os.path.exists(ruta) or os.path.exists(miniatura))
+        self.assertEqual(self._referencias(a.logo.name), 0)
+
+    def test_importacion_enlaza_sin_copiar(self):
+        import os
+        import tempfile
+        from PIL import Image
+        from myapp.importacion import ImportadorEmpresas
+        carpeta = tempfile.mkdtemp(dir=self.media)
+        for i in (1, 2):
+            Image.new('RGB', (50, 50), (10, 200, 10)).save(os.path.join(carpeta, f'imagen_00{i}.png'))
+        logos = sorted(os.path.join(carpeta, n) for n in os.listdir(carpeta))
+        xlsx = ImportacionTestCase._crear_excel(self, [['A', 'Verde Uno', None], ['B', 'Verde Dos', None]])
+        ImportadorEmpresas(xlsx, logos=logos).ejecutar()
+
+        nombres = set(my_models.Empresa.objects.values_list('logo', flat=True))
+        self.assertEqual(len(nombres), 1)
+        nombre = nombres.pop()
+        self.assertEqual(self._referencias(nombre), 2)
+        # Enlace duro al primer logo extraído: el mismo inodo, no una copia
+        self.assertEqual(os.stat(os.path.join(self.media, nombre)).st_ino, os.stat(logos[0]).st_ino)
+
+    def test_deduplicar_logos_une_los_archivos_antiguos(self):
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        os.makedirs(os.path.join(self.media, 'logos'))
+        for nombre in ('0001_a.png', '0002_b.png', 'suelto.png'):
+            with open(os.path.join(self.media, 'logos', nombre), 'wb') as f:
+                f.write(b'mismo contenido' if nombre != 'suelto.png' else b'nadie lo usa')
+        a = my_models.Empresa.objects.create(cliente='A', compania='A')
+        b = my_models.Empresa.objects.create(cliente='B', compania='B')
+        my_models.Empresa.objects.filter(pk=a.pk).update(logo='logos/0001_a.png')
+        my_models.Empresa.objects.filter(pk=b.pk).update(logo='logos/0002_b.png')
+
+        salida = StringIO()
+        call_command('deduplicar_logos', stdout=salida)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual(a.logo.name, b.logo.name)
+        self.assertEqual(self._referencias(a.logo.name), 2)
+        carpetas = [n for n in os.listdir(os.path.join(self.media, 'logos')) if n != '.tmp']
+        self.assertEqual(carpetas, [a.logo.name.split('/')[1]])
+        self.assertIn('Borrados 3 archivos sin uso', salida.getvalue())
+
+
+class SubidasTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(
+            MEDIA_ROOT=self.media, LOGOS_HILOS=0, LOGO_MAX_BYTES=256 * 1024, LOGO_MAX_PIXELES=4000 * 3000)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(User.objects.create_superuser('admin_subidas', password='x'))
+
+    def _imagen(self, tamano, formato='JPEG', exif=None, ruido=False):
+        import os
+        from io import BytesIO
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        if ruido:
+            imagen = Image.frombytes('RGB', tamano, os.urandom(tamano[0] * tamano[1] * 3))
+        else:
+            imagen = Image.new('RGB', tamano, (20, 90, 200))
+        buffer = BytesIO()
+        imagen.save(buffer, formato, **({'exif': exif} if exif else {}))
+        return SimpleUploadedFile(f'foto.{formato.lower()}', buffer.getvalue())
+
+    def _mensajes(self, response):
+        from django.contrib.messages import get_messages
+        return ' '.join(str(m) for m in get_messages(response.wsgi_request))
+
+    def test_rechaza_logo_que_supera_el_peso(self):
+        logo = self._imagen((400, 400), 'PNG', ruido=True)
+        self.assertGreater(logo.size, 256 * 1024)
+        response = self.client.post(reverse('home'), {'cliente': 'Pesada', 'logo': logo})
+        self.assertIn('Logo rechazado: pesa más de', self._mensajes(response))
+        self.assertFalse(my_models.Empresa.objects.filter(cliente='Pesada').exists())
+
+    def test_rechaza_logo_con_demasiados_pixeles(self):
+        logo = self._imagen((5000, 3000))  # color liso: pocos bytes, muchos píxeles
+        self.assertLess(logo.size, 256 * 1024)
+        response = self.client.post(reverse('home'), {'cliente': 'Enorme', 'logo': logo})
+        self.assertIn('5000×3000 px', self._mensajes(response))
+        self.assertFalse(my_models.Empresa.objects.filter(cliente='Enorme').exists())
+
+    def test_logo_se_optimiza_al_confirmar(self):
+        import os
+        from django.test import override_settings
+        from PIL import Image
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientación: girada 90°
+        with override_settings(LOGO_MAX_LADO=600):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.post(reverse('home'), {'cliente': 'Foto', 'logo': self._imagen((1000, 500), exif=exif)})
+                empresa = my_models.Empresa.objects.get(cliente='Foto')
+                original = empresa.logo.path
+                # Hasta confirmar, la empresa apunta al original
+                self.assertTrue(empresa.logo.name.endswith('.jpeg'))
+                self.assertFalse(empresa.logo_miniatura)
+            self.assertTrue(callbacks)
+
+        empresa.refresh_from_db()
+        self.assertTrue(empresa.logo.name.endswith('.webp'))
+        self.assertFalse(os.path.exists(original))
+        self.assertTrue(empresa.logo_miniatura)
+        with Image.open(empresa.logo.path) as imagen:
+            self.assertEqual(imagen.size, (300, 600))  # girada y reducida
+            self.assertNotIn('exif', imagen.info)
+
+
+class RespaldoTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _respaldar(self, nombre, *args):
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        ruta = os.path.join(self.media, nombre)
+        call_command('respaldar_empresas', ruta, *args, stdout=StringIO())
+        return ruta
+
+    def test_completo_e_incremental_se_restauran_con_codigos_y_logos(self):
+        import os
+        import shutil
+        import time
+        from io import StringIO
+        from django.core.management import call_command
+        logo = MiniaturasTestCase._png(self, 'acme.png', (60, 60))
+        acme = my_models.Empresa.objects.create(cliente='Ana', compania='Acmé', logo=logo)
+        beta = my_models.Empresa.objects.create(cliente='Beto', compania='Beta')
+        completo = self._respaldar('completo.ndjson.gz', '--logos')
+
+        time.sleep(0.01)
+        beta.telefono = '555'
+        beta.save()
+        incremental = self._respaldar('incremental.ndjson.gz', '--since', completo)
+        import gzip
+        with gzip.open(incremental, 'rt') as f:
+            self.assertEqual(len(f.readlines()), 2)  # cabecera + beta
+
+        esperado = {e.codigo: e for e in my_models.Empresa.objects.all()}
+        my_models.Empresa.objects.all().delete()
+        shutil.rmtree(os.path.join(self.media, 'logos'))
+
+        call_command('restaurar_empresas', completo, incremental, stdout=StringIO())
+        restauradas = {e.codigo: e for e in my_models.Empresa.objects.all()}
+        self.assertEqual(set(restauradas), set(esperado))
+        for codigo, empresa in restauradas.items():
+            self.assertEqual(empresa.fecha_creacion, esperado[codigo].fecha_creacion)
+            self.assertEqual(empresa.fecha_actualizacion, esperado[codigo].fecha_actualizacion)
+        self.assertEqual(restauradas[beta.codigo].telefono, '555')
+        self.assertEqual(restauradas[acme.codigo].compania_norm, 'acme')
+        self.assertEqual(restauradas[acme.codigo].logo.name, acme.logo.name)
+        self.assertTrue(os.path.exists(restauradas[acme.codigo].logo.path))
+        self.assertTrue(restauradas[acme.codigo].logo_miniatura)
+        # La secuencia no vuelve a dar los códigos restaurados
+        self.assertGreater(int(my_models.Empresa.objects.create(cliente='Nueva', compania='Nueva').codigo),
+                           int(beta.codigo))
+
+    def test_incremental_lleva_las_bajas(self):
+        import gzip
+        import json
+        import time
+        from io import StringIO
+        from django.core.management import call_command
+        queda, borrada = (my_models.Empresa.objects.create(cliente=c, compania=c) for c in ('Queda', 'Borrada'))
+        completo = self._respaldar('completo.ndjson.gz')
+
+        time.sleep(0.01)
+        borrada.delete()
+        incremental = self._respaldar('incremental.ndjson.gz', '--since', completo)
+        with gzip.open(incremental, 'rt') as f:
+            self.assertEqual([json.loads(linea) for linea in f][1:], [{'baja': borrada.codigo}])
+
+        my_models.Empresa.objects.all().delete()
+        salida = StringIO()
+        call_command('restaurar_empresas', completo, incremental, stdout=salida)
+        self.assertEqual(list(my_models.Empresa.objects.values_list('codigo', flat=True)), [queda.codigo])
+        self.assertIn('1 eliminadas', salida.getvalue())
+
+    def test_restaurar_sobre_existentes_actualiza_sin_duplicar(self):
+        from io import StringIO
+        from django.core.management import call_command
+        for i in range(5):
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'C{i}')
+        ruta = self._respaldar('respaldo.ndjson.gz')
+        my_models.Empresa.objects.update(cliente='cambiado')
+
+        with self.assertNumQueries(7):  # sin consultas por fila
+            call_command('restaurar_empresas', ruta, stdout=StringIO())
+        self.assertEqual(my_models.Empresa.objects.count(), 5)
+        self.assertFalse(my_models.Empresa.objects.filter(cliente='cambiado').exists())
+
+
+class CambiosTestCase(TestCase):
+    def setUp(self):
+        self.empresas = [
+            my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'Compania {i}', correo=f'c{i}@x.com')
+            for i in range(4)
+        ]
+        self.client.force_login(User.objects.create(username='sync_api'))
+
+    def _cambios(self, since, **params):
+        return self.client.get(reverse('api_empresas_cambios'), {'since': since, **params}).json()
+
+    def test_solo_el_delta_con_bajas_y_paginas_acotadas(self):
+        inicial = self._cambios(0, limit=3)
+        self.assertEqual(len(inicial['results']), 3)
+        self.assertTrue(inicial['has_more'])
+        resto = self._cambios(inicial['next'], limit=3)
+        self.assertFalse(resto['has_more'])
+        cursor = resto['next']
+
+        a, b, c, _ = self.empresas
+        a.cliente = 'Nuevo contacto'
+        a.save()
+        a.save()  # sin cambios visibles: no genera versión
+        my_models.Empresa.objects.filter(pk=b.pk).update(compania='Renombrada')
+        my_models.Empresa.objects.filter(pk=c.pk).update(compania=c.compania)  # mismo valor
+        b_id, b_codigo = b.pk, b.codigo
+        b.delete()
+
+        with self.assertNumQueries(6):  # sesión + usuario + generación de permisos + versión mínima + cambios + empresas vivas
+            delta = self._cambios(cursor)
+        self.assertEqual([(r['id'], r['eliminada']) for r in delta['results']], [(a.pk, False), (b_id, True)])
+        self.assertEqual(delta['results'][0]['empresa']['cliente'], 'Nuevo contacto')
+        self.assertNotIn('correo', delta['results'][0]['empresa'])
+        self.assertEqual(delta['results'][1]['codigo'], b_codigo)
+        self.assertIsNone(delta['results'][1]['empresa'])
+        self.assertEqual(self._cambios(delta['next'])['results'], [])
+
+    def test_cursor_anterior_a_bajas_purgadas_responde_410(self):
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.utils import timezone
+        from io import StringIO
+        cursor = self._cambios(0)['next']
+        self.empresas[0].delete()
+        my_models.CambioEmpresa.objects.filter(eliminada=True).update(fecha=timezone.now() - timedelta(days=100))
+        call_command('purgar_cambios', '--dias', '90', stdout=StringIO())
+
+        self.assertFalse(my_models.CambioEmpresa.objects.filter(eliminada=True).exists())
+        response = self.client.get(reverse('api_empresas_cambios'), {'since': cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(len(self._cambios(0)['results']), 3)
+
+
+class LotesTestCase(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, LOGOS_HILOS=0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(User.objects.create_superuser('admin_lotes', password='x'))
+
+    def test_editar_en_lote_desde_home(self):
+        ids = [my_models.Empresa.objects.create(cliente=f'C{i}', compania=f'Vieja {i}', pais='Peru').id for i in range(3)]
+        otra = my_models.Empresa.objects.create(cliente='Otra', compania='Otra', pais='Peru')
+        response = self.client.post(reverse('empresas_lote'), {
+            'accion': 'editar', 'ids': ids, 'campo': 'pais', 'valor': 'Perú', 'volver': '/?q=Vieja',
+        })
+        self.assertRedirects(response, '/?q=Vieja', fetch_redirect_response=False)
+        self.assertEqual(my_models.Empresa.objects.filter(pais='Perú').count(), 3)
+        self.assertEqual(set(my_models.Empresa.objects.filter(id__in=ids).values_list('pais_norm', flat=True)), {'peru'})
+        otra.refresh_from_db()
+        self.assertEqual(otra.pais, 'Peru')
+
+        response = self.client.post(reverse('empresas_lote'), {'accion': 'editar', 'ids': ids, 'campo': 'codigo', 'valor': 'X'})
+        from django.contrib.messages import get_messages
+        self.assertIn('❌', ' '.join(str(m) for m in get_messages(response.wsgi_request)))
+
+    def test_eliminar_en_lote_consultas_constantes_y_logos(self):
+        import os
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from myapp.lotes import eliminar_en_lote
+        con_logo = [
+            my_models.Empresa.objects.create(
+                cliente=nombre, compania=nombre,
+                logo=SimpleUploadedFile(nombre, MiniaturasTestCase._png(self, nombre, tamano=(40 + i, 40)).read()),
+            )
+            for i, nombre in enumerate(('a.png', 'b.png'))
+        ]
+        rutas = [e.logo.path for e in con_logo]
+        ids = [my_models.Empresa.objects.create(cliente=f'E{i}', compania=f'E{i}').id for i in range(11)]
+
+        consultas = []
+        for lote in ([ids[0], con_logo[0].id], ids[1:] + [con_logo[1].id]):
+            with CaptureQueriesContext(connection) as capturadas, self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(eliminar_en_lote(lote), len(lote))
+            consultas.append(len(capturadas))
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertFalse(my_models.Empresa.objects.exists())
+        self.assertFalse(any(os.path.exists(ruta) for ruta in rutas))
+        self.assertEqual(my_models.CambioEmpresa.objects.filter(eliminada=True).count(), 13)
+
+    def test_eliminar_en_lote_sin_triggers_registra_las_bajas(self):
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from myapp.cambios import TRIGGERS_CAMBIOS, asegurar_triggers_cambios
+        from myapp.lotes import eliminar_en_lote
+        empresas = [my_models.Empresa.objects.create(cliente=f'E{i}', compania=f'E{i}') for i in range(3)]
+        # Como en otro motor: sin triggers de cambios
+        self.addCleanup(asegurar_triggers_cambios)
+        with connection.cursor() as cursor:
+            for nombre in TRIGGERS_CAMBIOS:
+                cursor.execute(f"DROP TRIGGER {nombre}")
+
+        with mock.patch('myapp.lotes.con_triggers', return_value=False), \
+                CaptureQueriesContext(connection) as capturadas:
+            self.assertEqual(eliminar_en_lote([e.id for e in empresas]), 3)
+        self.assertEqual(sum('myapp_cambioempresa' in q['sql'] for q in capturadas), 1)
+        bajas = my_models.CambioEmpresa.objects.filter(eliminada=True)
+        self.assertEqual(
+            sorted(bajas.values_list('empresa_id', 'codigo')),
+            sorted((e.id, e.codigo) for e in empresas),
+        )
+        self.assertEqual(len(set(bajas.values_list('version', flat=True))), 3)
+
+    def test_eliminar_exige_permiso_y_confirmacion(self):
+        e = my_models.Empresa.objects.create(cliente='Queda', compania='Queda')
+        self.client.post(reverse('empresas_lote'), {'accion': 'eliminar', 'ids': [e.id]})
+        self.assertTrue(my_models.Empresa.objects.filter(pk=e.pk).exists())
+
+        self.client.force_login(User.objects.create(username='lector_lotes'))
+        self.client.post(reverse('empresas_lote'), {'accion': 'eliminar', 'ids': [e.id], 'confirmacion': 'eliminar'})
+        self.assertTrue(my_models.Empresa.objects.filter(pk=e.pk).exists())
+
+
+class ExtraccionIncrementalTestCase(TestCase):
+    """extract_images_zip.py --incremental (manifiesto, reutilización y staging)"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from pathlib import Path
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.xlsx = self.dir / 'empresas.xlsx'
+        self.salida = self.dir / 'logos'
+
+    def _xlsx(self, imagenes):
+        import zipfile
+        with zipfile.ZipFile(self.xlsx, 'w') as z:
+            z.writestr('xl/workbook.xml', '<workbook/>')
+            for nombre, datos in imagenes.items():
+                z.writestr(f'xl/media/{nombre}', datos)
+
+    def _extraer(self):
+        import io
+        import re
+        from contextlib import redirect_stdout
+        from extract_images_zip import extract_images_from_excel, leer_manifiesto
+        salida = io.StringIO()
+        with redirect_stdout(salida):
+            self.assertTrue(extract_images_from_excel(self.xlsx, self.salida, incremental=True, workers=2))
+        cuentas = re.search(r'(\d+) extraídas, (\d+) reutilizadas, (\d+) sin cambios', salida.getvalue())
+        self.assertFalse((self.salida / '.extraccion_tmp').exists())
+        return tuple(int(n) for n in cuentas.groups()), leer_manifiesto(self.salida)
+
+    def test_reextraccion_con_imagen_cambiada_y_quitada(self):
+        import hashlib
+        import os
+        a, b, c, d = (bytes([i]) * (100 + i) for i in range(4))
+        self._xlsx({'image1.png': a, 'image2.png': b, 'image3.png': c})
+        cuentas, manifiesto = self._extraer()
+        self.assertEqual(cuentas, (3, 0, 0))
+        self.assertEqual([e['sha256'] for e in manifiesto], [hashlib.sha256(x).hexdigest() for x in (a, b, c)])
+        inodo_a = os.stat(self.salida / 'imagen_001.png').st_ino
+
+        # image1 cambia, image2 sigue igual e image3 pasa a tener el contenido de la antigua image1
+        self._xlsx({'image1.png': d, 'image2.png': b, 'image3.png': a})
+        cuentas, manifiesto = self._extraer()
+        self.assertEqual(cuentas, (1, 1, 1))
+        self.assertEqual((self.salida / 'imagen_001.png').read_bytes(), d)
+        self.assertEqual((self.salida / 'imagen_003.png').read_bytes(), a)
+        self.assertEqual(os.stat(self.salida / 'imagen_003.png').st_ino, inodo_a)
+        self.assertEqual(manifiesto[2]['sha256'], hashlib.sha256(a).hexdigest())
+
+        # Al quitar una imagen del Excel desaparece su archivo y su entrada
+        self._xlsx({'image1.png': d, 'image2.png': b})
+        cuentas, manifiesto = self._extraer()
+        self.assertEqual(cuentas, (0, 0, 2))
+        self.assertEqual([e['archivo'] for e in manifiesto], ['imagen_001.png', 'imagen_002.png'])
+        self.assertEqual([e['miembro'] for e in manifiesto], ['xl/media/image1.png', 'xl/media/image2.png'])
+        self.assertFalse((self.salida / 'imagen_003.png').exists())
+
+    def test_crc_y_tamano_iguales_no_bastan(self):
+        import hashlib
+        import json
+        a, b = b'a' * 100, b'b' * 100
+        self._xlsx({'image1.png': a, 'image2.png': b})
+        self._extraer()
+        # Como una colisión de CRC32: mismo CRC y tamaño en el manifiesto, otro contenido
+        ruta = self.salida / 'manifest.json'
+        datos = json.loads(ruta.read_text())
+        datos['imagenes'][1]['sha256'] = '0' * 64
+        ruta.write_text(json.dumps(datos))
+
+        cuentas, manifiesto = self._extraer()
+        self.assertEqual(cuentas, (1, 0, 1))
+        self.assertEqual(manifiesto[1]['sha256'], hashlib.sha256(b).hexdigest())
@@ -0,0 +1,219 @@
+# myapp/trabajos.py
+"""
+Importaciones de Excel en segundo plano, sin broker externo.
+
+La vista de importaciones solo deja el .xlsx en IMPORTACIONES_DIR y crea
+una fila en myapp_trabajoimportacion (encolar). `manage.py
+procesar_importaciones` (atender) toma los pendientes y los ejecuta en un
+pool de procesos locales: extracción de logos + ImportadorEmpresas, que
+va guardando el progreso en la fila para que la página lo consulte.
+
+- Tomar un trabajo es un único UPDATE ... RETURNING: dos supervisores
+  nunca toman el mismo.
+- Reparto justo: primero los pendientes de usuarios con menos trabajos en
+  proceso y, a igualdad, el más antiguo. Un usuario que sube diez archivos
+  no deja esperando a los demás.
+- El supervisor marca un latido en los trabajos que está ejecutando; si
+  muere, otro los devuelve a la cola pasado IMPORTACIONES_ABANDONO_MINUTOS
+  (hasta MAX_INTENTOS veces; la importación empareja por código/compañía,
+  así que repetirla no duplica empresas).
+"""
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .importacion import ImportadorEmpresas
+from .models import TrabajoImportacion
+
+logger = logging.getLogger(__name__)
+
+Estado = TrabajoImportacion.Estado
+TABLA = TrabajoImportacion._meta.db_table
+MAX_INTENTOS = 3
+MAX_MENSAJES = 200
+
+
+def encolar(archivo, usuario=None, revisar_duplicados=False):
+    """Guarda el archivo subido y crea el trabajo pendiente (nada más)"""
+    carpeta = Path(settings.IMPORTACIONES_DIR) / uuid.uuid4().hex
+    carpeta.mkdir(parents=True)
+    destino = carpeta / 'empresas.xlsx'
+    if hasattr(archivo, 'temporary_file_path'):
+        # Django ya lo dejó en disco: moverlo en lugar de copiarlo
+        shutil.move(archivo.temporary_file_path(), destino)
+    else:
+        with open(destino, 'wb') as salida:
+            for bloque in archivo.chunks():
+                salida.write(bloque)
+    return TrabajoImportacion.objects.create(
+        usuario=usuario,
+        nombre=Path(archivo.name).name[:255],
+        ruta=str(destino),
+        revisar_duplicados=revisar_duplicados,
+    )
+
+
+def tomar_siguiente(worker, using='default'):
+    """Marca como en proceso el siguiente pendiente (reparto justo) y devuelve su id"""
+    ahora = timezone.now()
+    conexion = connections[using]
+    # Igualdad que trata NULL = NULL (trabajos sin usuario): `IS` solo existe
+    # en SQLite; IS NOT DISTINCT FROM es el estándar (PostgreSQL, SQLite 3.39+).
+    # Como reservar_codigos, necesita UPDATE ... RETURNING (no vale MySQL)
+    mismo = 'IS' if conexion.vendor == 'sqlite' else 'IS NOT DISTINCT FROM'
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {TABLA} SET estado = %s, worker = %s, iniciado = %s, latido = %s, "
+            f"intentos = intentos + 1, fase = '' "
+            f"WHERE id = ("
+            f"  SELECT t.id FROM {TABLA} t WHERE t.estado = %s "
+            f"  ORDER BY (SELECT COUNT(*) FROM {TABLA} c "
+            f"            WHERE c.estado = %s AND c.usuario_id {mismo} t.usuario_id), t.creado, t.id "
+            f"  LIMIT 1"
+            f") AND estado = %s RETURNING id",
+            [Estado.EN_PROCESO, worker, ahora, ahora, Estado.PENDIENTE, Estado.EN_PROCESO, Estado.PENDIENTE],
+        )
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def recuperar_abandonados(minutos=None):
+    """Trabajos en proceso sin latido reciente: a la cola otra vez o a error"""
+    minutos = minutos if minutos is not None else settings.IMPORTACIONES_ABANDONO_MINUTOS
+    limite = timezone.now() - timedelta(minutes=minutos)
+    abandonados = TrabajoImportacion.objects.filter(estado=Estado.EN_PROCESO, latido__lt=limite)
+    fallidos = abandonados.filter(intentos__gte=MAX_INTENTOS).update(
+        estado=Estado.ERROR,
+        terminado=timezone.now(),
+        detalle_error=f'El worker dejó de responder {MAX_INTENTOS} veces.',
+    )
+    reencolados = abandonados.update(estado=Estado.PENDIENTE, worker='', fase='')
+    return reencolados, fallidos
+
+
+def _guardar(trabajo_id, **campos):
+    campos['latido'] = timezone.now()
+    TrabajoImportacion.objects.filter(pk=trabajo_id).update(**campos)
+
+
+def _progreso(trabajo_id, resultado):
+    _guardar(
+        trabajo_id,
+        procesadas=resultado.procesadas,
+        creadas=resultado.creadas,
+        actualizadas=resultado.actualizadas,
+        saltadas=resultado.saltadas,
+        errores=resultado.errores,
+        duplicados=resultado.duplicados,
+        sin_cambios=resultado.sin_cambios,
+    )
+
+
+def _filas_totales(ruta):
+    """Filas de datos según la dimensión de la hoja (sin recorrerla)"""
+    wb = load_workbook(ruta, read_only=True)
+    try:
+        return max(0, (wb.active.max_row or 1) - 1) or None
+    finally:
+        wb.close()
+
+
+def _extraer_logos(ruta, carpeta):
+    from extract_images_zip import extract_images_from_excel
+    # extract_images_from_excel imprime su progreso: en el worker no interesa
+    with contextlib.redirect_stdout(io.StringIO()):
+        extract_images_from_excel(ruta, carpeta)
+    return sorted(Path(carpeta).glob('imagen_*.*'))
+
+
+def ejecutar(trabajo_id):
+    """Corre en un proceso del pool: extracción de logos e importación"""
+    trabajo = TrabajoImportacion.objects.get(pk=trabajo_id)
+    carpeta = Path(trabajo.ruta).parent
+    try:
+        _guardar(trabajo_id, fase='extrayendo')
+        logos = _extraer_logos(trabajo.ruta, carpeta / 'logos')
+
+        _guardar(trabajo_id, fase='importando', filas_totales=_filas_totales(trabajo.ruta))
+        importador = ImportadorEmpresas(
+            trabajo.ruta,
+            logos=logos,
+            progreso=lambda resultado: _progreso(trabajo_id, resultado),
+            revisar_duplicados=trabajo.revisar_duplicados,
+        )
+        resultado = importador.ejecutar()
+    except Exception as e:
+        logger.exception("Importación %s falló", trabajo_id)
+        _guardar(trabajo_id, estado=Estado.ERROR, terminado=timezone.now(), detalle_error=str(e)[:2000])
+        return Estado.ERROR
+
+    _progreso(trabajo_id, resultado)
+    mensajes = resultado.mensajes_error + resultado.mensajes_duplicado
+    _guardar(
+        trabajo_id,
+        estado=Estado.COMPLETADO,
+        fase='',
+        terminado=timezone.now(),
+        mensajes=mensajes[:MAX_MENSAJES],
+    )
+    shutil.rmtree(carpeta, ignore_errors=True)
+    return Estado.COMPLETADO
+
+
+def atender(procesos=2, intervalo=2.0, una_vez=False, avisar=None):
+    """
+    Bucle del supervisor: reparte pendientes entre `procesos` procesos y
+    mantiene el latido de los que están en curso. Con `una_vez` termina
+    cuando la cola queda vacía. `avisar(mensaje)` recibe los eventos.
+    """
+    avisar = avisar or logger.info
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    reencolados, fallidos = recuperar_abandonados()
+    if reencolados or fallidos:
+        avisar(f"↻ {reencolados} trabajos abandonados vuelven a la cola, {fallidos} marcados con error")
+
+    # spawn: cada proceso arranca limpio (sin heredar conexiones abiertas)
+    contexto = multiprocessing.get_context('spawn')
+    connections.close_all()
+    en_curso = {}
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=django.setup) as pool:
+        while True:
+            while len(en_curso) < procesos:
+                trabajo_id = tomar_siguiente(worker)
+                if trabajo_id is None:
+                    break
+                avisar(f"▶ Importación {trabajo_id}")
+                en_curso[pool.submit(ejecutar, trabajo_id)] = trabajo_id
+
+            if not en_curso:
+                if una_vez:
+                    return
+                time.sleep(intervalo)
+                continue
+
+            terminados, _ = wait(en_curso, timeout=intervalo, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                trabajo_id = en_curso.pop(futuro)
+                try:
+                    avisar(f"■ Importación {trabajo_id}: {futuro.result()}")
+                except Exception as e:
+                    # El proceso murió (p. ej. sin memoria): no volvió a escribir en la fila
+                    _guardar(trabajo_id, estado=Estado.ERROR, terminado=timezone.now(), detalle_error=str(e)[:2000])
+                    avisar(f"✗ Importación {trabajo_id}: {e}")
+            if en_curso:
+                TrabajoImportacion.objects.filter(pk__in=en_curso.values()).update(latido=timezone.now())
@@ -1,12 +1,27 @@
 # myapp/views.py
+import logging
+import zipfile
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib import messages
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Empresa
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from django.views.decorators.http import require_POST
+from . import cache_busqueda, exportacion, lotes, trabajos
+from .subidas import rechazo
+from .busqueda import buscar_empresas
+from .models import Empresa, TrabajoImportacion
+from .paginacion import CursorPaginator
+
+logger = logging.getLogger(__name__)
+
 
 # Vista de Login
 def login_view(request):
@@ -43,7 +58,7 @@ def logout_view(request):
 def signup(request):
     """Solo administradores pueden acceder"""
     # ✅ CORRECCIÓN: Verificar permisos o superusuario
-    is_admin = request.user.is_superuser or request.user.has_perm('myapp.add_empresa')
+    is_admin = request.permisos.is_superuser or request.permisos.add
     
     if not is_admin:
         messages.error(request, '❌ No tienes permiso para registrar usuarios. Solo administradores.')
@@ -87,65 +102,19 @@ def signup(request):
 # Vista de Home
 @login_required(login_url='login')
 def home(request):
-    # ✅ CORRECCIÓN: Verificar permisos individuales O superusuario
-    is_admin = (
-        request.user.is_superuser or 
-        request.user.has_perm('myapp.add_empresa') or
-        request.user.has_perm('myapp.change_empresa') or
-        request.user.has_perm('myapp.delete_empresa')
-    )
-    
-    # DEBUG: Imprimir permisos del usuario
-    print(f"\n{'='*50}")
-    print(f"👤 Usuario: {request.user.username}")
-    print(f"🔑 Es superusuario: {request.user.is_superuser}")
-    print(f"📋 Permisos:")
-    print(f"   - add_empresa: {request.user.has_perm('myapp.add_empresa')}")
-    print(f"   - change_empresa: {request.user.has_perm('myapp.change_empresa')}")
-    print(f"   - delete_empresa: {request.user.has_perm('myapp.delete_empresa')}")
-    print(f"🛡️ is_admin: {is_admin}")
-    print(f"{'='*50}\n")
+    # ✅ Permisos resueltos una sola vez por request (ver myapp/permisos.py)
+    permisos = request.permisos
+    is_admin = permisos.is_admin
     
-    q = request.GET.get('q', '').strip()
-    search_field = request.GET.get('field', 'all')
-    
-    # Filtrar empresas
-    empresas_list = Empresa.objects.all()
-    
-    # Aplicar búsqueda
-    if q:
-        if search_field == 'all':
-            empresas_list = empresas_list.filter(
-                Q(compania__icontains=q) | 
-                Q(cliente__icontains=q) | 
-                Q(codigo__icontains=q) |
-                Q(correo__icontains=q) |
-                Q(telefono__icontains=q) |
-                Q(pais__icontains=q)
-            )
-        elif search_field == 'compania':
-            empresas_list = empresas_list.filter(compania__icontains=q)
-        elif search_field == 'cliente':
-            empresas_list = empresas_list.filter(cliente__icontains=q)
-        elif search_field == 'codigo':
-            empresas_list = empresas_list.filter(codigo__icontains=q)
-        elif search_field == 'correo' and is_admin:
-            empresas_list = empresas_list.filter(correo__icontains=q)
-        elif search_field == 'telefono' and is_admin:
-            empresas_list = empresas_list.filter(telefono__icontains=q)
-        elif search_field == 'pais' and is_admin:
-            empresas_list = empresas_list.filter(pais__icontains=q)
-    
-    empresas_list = empresas_list.order_by('-id')
-    
-    # Paginación
-    paginator = Paginator(empresas_list, 12)
-    page_number = request.GET.get('page')
-    empresas = paginator.get_page(page_number)
+    # DEBUG: permisos del usuario (DIRECTORIO_LOG_NIVEL=DEBUG)
+    logger.debug(
+        "👤 Usuario: %s | superusuario=%s add=%s change=%s delete=%s is_admin=%s",
+        request.user.username, permisos.is_superuser, permisos.add, permisos.change, permisos.delete, is_admin,
+    )
     
     # ✅ POST: Agregar empresa
     if request.method == 'POST':
-        if not (is_admin and request.user.has_perm('myapp.add_empresa')):
+        if not (is_admin and permisos.add):
             messages.error(request, '❌ No tienes permiso para agregar empresas.')
             return redirect('home')
         
@@ -156,6 +125,11 @@ def home(request):
         pais = request.POST.get('pais', '')
         logo = request.FILES.get('logo')
         
+        # Límites de tamaño/dimensiones aplicados al recibir el archivo (myapp/subidas.py)
+        if rechazo(request, 'logo'):
+            messages.error(request, f'❌ Logo rechazado: {rechazo(request, "logo")}.')
+            return redirect('home')
+        
         if cliente:
             empresa = Empresa.objects.create(
                 cliente=cliente,
@@ -168,26 +142,132 @@ def home(request):
             messages.success(request, f'✅ Empresa "{empresa.compania or empresa.cliente}" agregada correctamente.')
             return redirect('home')
     
-    context = {
-        'empresas': empresas,
-        'is_admin': is_admin,
+    p = _parametros_home(request, is_admin, cache_busqueda.generacion())
+    empresas = cache_busqueda.obtener(p['clave'])
+    
+    if empresas is None:
+        empresas_list = _consulta_home(p, is_admin)
+        
+        # Paginación
+        if p['modo_cursor']:
+            empresas = CursorPaginator(empresas_list, 12).get_page(p['pagina_pedida'])
+            if p['mostrar_total']:
+                empresas.total  # se calcula antes de cachear la página
+        else:
+            paginator = Paginator(empresas_list, 12)
+            empresas = paginator.get_page(p['pagina_pedida'])
+        cache_busqueda.guardar(p['clave'], empresas)
+    
+    return render(request, 'home.html', _contexto_home(p, empresas, permisos))
+
+
+# Vista de Home para ASGI (settings.VISTAS_ASYNC)
+@login_required(login_url='login')
+async def ahome(request):
+    """Búsqueda y paginación de home con el ORM asíncrono"""
+    if request.method != 'GET':
+        # El alta de empresas (POST con logo) sigue por la vista síncrona
+        return await sync_to_async(home)(request)
+    
+    # Usuario y permisos sin ORM síncrono; el context processor de auth lee request.user
+    request.user = await request.auser()
+    permisos = await request.apermisos()
+    is_admin = permisos.is_admin
+    logger.debug(
+        "👤 Usuario: %s | superusuario=%s add=%s change=%s delete=%s is_admin=%s",
+        request.user.username, permisos.is_superuser, permisos.add, permisos.change, permisos.delete, is_admin,
+    )
+    
+    p = _parametros_home(request, is_admin, await cache_busqueda.ageneracion())
+    empresas = await cache_busqueda.aobtener(p['clave'])
+    
+    if empresas is None:
+        empresas_list = _consulta_home(p, is_admin)
+        
+        # La plantilla no debe disparar consultas: todo se evalúa aquí
+        if p['modo_cursor']:
+            empresas = await CursorPaginator(empresas_list, 12).aget_page(p['pagina_pedida'])
+            if p['mostrar_total']:
+                await empresas.atotal()
+        else:
+            paginator = Paginator(empresas_list, 12)
+            paginator.count = await empresas_list.acount()
+            empresas = paginator.get_page(p['pagina_pedida'])
+            empresas.object_list = [e async for e in empresas.object_list]
+        await cache_busqueda.aguardar(p['clave'], empresas)
+    
+    return render(request, 'home.html', _contexto_home(p, empresas, permisos))
+
+
+def _parametros_home(request, is_admin, generacion):
+    """Filtros y paginación pedidos en home, con su clave de caché (de la `generacion` actual)"""
+    q = request.GET.get('q', '').strip()
+    search_field = request.GET.get('field', 'all')
+    
+    # Modo cursor (opt-in): ?modo=cursor o EMPRESAS_PAGINACION = 'cursor'
+    modo = request.GET.get('modo') or getattr(settings, 'EMPRESAS_PAGINACION', 'offset')
+    modo_cursor = modo == 'cursor'
+    
+    mostrar_total = request.GET.get('total') == '1'
+    pagina_pedida = request.GET.get('cursor') if modo_cursor else request.GET.get('page')
+    
+    return {
         'q': q,
         'search_field': search_field,
+        'modo_cursor': modo_cursor,
+        'mostrar_total': mostrar_total,
+        'pagina_pedida': pagina_pedida,
+        # Caché versionada de resultados (ver myapp/cache_busqueda.py)
+        'clave': cache_busqueda.clave_pagina(generacion, q, search_field, modo, pagina_pedida, is_admin, mostrar_total),
+    }
+
+
+def _consulta_home(p, is_admin):
+    """Filtrar empresas (índice FTS5, ordenado por relevancia si hay búsqueda)"""
+    empresas_list = Empresa.objects.order_by('-id')
+    if p['q']:
+        empresas_list = buscar_empresas(
+            empresas_list, p['q'], p['search_field'], is_admin, por_relevancia=not p['modo_cursor'],
+        )
+    return empresas_list
+
+
+def _contexto_home(p, empresas, permisos):
+    filtros = {'q': p['q'], 'field': p['search_field']} if p['q'] else {}
+    if p['modo_cursor']:
+        filtros['modo'] = 'cursor'
+    if p['mostrar_total']:
+        # El total pedido se conserva al cambiar de página
+        filtros['total'] = 1
+    
+    return {
+        'empresas': empresas,
+        'is_admin': permisos.is_admin,
+        'q': p['q'],
+        'search_field': p['search_field'],
+        'modo_cursor': p['modo_cursor'],
+        'mostrar_total': p['mostrar_total'],
+        'filtros_qs': urlencode(filtros),
+        # El grid renderizado también se cachea (varía además con los permisos)
+        'clave_render': f"{p['clave']}:{permisos.change}:{permisos.delete}",
     }
-    return render(request, 'home.html', context)
 
 
 # ✅ Vista de Editar Empresa (SOLO ADMIN)
 @login_required(login_url='login')
 def editar_empresa(request, id):
     # ✅ SEGURIDAD: Verificar permiso específico
-    if not (request.user.is_superuser or request.user.has_perm('myapp.change_empresa')):
+    if not request.permisos.change:
         messages.error(request, '❌ No tienes permiso para editar empresas.')
         return redirect('home')
     
     empresa = get_object_or_404(Empresa, id=id)
     
     if request.method == 'POST':
+        if rechazo(request, 'logo'):
+            messages.error(request, f'❌ Logo rechazado: {rechazo(request, "logo")}.')
+            return redirect('home')
+        
         empresa.cliente = request.POST.get('cliente')
         empresa.compania = request.POST.get('compania', '')
         empresa.telefono = request.POST.get('telefono', '')
@@ -204,11 +284,56 @@ def editar_empresa(request, id):
     return redirect('home')
 
 
+# ✅ Datos de una empresa para el modal de edición (SOLO ADMIN)
+@login_required(login_url='login')
+def empresa_datos(request, id):
+    """JSON ligero que el modal compartido de home pide al abrirse"""
+    if not request.permisos.change:
+        return JsonResponse({'error': 'No tienes permiso para editar empresas.'}, status=403)
+    
+    empresa = get_object_or_404(
+        Empresa.objects.values('id', 'cliente', 'compania', 'codigo', 'telefono', 'correo', 'pais', 'logo'),
+        id=id,
+    )
+    return JsonResponse(empresa)
+
+
+# ✅ Exportar el directorio filtrado a CSV / XLSX (SOLO ADMIN)
+@login_required(login_url='login')
+def exportar_empresas(request):
+    """Descarga con los mismos filtros que home (?q=&field=&formato=)"""
+    if not request.permisos.is_admin:
+        messages.error(request, '❌ No tienes permiso para exportar empresas.')
+        return redirect('home')
+    
+    formato = request.GET.get('formato', 'csv')
+    if formato not in exportacion.FORMATOS:
+        messages.error(request, '❌ Formato de exportación no válido.')
+        return redirect('home')
+    
+    empresas = exportacion.filtrar_empresas(
+        request.GET.get('q', '').strip(),
+        request.GET.get('field', 'all'),
+        is_admin=True,
+    )
+    nombre = exportacion.nombre_archivo(formato)
+    
+    if formato == 'csv':
+        response = StreamingHttpResponse(exportacion.lineas_csv(empresas), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+    
+    # El ZIP se genera por bloques: las partes fijas salen antes de leer filas
+    response = StreamingHttpResponse(exportacion.bloques_xlsx(empresas), content_type=exportacion.TIPO_XLSX)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
 # ✅ Vista de Eliminar Empresa (SOLO ADMIN)
 @login_required(login_url='login')
 def eliminar_empresa(request, id):
     # ✅ SEGURIDAD: Verificar permiso específico
-    if not (request.user.is_superuser or request.user.has_perm('myapp.delete_empresa')):
+    if not request.permisos.delete:
         messages.error(request, '❌ No tienes permiso para eliminar empresas.')
         return redirect('home')
     
@@ -217,3 +342,84 @@ def eliminar_empresa(request, id):
     empresa.delete()
     messages.success(request, f'✅ Empresa "{nombre}" eliminada correctamente.')
     return redirect('home')
+
+
+# ✅ Editar o eliminar varias empresas a la vez (SOLO ADMIN)
+@login_required(login_url='login')
+@require_POST
+def empresas_lote(request):
+    """
+    Aplica a los ids marcados en home un cambio de campo o el borrado, en
+    una transacción y con consultas por conjunto (ver myapp/lotes.py).
+    """
+    volver = request.POST.get('volver', '')
+    if not url_has_allowed_host_and_scheme(volver, allowed_hosts={request.get_host()}):
+        volver = 'home'
+    
+    accion = request.POST.get('accion')
+    permisos = request.permisos
+    if accion == 'editar' and not permisos.change:
+        messages.error(request, '❌ No tienes permiso para editar empresas.')
+        return redirect(volver)
+    if accion == 'eliminar' and not permisos.delete:
+        messages.error(request, '❌ No tienes permiso para eliminar empresas.')
+        return redirect(volver)
+    
+    try:
+        ids = lotes.leer_ids(request.POST.getlist('ids'))
+        if accion == 'editar':
+            campo = request.POST.get('campo', '')
+            cambiadas = lotes.editar_en_lote(ids, campo, request.POST.get('valor', ''))
+            messages.success(request, f'✅ {cambiadas} empresas actualizadas ({campo}).')
+        elif accion == 'eliminar':
+            if request.POST.get('confirmacion', '').strip().lower() != 'eliminar':
+                raise ValidationError('Escribe "eliminar" para confirmar.')
+            borradas = lotes.eliminar_en_lote(ids)
+            messages.success(request, f'✅ {borradas} empresas eliminadas.')
+        else:
+            raise ValidationError('Acción no válida.')
+    except ValidationError as e:
+        messages.error(request, f'❌ {" ".join(e.messages)}')
+    return redirect(volver)
+
+
+# ✅ Importar Excel desde la web (SOLO ADMIN con alta y edición)
+@login_required(login_url='login')
+def importaciones(request):
+    """
+    Sube el .xlsx y lo deja en cola. El trabajo pesado (extraer logos e
+    importar) lo hace `manage.py procesar_importaciones`, nunca esta request.
+    """
+    permisos = request.permisos
+    if not (permisos.add and permisos.change):
+        messages.error(request, '❌ No tienes permiso para importar empresas.')
+        return redirect('home')
+    
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if not archivo or not archivo.name.lower().endswith('.xlsx'):
+            messages.error(request, '❌ Sube un archivo Excel (.xlsx).')
+            return redirect('importaciones')
+        # Un .xlsx es un ZIP: basta leer el directorio central para descartar basura
+        if not zipfile.is_zipfile(archivo):
+            messages.error(request, '❌ El archivo no es un Excel válido (.xlsx).')
+            return redirect('importaciones')
+        archivo.seek(0)
+        
+        trabajo = trabajos.encolar(archivo, request.user, request.POST.get('revisar_duplicados') == '1')
+        messages.success(request, f'✅ "{trabajo.nombre}" en cola de importación.')
+        return redirect('importaciones')
+    
+    recientes = TrabajoImportacion.objects.select_related('usuario').order_by('-creado')[:20]
+    return render(request, 'importaciones.html', {'trabajos': recientes})
+
+
+# ✅ Progreso de una importación (la página lo consulta cada pocos segundos)
+@login_required(login_url='login')
+def importacion_estado(request, id):
+    permisos = request.permisos
+    if not (permisos.add and permisos.change):
+        return JsonResponse({'error': 'No tienes permiso para importar empresas.'}, status=403)
+    
+    trabajo = get_object_or_404(TrabajoImportacion, id=id)
+    return JsonResponse(trabajo.como_dict())
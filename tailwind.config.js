@@ -0,0 +1,12 @@
+/** Configuración de Tailwind para generar static/css/app.css */
+module.exports = {
+  content: ['./myapp/templates/**/*.html', './templates/**/*.html'],
+  theme: {
+    extend: {},
+  },
+  // Bootstrap también se carga en base.html: no resetear sus estilos
+  corePlugins: {
+    preflight: false,
+  },
+  plugins: [],
+};